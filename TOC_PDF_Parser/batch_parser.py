@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from binary_records import binary_path_for
+from comprehensive_usb_parser import ComprehensiveUSBPDParser, TOC_FILE, SPEC_FILE, METADATA_FILE
+from incremental_parser import save_page_fingerprints
+from page_cache import file_digest
+
+
+MANIFEST_FILE = "corpus_manifest.json"
+
+REVISION_PATTERN = re.compile(r"(?:^|[^a-z])(?:rev(?:ision)?|r)[\s_.-]*(\d+(?:[._]\d+)*)", re.IGNORECASE)
+VERSION_PATTERN = re.compile(r"(?:^|[^a-z])v(?:er(?:sion)?)?[\s_.-]*(\d+(?:[._]\d+)*)", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"(\d+(?:[._]\d+)+)")
+
+
+def derive_document_identity(pdf_path: str) -> Tuple[str, str]:
+    # "USB_PD_R3_2_V1.1.pdf" -> ("usb_pd_r3_2_v1_1", "3.2 v1.1"),
+    # "BC1.2.pdf" -> ("bc1_2", "1.2"); files without a number stay at "1.0"
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    document_id = re.sub(r"[^a-z0-9]+", "_", stem.lower()).strip("_") or "document"
+
+    def dotted(match_text: str) -> str:
+        return ".".join(part for part in re.split(r"[._]", match_text) if part)
+
+    revisions = REVISION_PATTERN.findall(stem)
+    versions = VERSION_PATTERN.findall(stem)
+    if revisions and versions:
+        version = f"{dotted(revisions[-1])} v{dotted(versions[-1])}"
+    elif revisions or versions:
+        version = dotted((revisions or versions)[-1])
+    else:
+        numbers = NUMBER_PATTERN.findall(stem)
+        version = dotted(numbers[-1]) if numbers else "1.0"
+    return document_id, version
+
+
+def collect_pdfs(inputs: List[str]) -> List[str]:
+    pdfs = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.pdf")) + glob.glob(os.path.join(pattern, "*.PDF"))
+        else:
+            matches = glob.glob(pattern)
+        pdfs.extend(path for path in sorted(matches) if os.path.isfile(path))
+    return list(dict.fromkeys(os.path.abspath(path) for path in pdfs))
+
+
+def parse_document(pdf_path: str, output_dir: str, document_id: str, version: str,
+                   page_workers: int = 1, binary: bool = False) -> Dict:
+    # Runs in a pool process; per-page warnings are captured rather than
+    # interleaved with the other documents' output.
+    started = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        with ComprehensiveUSBPDParser(pdf_path, workers=page_workers, document_id=document_id,
+                                      document_version=version) as parser:
+            parser.parse(stream_dir=output_dir)
+            parser.save_all_outputs(output_dir, binary=binary)
+            parser.save_instrumentation(output_dir)
+            save_page_fingerprints(output_dir, pdf_path, parser.toc_pages)
+    seconds = time.perf_counter() - started
+    pages = parser.metadata["total_pages"]
+    return {
+        "total_pages": pages,
+        "toc_entries": len(parser.toc_entries),
+        "sections": parser.section_totals["sections"],
+        "tables": parser.section_totals["tables"],
+        "figures": parser.section_totals["figures"],
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 2) if seconds else None,
+        "stage_times": {stage: round(value, 3) for stage, value in parser.stage_times.items()},
+        "warnings": log.getvalue().count("⚠️")
+    }
+
+
+class CorpusBatchParser:
+    # Parses many specification PDFs into <output_root>/<document_id>/ with a
+    # bounded process pool and records the result of every document in a
+    # corpus manifest. A document whose content hash matches the manifest and
+    # whose outputs are all present is skipped.
+
+    def __init__(self, output_root: str, workers: int = 2, page_workers: int = 1, force: bool = False,
+                 binary: bool = False):
+        self.output_root = output_root
+        self.workers = max(1, workers)
+        self.page_workers = page_workers
+        self.force = force
+        self.binary = binary
+        self.manifest_path = os.path.join(output_root, MANIFEST_FILE)
+        self.previous = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return {entry["document_id"]: entry for entry in json.load(f).get("documents", [])}
+        except FileNotFoundError:
+            return {}
+
+    def _plan(self, pdfs: List[str]) -> List[Dict]:
+        jobs = []
+        used_ids = set()
+        for pdf_path in pdfs:
+            document_id, version = derive_document_identity(pdf_path)
+            base_id, suffix = document_id, 2
+            while document_id in used_ids:
+                document_id = f"{base_id}_{suffix}"
+                suffix += 1
+            used_ids.add(document_id)
+            jobs.append({
+                "document_id": document_id,
+                "document_version": version,
+                "source": pdf_path,
+                "sha256": file_digest(pdf_path),
+                "output_dir": os.path.join(self.output_root, document_id)
+            })
+        return jobs
+
+    def _is_up_to_date(self, job: Dict) -> bool:
+        previous = self.previous.get(job["document_id"])
+        if self.force or not previous or previous.get("status") == "failed":
+            return False
+        if previous.get("sha256") != job["sha256"]:
+            return False
+        names = [TOC_FILE, SPEC_FILE, METADATA_FILE]
+        if self.binary:
+            names += [binary_path_for(TOC_FILE), binary_path_for(SPEC_FILE)]
+        return all(os.path.isfile(os.path.join(job["output_dir"], name)) for name in names)
+
+    def run(self, pdfs: List[str]) -> List[Dict]:
+        os.makedirs(self.output_root, exist_ok=True)
+        started = time.perf_counter()
+        results = {}
+        jobs = self._plan(pdfs)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for job in jobs:
+                if self._is_up_to_date(job):
+                    results[job["document_id"]] = {**self.previous[job["document_id"]], **job, "status": "skipped"}
+                    print(f"⏭️  {job['document_id']}: up to date")
+                    continue
+                future = executor.submit(parse_document, job["source"], job["output_dir"],
+                                         job["document_id"], job["document_version"], self.page_workers,
+                                         self.binary)
+                futures[future] = job
+
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    stats = future.result()
+                    results[job["document_id"]] = {**job, **stats, "status": "parsed"}
+                    print(f"✅ {job['document_id']}: {stats['total_pages']} pages in {stats['seconds']:.1f}s")
+                except Exception as e:
+                    results[job["document_id"]] = {**job, "status": "failed", "error": str(e)}
+                    print(f"❌ {job['document_id']}: {e}")
+
+        documents = [results[job["document_id"]] for job in jobs]
+        self.wall_seconds = time.perf_counter() - started
+        # A run over a subset of the corpus keeps every document parsed
+        # before; only this run's documents are replaced or added
+        corpus = dict(self.previous)
+        corpus.update(results)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "generated": datetime.now().isoformat(),
+                "wall_seconds": round(self.wall_seconds, 3),
+                "documents": list(corpus.values())
+            }, f, ensure_ascii=False, indent=2)
+        self.previous = corpus
+        return documents
+
+    def print_report(self, documents: List[Dict]):
+        print(f"\n{'document_id':<32} {'version':<12} {'status':<8} {'pages':>6} {'seconds':>8} {'pages/s':>8}")
+        parsed_pages = 0
+        for entry in documents:
+            pages = entry.get("total_pages", 0)
+            if entry["status"] == "parsed":
+                parsed_pages += pages
+            seconds = f"{entry['seconds']:.1f}" if entry["status"] == "parsed" else "-"
+            rate = f"{entry['pages_per_second']:.1f}" if entry["status"] == "parsed" and entry.get("pages_per_second") else "-"
+            print(f"{entry['document_id']:<32} {entry['document_version']:<12} {entry['status']:<8} "
+                  f"{pages:>6} {seconds:>8} {rate:>8}")
+        throughput = parsed_pages / self.wall_seconds if self.wall_seconds else 0
+        print(f"\nParsed {parsed_pages} pages in {self.wall_seconds:.1f}s wall time ({throughput:.1f} pages/s)")
+        print(f"Manifest saved to {self.manifest_path}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Parse a directory or glob of specification PDFs into a corpus")
+    arg_parser.add_argument("inputs", nargs="+", help="Directories or glob patterns of PDFs")
+    arg_parser.add_argument("--output", default="corpus", help="Corpus root; each document gets a subdirectory")
+    arg_parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                            help="Documents parsed concurrently")
+    arg_parser.add_argument("--page-workers", type=int, default=1,
+                            help="Page extraction processes per document")
+    arg_parser.add_argument("--force", action="store_true", help="Re-parse documents that are up to date")
+    arg_parser.add_argument("--binary", action="store_true",
+                            help="Also write each document's TOC and sections in the binary record format")
+    args = arg_parser.parse_args()
+
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        print(f"No PDFs found in {', '.join(args.inputs)}")
+        return
+
+    batch = CorpusBatchParser(args.output, workers=args.workers, page_workers=args.page_workers, force=args.force,
+                              binary=args.binary)
+    documents = batch.run(pdfs)
+    batch.print_report(documents)
+
+
+if __name__ == "__main__":
+    main()
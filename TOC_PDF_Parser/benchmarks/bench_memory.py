@@ -0,0 +1,74 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_suite import spec_path
+from comprehensive_usb_parser import ComprehensiveUSBPDParser
+from instrumentation import current_rss_mb, peak_rss_mb
+
+# Peak RSS of the largest size may exceed the smallest's by at most this
+# factor
+FLAT_FACTOR = 1.5
+
+
+def run_size(pdf_path: str, window_pages, memory_ceiling_mb) -> dict:
+    # A fresh process per size, so peak RSS belongs to this size alone
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()), \
+            ComprehensiveUSBPDParser(pdf_path, window_pages=window_pages,
+                                     memory_ceiling_mb=memory_ceiling_mb) as parser:
+        pages = parser.page_source().page_count
+        open_mb = current_rss_mb()
+        parser.parse(stream_dir=tmp)
+        parser.save_all_outputs(tmp)
+        window = parser.page_source().window_stats()
+    seconds = time.perf_counter() - started
+    peak_mb = peak_rss_mb()
+    return {"pages": pages, "seconds": round(seconds, 2), "pages_per_second": round(pages / seconds, 2),
+            "reopens": window["reopens"], "window_pages": window["window_pages"], "open_rss_mb": open_mb,
+            "peak_rss_mb": peak_mb}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Peak memory of a streamed parse against document size")
+    arg_parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000, 5000])
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--page-window", type=int, help="Passed to the parser (default: its own)")
+    arg_parser.add_argument("--memory-ceiling-mb", type=float, help="Passed to the parser")
+    arg_parser.add_argument("--work-dir", help="Keep generated PDFs here between runs")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = args.work_dir or tmp
+        os.makedirs(work_dir, exist_ok=True)
+        print(f"{'pages':>6} {'seconds':>8} {'pages/s':>8} {'reopens':>8} {'window':>7} {'open MB':>8} "
+              f"{'peak MB':>8}")
+        results = []
+        for pages in args.pages:
+            pdf_path = spec_path(work_dir, pages, args.seed)
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_size, pdf_path, args.page_window, args.memory_ceiling_mb).result()
+            results.append(result)
+            print(f"{result['pages']:>6} {result['seconds']:>8.1f} {result['pages_per_second']:>8.1f} "
+                  f"{result['reopens']:>8} {result['window_pages']:>7} {result['open_rss_mb']:>8.0f} "
+                  f"{result['peak_rss_mb']:>8.0f}")
+
+    smallest, largest = results[0]["peak_rss_mb"], results[-1]["peak_rss_mb"]
+    if smallest and largest and len(results) > 1:
+        growth = largest / smallest
+        flat = growth <= FLAT_FACTOR
+        print(f"Peak RSS grows {growth:.2f}x from {results[0]['pages']} to {results[-1]['pages']} pages "
+              f"({'flat' if flat else f'over the {FLAT_FACTOR}x limit'})")
+        sys.exit(0 if flat else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comprehensive_usb_parser import ComprehensiveUSBPDParser
+from records import to_json
+
+
+def spec_digest(sections) -> str:
+    digest = hashlib.sha256()
+    for section in sections:
+        digest.update(to_json(section).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def run(pdf_path: str, workers: int):
+    with ComprehensiveUSBPDParser(pdf_path, workers=workers) as parser:
+        started = time.perf_counter()
+        parser.parse()
+        elapsed = time.perf_counter() - started
+        return elapsed, parser.metadata["total_pages"], spec_digest(parser.content_sections)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Serial vs process-pool page extraction")
+    arg_parser.add_argument("pdf", help="Specification PDF to parse")
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = arg_parser.parse_args()
+
+    baseline_time = None
+    baseline_digest = None
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}  output")
+    for workers in args.workers:
+        elapsed, pages, digest = run(args.pdf, workers)
+        if baseline_time is None:
+            baseline_time, baseline_digest = elapsed, digest
+        status = "identical" if digest == baseline_digest else "DIFFERS"
+        print(f"{workers:>8} {elapsed:>9.2f} {pages / elapsed:>9.1f} {baseline_time / elapsed:>7.2f}x  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binary_records import open_records
+from records import SearchHit, compact_records
+
+TOC_FILE = "usb_pd_toc.jsonl"
+SPEC_FILE = "usb_pd_spec.jsonl"
+
+
+def retained_bytes(build) -> tuple:
+    # Bytes still allocated once build() has returned and everything it did
+    # not hand back has been freed
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, value
+
+
+def load(path: str, summaries: bool, revisions: int, compact: bool) -> list:
+    # revisions loads of the same file stand in for a multi-revision corpus,
+    # which repeats ids, doc titles and tags but not the decoded strings
+    rows = []
+    for _ in range(revisions):
+        with open_records(path) as reader:
+            loaded = reader.summaries() if summaries else list(reader.iter_records())
+            rows.extend(compact_records(loaded) if compact else loaded)
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Memory held by dict rows against slotted records")
+    arg_parser.add_argument("output_dir", help="Directory holding the parser outputs")
+    arg_parser.add_argument("--revisions", type=int, default=5, help="Loads per file, as for a merged corpus")
+    arg_parser.add_argument("--keyword", default="power", help="Search run for the result copy comparison")
+    args = arg_parser.parse_args()
+
+    toc_path = os.path.join(args.output_dir, TOC_FILE)
+    spec_path = os.path.join(args.output_dir, SPEC_FILE)
+    workloads = [
+        ("TOC entries", toc_path, True),
+        ("section summaries", spec_path, True),
+        ("full sections", spec_path, False),
+    ]
+    print(f"{'rows':<20} {'count':>7} {'dict KB':>9} {'record KB':>10} {'saved':>7}")
+    for name, path, summaries in workloads:
+        dict_bytes, rows = retained_bytes(lambda: load(path, summaries, args.revisions, False))
+        record_bytes, records = retained_bytes(lambda: load(path, summaries, args.revisions, True))
+        assert records == rows
+        print(f"{name:<20} {len(rows):>7} {dict_bytes / 1024:>9.0f} {record_bytes / 1024:>10.0f} "
+              f"{1 - record_bytes / dict_bytes:>7.0%}")
+
+    # Search results: a dict copy of every hit against a view over the entry
+    entries = load(toc_path, True, args.revisions, True)
+    matches = [entry for entry in entries if args.keyword in entry["title"].lower()]
+    copy_bytes, _ = retained_bytes(lambda: [dict(entry, match_details=[]) for entry in matches])
+    view_bytes, _ = retained_bytes(lambda: [SearchHit(entry, []) for entry in matches])
+    print(f"{'search hits':<20} {len(matches):>7} {copy_bytes / 1024:>9.0f} {view_bytes / 1024:>10.0f} "
+          f"{1 - view_bytes / copy_bytes if copy_bytes else 0:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_toc_search import write_synthetic_toc
+from pdfparser import HEAVY_MODULES, STARTUP_BUDGET_MS
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdfparser.py")
+
+
+def write_synthetic_outputs(output_dir: str, sections: int):
+    # A TOC and a matching spec file with a paragraph per section, enough for
+    # validate to do real work
+    toc_path = os.path.join(output_dir, "usb_pd_toc.jsonl")
+    write_synthetic_toc(toc_path, sections)
+    with open(toc_path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    with open(os.path.join(output_dir, "usb_pd_spec.jsonl"), "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps({
+                "section_id": entry["section_id"], "title": entry["title"],
+                "content": f"{entry['title']}. The Source shall send the message. " * 8,
+                "page_start": entry["page"], "page_end": entry["page"], "content_type": "text",
+                "tables": [], "figures": [], "subsections": [], "word_count": 48, "tags": entry["tags"]
+            }, ensure_ascii=False) + "\n")
+    with open(os.path.join(output_dir, "usb_pd_metadata.jsonl"), "w", encoding="utf-8") as f:
+        json.dump({"total_tables": 0, "total_figures": 0}, f)
+
+
+def imported_heavy_modules(command: list) -> list:
+    # -X importtime lists every module the command imported on stderr
+    result = subprocess.run([sys.executable, "-X", "importtime", CLI] + command,
+                            capture_output=True, text=True)
+    imported = {line.rsplit("|", 1)[-1].strip().split(".")[0]
+                for line in result.stderr.splitlines() if line.startswith("import time:")}
+    return sorted(imported.intersection(HEAVY_MODULES))
+
+
+def wall_ms(command: list, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, CLI] + command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Start-up time of the pdfparser lookup subcommands")
+    arg_parser.add_argument("--output-dir", help="Existing parser outputs (default: synthetic outputs)")
+    arg_parser.add_argument("--sections", type=int, default=3000, help="Size of the synthetic outputs")
+    arg_parser.add_argument("--runs", type=int, default=7)
+    arg_parser.add_argument("--slack", type=float, default=1.0,
+                            help="Multiply the budgets, e.g. 2 on a slow CI machine")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = args.output_dir
+        if output_dir is None:
+            output_dir = tmp
+            write_synthetic_outputs(output_dir, args.sections)
+        commands = {
+            "toc": ["toc", "--output-dir", output_dir, "--children", "1", "--json"],
+            "search": ["search", "power", "--output-dir", output_dir, "--json"],
+            "validate": ["validate", "--output-dir", output_dir, "--json"],
+        }
+        interpreter = wall_ms(["--help"], args.runs)
+        print(f"interpreter + argparse: {interpreter:.0f} ms")
+        print(f"{'command':<10} {'median ms':>10} {'budget ms':>10}  heavy imports")
+        failed = False
+        for name, command in commands.items():
+            elapsed = wall_ms(command, args.runs)
+            budget = STARTUP_BUDGET_MS[name] * args.slack
+            heavy = imported_heavy_modules(command)
+            ok = elapsed <= budget and not heavy
+            failed = failed or not ok
+            print(f"{name:<10} {elapsed:>10.0f} {budget:>10.0f}  {', '.join(heavy) or 'none'}"
+                  f"{'' if ok else '  OVER BUDGET' if not heavy else '  FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
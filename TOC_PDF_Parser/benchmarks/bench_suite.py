@@ -0,0 +1,192 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from comprehensive_usb_parser import ComprehensiveUSBPDParser
+from instrumentation import peak_rss_mb
+from synthetic_spec import GENERATOR_VERSION, write_synthetic_spec
+from toc_search_utilities import TOCSearchEngine
+from validation_report_generator import ValidationReportGenerator
+
+STAGES = ["extract_toc", "extract_all_sections", "generate_metadata", "save_all_outputs",
+          "search_index", "validation_report"]
+# Stage times below this many seconds, and memory growth below this many MB,
+# are too noisy to call a regression whatever the relative change
+NOISE_FLOOR_SECONDS = 0.05
+NOISE_FLOOR_MB = 16
+
+
+@contextlib.contextmanager
+def quiet():
+    # The parser and report generator print progress lines that would break
+    # up the results table
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def spec_path(work_dir: str, pages: int, seed: int) -> str:
+    path = os.path.join(work_dir, f"synthetic_{pages}p_seed{seed}_v{GENERATOR_VERSION}.pdf")
+    if not os.path.exists(path):
+        write_synthetic_spec(path, pages, seed)
+    return path
+
+
+def search_workload(engine: TOCSearchEngine):
+    entries = engine.entries
+    if not entries:
+        return []
+    middle = entries[len(entries) // 2]
+    last = entries[-1]
+    chapter = middle["section_id"].split(".")[0]
+    word = middle["title"].split()[0]
+    return [
+        lambda: engine.search_by_keyword(word),
+        lambda: engine.search_by_keyword(word, ["title", "full_path"]),
+        lambda: engine.get_section_by_id(last["section_id"]),
+        lambda: engine.get_children(chapter),
+        lambda: engine.get_all_descendants(chapter),
+        lambda: engine.get_path_to_root(last["section_id"]),
+        lambda: engine.search_by_level(2),
+        lambda: engine.search_by_page_range(middle["page"], middle["page"] + 20),
+    ]
+
+
+def run_size(pdf_path: str, workers: int, search_repeat: int) -> dict:
+    # Runs in a fresh process per document size so peak RSS belongs to this
+    # size alone
+    seconds = {}
+
+    def timed(stage, function, *args):
+        started = time.perf_counter()
+        with quiet():
+            result = function(*args)
+        seconds[stage] = round(time.perf_counter() - started, 4)
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            ComprehensiveUSBPDParser(pdf_path, workers=workers, extract_tables=True) as parser:
+        timed("extract_toc", parser.extract_toc)
+        timed("extract_all_sections", parser.extract_all_sections)
+        parser.metadata = timed("generate_metadata", parser.generate_metadata)
+        timed("save_all_outputs", parser.save_all_outputs, tmp)
+
+        engine = timed("search_index", TOCSearchEngine.from_entries, parser.toc_entries)
+        queries = search_workload(engine)
+        started = time.perf_counter()
+        for _ in range(search_repeat):
+            for query in queries:
+                query()
+        query_count = search_repeat * len(queries)
+        search_us = (time.perf_counter() - started) / query_count * 1e6 if query_count else 0.0
+
+        def validation_report():
+            generator = ValidationReportGenerator(tmp)
+            generator.load_data()
+            return generator.generate_excel_report(os.path.join(tmp, "report.xlsx"))
+
+        validation = timed("validation_report", validation_report)
+        pages = parser.page_source().page_count
+        total = sum(seconds[stage] for stage in STAGES[:4])
+        return {
+            "pages": pages,
+            "toc_entries": len(parser.toc_entries),
+            "sections": parser.section_totals["sections"],
+            "validation_matches": validation["matches"],
+            "seconds": seconds,
+            "pages_per_second": round(pages / total, 2) if total else None,
+            "search_us_per_query": round(search_us, 2),
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    regressions = []
+    for size, result in current["results"].items():
+        before = baseline.get("results", {}).get(size)
+        if before is None:
+            continue
+        for stage in STAGES:
+            old, new = before["seconds"].get(stage), result["seconds"].get(stage)
+            if old is not None and new is not None and new > old * (1 + tolerance) \
+                    and new - old > NOISE_FLOOR_SECONDS:
+                regressions.append(f"{size} pages: {stage} {old:.3f}s -> {new:.3f}s")
+        old, new = before.get("pages_per_second"), result.get("pages_per_second")
+        if old and new and new < old / (1 + tolerance):
+            regressions.append(f"{size} pages: throughput {old:.1f} -> {new:.1f} pages/s")
+        old, new = before.get("peak_rss_mb"), result.get("peak_rss_mb")
+        if old and new and new > old * (1 + tolerance) and new - old > NOISE_FLOOR_MB:
+            regressions.append(f"{size} pages: peak RSS {old:.0f} -> {new:.0f} MB")
+        if before.get("sections") != result.get("sections"):
+            regressions.append(f"{size} pages: sections {before.get('sections')} -> {result.get('sections')}")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="End-to-end parser benchmark on synthetic specification PDFs")
+    arg_parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500],
+                            help="Document sizes to generate, e.g. 10 100 1000 5000")
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--workers", type=int, default=1)
+    arg_parser.add_argument("--search-repeat", type=int, default=200)
+    arg_parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "usb_pd_bench"),
+                            help="Where generated PDFs are kept between runs")
+    arg_parser.add_argument("--save", metavar="BASELINE", help="Write the results as a JSON baseline")
+    arg_parser.add_argument("--compare", metavar="BASELINE", help="Fail on regressions against a saved baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Allowed relative slowdown or memory growth before failing")
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    current = {
+        "generator_version": GENERATOR_VERSION,
+        "seed": args.seed,
+        "workers": args.workers,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {}
+    }
+    print(f"{'pages':>6} {'toc':>7} {'sections':>9} {'metadata':>9} {'save':>7} {'index':>7} "
+          f"{'report':>7} {'pages/s':>8} {'search us':>10} {'RSS MB':>7}")
+    for pages in args.pages:
+        pdf_path = spec_path(args.work_dir, pages, args.seed)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run_size, pdf_path, args.workers, args.search_repeat).result()
+        current["results"][str(pages)] = result
+        seconds = result["seconds"]
+        print(f"{pages:>6} " + " ".join(f"{seconds[stage]:>{width}.3f}" for stage, width in
+                                        zip(STAGES, (7, 9, 9, 7, 7, 7)))
+              + f" {result['pages_per_second'] or 0:>8.1f} {result['search_us_per_query']:>10.1f}"
+              f" {result['peak_rss_mb'] or 0:>7.0f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("generator_version") != GENERATOR_VERSION or baseline.get("seed") != args.seed:
+            print("Baseline was recorded on different synthetic documents; regenerate it with --save")
+            sys.exit(2)
+        regressions = compare(baseline, current, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tag_classifier import TagClassifier
+
+
+def legacy_generate_tags(title):
+    # The original per-call implementation, kept here as the comparison baseline
+    keywords = {
+        "contract": "contracts", "negotiation": "negotiation", "device": "devices",
+        "communication": "communication", "avoidance": "avoidance", "cable": "cable",
+        "message": "messages", "partner": "partners", "policy": "policy",
+        "power": "power", "voltage": "voltage", "source": "source", "sink": "sink",
+        "protocol": "protocol", "data": "data", "control": "control"
+    }
+    title_lower = title.lower()
+    return [tag for keyword, tag in keywords.items() if keyword in title_lower]
+
+
+def substring_tags(vocabulary, text):
+    # The legacy approach applied to a larger vocabulary: one scan per term
+    text_lower = text.lower()
+    return [entry["tag"] for entry in vocabulary if any(term in text_lower for term in entry["terms"])]
+
+
+def synthetic_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))))
+    return [{"tag": word, "terms": [word]} for word in sorted(words)]
+
+
+def synthetic_section(vocabulary, words, rng):
+    filler = ["the", "port", "shall", "send", "after", "when", "value", "field", "is", "set", "to", "bit"]
+    terms = [entry["terms"][0] for entry in vocabulary]
+    return " ".join(rng.choice(terms) if rng.random() < 0.05 else rng.choice(filler) for _ in range(words))
+
+
+def load_titles(toc_path, count, rng):
+    if toc_path:
+        with open(toc_path, "r", encoding="utf-8") as f:
+            return [json.loads(line)["title"] for line in f if line.strip()]
+    subjects = ["Source Capabilities", "Sink Power Negotiation", "Cable Communication", "Policy Engine",
+                "Data Role Swap", "VCONN Control", "Protocol Layer Message", "Device Partner Voltage"]
+    return [f"{rng.choice(subjects)} Detail {number}" for number in range(count)]
+
+
+def per_call_us(function, inputs, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for value in inputs:
+            function(value)
+    return (time.perf_counter() - started) / (repeat * len(inputs)) * 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compiled tag classifier vs substring keyword loops")
+    arg_parser.add_argument("--toc", help="usb_pd_toc.jsonl to take titles from (synthetic titles otherwise)")
+    arg_parser.add_argument("--titles", type=int, default=5000)
+    arg_parser.add_argument("--section-words", type=int, default=2000)
+    arg_parser.add_argument("--sections", type=int, default=20)
+    arg_parser.add_argument("--vocabulary-sizes", type=int, nargs="+", default=[16, 100, 500, 2000])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+    rng = random.Random(7)
+
+    titles = load_titles(args.toc, args.titles, rng)
+    started = time.perf_counter()
+    classifier = TagClassifier.from_file()
+    load_ms = (time.perf_counter() - started) * 1000
+    legacy_us = per_call_us(legacy_generate_tags, titles, args.repeat)
+    classifier_us = per_call_us(classifier.tags, titles, args.repeat)
+    print(f"Titles: {len(titles)}; shipped vocabulary {classifier.term_count} terms, compiled in {load_ms:.1f}ms")
+    print(f"{'implementation':<34} {'us/title':>9}")
+    print(f"{'legacy generate_tags (16 terms)':<34} {legacy_us:>9.2f}")
+    print(f"{'TagClassifier (shipped vocabulary)':<34} {classifier_us:>9.2f}")
+
+    print(f"\nSection content: {args.sections} sections of {args.section_words} words")
+    print(f"{'terms':>6} {'substring ms':>13} {'classifier ms':>14} {'speedup':>9}")
+    for size in args.vocabulary_sizes:
+        vocabulary = synthetic_vocabulary(size, rng)
+        sections = [synthetic_section(vocabulary, args.section_words, rng) for _ in range(args.sections)]
+        sized = TagClassifier(vocabulary)
+        substring_ms = per_call_us(lambda text: substring_tags(vocabulary, text), sections, args.repeat) / 1000
+        classifier_ms = per_call_us(sized.tags, sections, args.repeat) / 1000
+        print(f"{size:>6} {substring_ms:>13.3f} {classifier_ms:>14.3f} {substring_ms / classifier_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
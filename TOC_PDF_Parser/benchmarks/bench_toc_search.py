@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from toc_search_utilities import TOCSearchEngine
+
+
+class LinearTOCSearchEngine(TOCSearchEngine):
+    # The pre-index implementation, kept here as the comparison baseline
+
+    def build_indexes(self):
+        pass
+
+    def search_by_level(self, level):
+        return [entry for entry in self.entries if entry["level"] == level]
+
+    def search_by_page_range(self, start_page, end_page):
+        return [entry for entry in self.entries if start_page <= entry["page"] <= end_page]
+
+    def get_children(self, section_id):
+        return [entry for entry in self.entries if entry["parent_id"] == section_id]
+
+    def get_all_descendants(self, section_id):
+        descendants = []
+
+        def collect_descendants(parent_id):
+            for child in self.get_children(parent_id):
+                descendants.append(child)
+                collect_descendants(child["section_id"])
+
+        collect_descendants(section_id)
+        return descendants
+
+    def get_path_to_root(self, section_id):
+        path = []
+        current_entry = next((entry for entry in self.entries if entry["section_id"] == section_id), None)
+        while current_entry:
+            path.insert(0, current_entry)
+            if current_entry["parent_id"]:
+                current_entry = next((entry for entry in self.entries
+                                      if entry["section_id"] == current_entry["parent_id"]), None)
+            else:
+                break
+        return path
+
+    def get_section_by_id(self, section_id):
+        return next((entry for entry in self.entries if entry["section_id"] == section_id), None)
+
+    def search_by_keyword(self, keyword, fields=None, limit=None):
+        results = self._scan_keyword(keyword, fields or ["title", "tags", "section_id", "full_path"])
+        return results[:limit] if limit else results
+
+
+def write_synthetic_toc(path: str, size: int, seed: int = 7):
+    # Chapters of 10 sections with 4 subsections each, pages increasing with
+    # occasional repeats, roughly the shape of a merged multi-revision TOC.
+    rng = random.Random(seed)
+    page = 1
+    written = 0
+    chapter = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size:
+            chapter += 1
+            ids = [(str(chapter), None)]
+            for section in range(1, 11):
+                section_id = f"{chapter}.{section}"
+                ids.append((section_id, str(chapter)))
+                ids.extend((f"{section_id}.{sub}", section_id) for sub in range(1, 5))
+            for section_id, parent_id in ids:
+                if written >= size:
+                    break
+                page += rng.choice((0, 0, 1, 2))
+                title = f"Power Delivery Topic {written}"
+                f.write(json.dumps({
+                    "section_id": section_id, "title": title, "page": page,
+                    "level": section_id.count(".") + 1, "parent_id": parent_id,
+                    "full_path": f"{section_id} {title}", "doc_title": "Synthetic", "tags": ["power"]
+                }) + "\n")
+                written += 1
+
+
+def time_queries(engine, queries, repeat):
+    started = time.perf_counter()
+    results = None
+    for _ in range(repeat):
+        results = [query(engine) for query in queries]
+    return (time.perf_counter() - started) / repeat, results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Indexed vs linear TOCSearchEngine")
+    arg_parser.add_argument("--entries", type=int, default=100000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "toc.jsonl")
+        write_synthetic_toc(path, args.entries)
+
+        started = time.perf_counter()
+        indexed = TOCSearchEngine(path)
+        indexed_load = time.perf_counter() - started
+        started = time.perf_counter()
+        linear = LinearTOCSearchEngine(path)
+        linear_load = time.perf_counter() - started
+
+    last = indexed.entries[-1]
+    middle = indexed.entries[len(indexed.entries) // 2]
+    chapter = middle["section_id"].split(".")[0]
+    workloads = {
+        "get_section_by_id": [lambda e: e.get_section_by_id(last["section_id"])],
+        "get_children": [lambda e: e.get_children(chapter)],
+        "get_all_descendants": [lambda e: e.get_all_descendants(chapter)],
+        "get_path_to_root": [lambda e: e.get_path_to_root(last["section_id"])],
+        "search_by_level": [lambda e: e.search_by_level(2)],
+        "search_by_page_range": [lambda e: e.search_by_page_range(middle["page"], middle["page"] + 20)],
+        "search_by_keyword": [lambda e: e.search_by_keyword(last["title"]),
+                              lambda e: e.search_by_keyword(middle["section_id"], ["section_id", "full_path"])],
+    }
+
+    print(f"{len(indexed.entries)} entries; load {linear_load:.2f}s linear, {indexed_load:.2f}s indexed")
+    print(f"{'query':<22} {'linear ms':>11} {'indexed ms':>11} {'speedup':>9}  results")
+    for name, queries in workloads.items():
+        linear_time, linear_results = time_queries(linear, queries, args.repeat)
+        indexed_time, indexed_results = time_queries(indexed, queries, args.repeat)
+        status = "identical" if linear_results == indexed_results else "DIFFER"
+        speedup = linear_time / indexed_time if indexed_time else float("inf")
+        print(f"{name:<22} {linear_time * 1000:>11.3f} {indexed_time * 1000:>11.3f} {speedup:>8.0f}x  {status}")
+
+    # Typo-tolerant lookups have no linear counterpart
+    typo = last["title"].replace("Topic", "Topc").lower()
+    fuzzy_time, fuzzy_results = time_queries(indexed, [lambda e: e.fuzzy_search(typo, 10)], args.repeat)
+    top = fuzzy_results[0][0]["title"] if fuzzy_results[0] else None
+    print(f"{'fuzzy_search':<22} {'':>11} {fuzzy_time * 1000:>11.3f} {'':>9}  {typo!r} -> {top!r}")
+
+
+if __name__ == "__main__":
+    main()
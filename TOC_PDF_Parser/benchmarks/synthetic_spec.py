@@ -0,0 +1,234 @@
+import argparse
+import math
+import random
+from typing import Dict, List, Tuple
+
+# Bump when the generated layout changes, so cached PDFs are rebuilt
+GENERATOR_VERSION = 1
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+LEFT_MARGIN = 72
+BODY_TOP, BODY_BOTTOM = 720, 80
+LEADING = 12
+TOC_LINES_PER_PAGE = 50
+HEADING_SIZES = {1: 16, 2: 13, 3: 12, 4: 11}
+DOC_TITLE = "Universal Serial Bus Power Delivery Specification"
+
+WORDS = ("the Source shall send a Message to the Sink when VBUS is within vSafe5V and the Port Partner "
+         "responds with GoodCRC after tSenderResponse expires the Cable Plug uses SOP' Communication "
+         "and the Policy Engine enters the PE_SRC_Ready state before an Explicit Contract is negotiated "
+         "Power Data Objects describe Fixed Supply Battery and Variable Supply capabilities while VCONN "
+         "powers the Electronically Marked Cable during Hard Reset and Soft Reset recovery").split()
+TITLE_WORDS = ["Source", "Sink", "Capabilities", "Message", "Cable", "Communication", "Policy", "Engine",
+               "Power", "Negotiation", "Protocol", "Layer", "Device", "Data", "Role", "Swap", "VCONN",
+               "Contract", "Voltage", "Timing", "Extended", "Battery", "Status", "Alert", "Revision"]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.sample(TITLE_WORDS, rng.randint(2, 5)))
+
+
+def _section_ids(rng: random.Random):
+    # Endless numbered outline: chapters hold sections, which may hold
+    # subsections down to level 4
+    chapter = 0
+    while True:
+        chapter += 1
+        yield f"{chapter}", chapter
+        for section in range(1, rng.randint(3, 8) + 1):
+            yield f"{chapter}.{section}", chapter
+            for subsection in range(1, rng.choice([0, 0, 2, 3, 4]) + 1):
+                yield f"{chapter}.{section}.{subsection}", chapter
+                for item in range(1, rng.choice([0, 0, 0, 2, 3]) + 1):
+                    yield f"{chapter}.{section}.{subsection}.{item}", chapter
+
+
+class SyntheticSpec:
+    # Lays out a specification-like document: title page, revision history,
+    # a TOC with dotted leaders, then numbered multi-level headings in bold
+    # with body text, ruled tables and figures under "Table N-M" / "Figure N-M"
+    # captions, and a running header and footer on every body page. The
+    # same seed and page count always give the same PDF.
+
+    def __init__(self, page_count: int, seed: int = 7):
+        self.page_count = max(5, page_count)
+        self.rng = random.Random(seed)
+        self.toc = []
+        self.body_pages = []
+        self._y = BODY_TOP
+
+    def _new_page(self) -> List[Tuple]:
+        page = []
+        self.body_pages.append(page)
+        self._y = BODY_TOP
+        return page
+
+    def _reserve(self, height: float) -> List[Tuple]:
+        page = self.body_pages[-1] if self.body_pages else self._new_page()
+        if self._y - height < BODY_BOTTOM:
+            page = self._new_page()
+        self._y -= height
+        return page
+
+    def _text(self, text: str, font: str = "F1", size: float = 10, x: float = LEFT_MARGIN):
+        height = size + (LEADING - 10)
+        page = self._reserve(height)
+        page.append(("text", font, size, x, self._y, text))
+
+    def _table(self, rows: List[List[str]]):
+        width = 120
+        row_height = 18
+        page = self._reserve(row_height * len(rows) + 6)
+        top = self._y + row_height * len(rows)
+        columns = len(rows[0])
+        for row in range(len(rows) + 1):
+            page.append(("line", LEFT_MARGIN, top - row * row_height, LEFT_MARGIN + columns * width,
+                         top - row * row_height))
+        for column in range(columns + 1):
+            page.append(("line", LEFT_MARGIN + column * width, top, LEFT_MARGIN + column * width,
+                         top - len(rows) * row_height))
+        for row, cells in enumerate(rows):
+            for column, cell in enumerate(cells):
+                page.append(("text", "F1", 9, LEFT_MARGIN + column * width + 4,
+                             top - row * row_height - 13, cell))
+
+    def _figure(self):
+        page = self._reserve(110)
+        page.append(("rect", LEFT_MARGIN + 40, self._y + 6, 300, 96))
+
+    def build(self) -> "SyntheticSpec":
+        rng = self.rng
+        tables = {}
+        figures = {}
+        for section_id, chapter in _section_ids(rng):
+            toc_pages = math.ceil((len(self.toc) + 1) / TOC_LINES_PER_PAGE)
+            if self.body_pages and 2 + toc_pages + len(self.body_pages) >= self.page_count and self._y < 400:
+                break
+            level = section_id.count(".") + 1
+            title = _title(rng)
+            self._y -= 6
+            self._text(f"{section_id} {title}", "F2", HEADING_SIZES[level])
+            self.toc.append((section_id, title, len(self.body_pages), level))
+
+            for _ in range(rng.randint(4, 30)):
+                self._text(_sentence(rng, rng.randint(8, 14)))
+            if rng.random() < 0.25:
+                tables[chapter] = tables.get(chapter, 0) + 1
+                self._text(f"Table {chapter}-{tables[chapter]} {_title(rng)}")
+                rows = [["Parameter", "Min", "Max", "Units"]]
+                rows += [[f"t{rng.choice(TITLE_WORDS)}", str(rng.randint(1, 20)), str(rng.randint(21, 99)), "ms"]
+                         for _ in range(rng.randint(2, 5))]
+                self._table(rows)
+            if rng.random() < 0.15:
+                figures[chapter] = figures.get(chapter, 0) + 1
+                self._figure()
+                self._text(f"Figure {chapter}-{figures[chapter]} {_title(rng)}")
+            if rng.random() < 0.2:
+                # Numbered body rows that are not headings
+                self._text(f"{rng.randint(1, 20)} V {rng.choice(['default supply level', 'maximum', 'nominal'])}")
+        # Trim, dropping the TOC entries of cut pages, then pad with plain text
+        # so the document has exactly page_count pages
+        front = 2 + math.ceil(len(self.toc) / TOC_LINES_PER_PAGE)
+        del self.body_pages[max(1, self.page_count - front):]
+        self.toc = [entry for entry in self.toc if entry[2] <= len(self.body_pages)]
+        front = 2 + math.ceil(len(self.toc) / TOC_LINES_PER_PAGE)
+        while front + len(self.body_pages) < self.page_count:
+            self._new_page()
+            for _ in range(40):
+                self._text(_sentence(rng, 12))
+        return self
+
+    def front_pages(self) -> List[List[Tuple]]:
+        pages = [
+            [("text", "F2", 20, LEFT_MARGIN, 600, DOC_TITLE), ("text", "F1", 12, LEFT_MARGIN, 570, "Revision 3.1")],
+            [("text", "F2", 14, LEFT_MARGIN, BODY_TOP, "Revision History"),
+             ("text", "F1", 10, LEFT_MARGIN, BODY_TOP - 20, "1.0 Initial release"),
+             ("text", "F1", 10, LEFT_MARGIN, BODY_TOP - 32, "3.1 Extended Power Range added")]
+        ]
+        toc_page_count = math.ceil(len(self.toc) / TOC_LINES_PER_PAGE)
+        for toc_page in range(toc_page_count):
+            page = [("text", "F2", 14, LEFT_MARGIN, BODY_TOP + 20, "Table of Contents")] if toc_page == 0 else []
+            entries = self.toc[toc_page * TOC_LINES_PER_PAGE:(toc_page + 1) * TOC_LINES_PER_PAGE]
+            for row, (section_id, title, printed_page, level) in enumerate(entries):
+                label = f"{section_id} {title} "
+                leader = "." * max(3, 90 - len(label) - 2 * level)
+                page.append(("text", "F1", 9, LEFT_MARGIN + 10 * (level - 1), BODY_TOP - row * 12,
+                             f"{label}{leader} {printed_page}"))
+            pages.append(page)
+        return pages
+
+    def toc_entries(self) -> List[Dict]:
+        return [{"section_id": section_id, "title": title, "page": page, "level": level}
+                for section_id, title, page, level in self.toc]
+
+    def write(self, path: str):
+        pages = self.front_pages()
+        body_start = len(pages)
+        pages += self.body_pages
+        count = len(pages)
+        with open(path, "wb") as f:
+            offsets = []
+
+            def write_object(body: bytes):
+                offsets.append(f.tell())
+                f.write(f"{len(offsets)} 0 obj\n".encode() + body + b"\nendobj\n")
+
+            f.write(b"%PDF-1.4\n")
+            kids = " ".join(f"{5 + 2 * index} 0 R" for index in range(count))
+            write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+            write_object(f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode())
+            write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+            write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>")
+            for index, page in enumerate(pages):
+                operations = []
+                if index >= body_start:
+                    operations.append(f"BT /F1 8 Tf {LEFT_MARGIN} 760 Td ({DOC_TITLE}, Revision 3.1) Tj ET")
+                    operations.append(f"BT /F1 8 Tf 290 40 Td (Page {index - body_start + 1}) Tj ET")
+                for item in page:
+                    if item[0] == "text":
+                        _, font, size, x, y, text = item
+                        operations.append(f"BT /{font} {size} Tf {x} {y:.1f} Td ({_escape(text)}) Tj ET")
+                    elif item[0] == "line":
+                        _, x0, y0, x1, y1 = item
+                        operations.append(f"0.5 w {x0} {y0:.1f} m {x1} {y1:.1f} l S")
+                    else:
+                        _, x, y, width, height = item
+                        operations.append(f"1 w {x} {y:.1f} {width} {height} re S")
+                stream = "\n".join(operations).encode("latin-1")
+                write_object(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                             f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {6 + 2 * index} 0 R >>"
+                             .encode())
+                write_object(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            xref = f.tell()
+            f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+            for offset in offsets:
+                f.write(f"{offset:010d} 00000 n \n".encode())
+            f.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def write_synthetic_spec(path: str, page_count: int, seed: int = 7) -> SyntheticSpec:
+    spec = SyntheticSpec(page_count, seed).build()
+    spec.write(path)
+    return spec
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Write a synthetic USB PD-like specification PDF")
+    arg_parser.add_argument("output", help="PDF path to write")
+    arg_parser.add_argument("--pages", type=int, default=100, help="Total page count, 5 or more")
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+    spec = write_synthetic_spec(args.output, args.pages, args.seed)
+    print(f"Wrote {args.output}: {args.pages} pages, {len(spec.toc)} TOC entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from jsonl_reader import DEFAULT_SKIP_FIELDS, JSONLRecordReader
+
+# Binary companion of a JSONL output: "usb_pd_spec.jsonl" -> "usb_pd_spec.bin".
+#
+# Layout, little-endian: a fixed header, then 8-byte aligned sections, then a
+# JSON directory locating every section. Each field is one column over all
+# records:
+#   int      int32 or int64 values, the type's minimum marking null
+#   str      uint32 ids into the shared string table, so repeated values
+#            such as doc_title or parent ids are stored once
+#   strlist  per-record [start, end) into a pool of string ids (tags)
+#   blob     per-record offsets into a data area of UTF-8 text, each value
+#            zlib-compressed on its own when that makes it smaller (content)
+#   json     like blob but holding compact JSON, plus each value's list
+#            length so summaries never decode it (tables, figures)
+# Every record also has a shape id: the ordered tuple of keys it carries, so
+# records convert back to JSONL with their original key order.
+MAGIC = b"USBPDREC"
+FORMAT_VERSION = 1
+BINARY_SUFFIX = ".bin"
+HEADER = struct.Struct("<8sHxxIQQ")
+ALIGNMENT = 8
+COMPRESS_MIN_BYTES = 128
+COMPRESS_LEVEL = 6
+RECORD_FILES = ("usb_pd_toc.jsonl", "usb_pd_spec.jsonl")
+
+NULL_ID = 0xFFFFFFFF
+NO_COUNT = 0xFFFFFFFF
+CODEC_RAW, CODEC_ZLIB, CODEC_NULL = 0, 1, 2
+INT_NULLS = {"i": -2 ** 31, "q": -2 ** 63}
+ITER_BATCH = 512
+
+
+def binary_path_for(jsonl_path: str) -> str:
+    return os.path.splitext(jsonl_path)[0] + BINARY_SUFFIX
+
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _field_type(name: str, values: List, skip_fields) -> str:
+    present = [value for value in values if value is not None]
+    if not present:
+        return "json"
+    if all(type(value) is int for value in present):
+        if -2 ** 31 < min(present) and max(present) < 2 ** 31:
+            return "int:i"
+        if -2 ** 63 < min(present) and max(present) < 2 ** 63:
+            return "int:q"
+        return "json"
+    if all(isinstance(value, str) for value in present):
+        return "blob" if name in skip_fields else "str"
+    if len(present) == len(values) and all(
+            isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value) for value in present):
+        return "strlist"
+    return "json"
+
+
+class _SectionWriter:
+
+    def __init__(self, f):
+        self.f = f
+
+    def add(self, data: bytes) -> List[int]:
+        padding = -self.f.tell() % ALIGNMENT
+        self.f.write(b"\0" * padding)
+        offset = self.f.tell()
+        self.f.write(data)
+        return [offset, len(data)]
+
+
+def write_binary_records(path: str, records: Iterable[Dict], key: str = "section_id",
+                         skip_fields=DEFAULT_SKIP_FIELDS) -> int:
+    records = list(records)
+    shapes = {}
+    shape_ids = array("I")
+    values = {}
+    for record in records:
+        keys = tuple(record)
+        shape_ids.append(shapes.setdefault(keys, len(shapes)))
+        for name, value in record.items():
+            values.setdefault(name, []).append(value)
+
+    strings = []
+    string_ids = {}
+
+    def intern(text: str) -> int:
+        string_id = string_ids.get(text)
+        if string_id is None:
+            string_id = string_ids[text] = len(strings)
+            strings.append(text)
+        return string_id
+
+    with open(path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        sections = _SectionWriter(f)
+        fields = {}
+        for name in values:
+            field_type = _field_type(name, values[name], skip_fields)
+            field = {"type": field_type.split(":")[0]}
+            if field_type.startswith("int"):
+                typecode = field_type[-1]
+                null = INT_NULLS[typecode]
+                column = array(typecode, (null if record.get(name) is None else record[name] for record in records))
+                field.update(typecode=typecode, values=sections.add(_le_bytes(column)))
+            elif field_type == "str":
+                column = array("I", (intern(record[name]) if record.get(name) is not None else NULL_ID
+                                     for record in records))
+                field["values"] = sections.add(_le_bytes(column))
+            elif field_type == "strlist":
+                starts = array("Q", [0])
+                pool = array("I")
+                for record in records:
+                    pool.extend(intern(item) for item in record.get(name, ()))
+                    starts.append(len(pool))
+                field.update(starts=sections.add(_le_bytes(starts)), pool=sections.add(_le_bytes(pool)))
+            else:
+                offsets = array("Q", [0])
+                codecs = array("B")
+                counts = array("I")
+                data = bytearray()
+                for record in records:
+                    value = record.get(name)
+                    counts.append(len(value) if isinstance(value, (list, tuple)) else NO_COUNT)
+                    if value is None:
+                        codecs.append(CODEC_NULL)
+                    else:
+                        raw = (value if field_type == "blob"
+                               else json.dumps(value, ensure_ascii=False, separators=(",", ":"))).encode("utf-8")
+                        compressed = zlib.compress(raw, COMPRESS_LEVEL) if len(raw) >= COMPRESS_MIN_BYTES else raw
+                        if len(compressed) < len(raw):
+                            codecs.append(CODEC_ZLIB)
+                            data += compressed
+                        else:
+                            codecs.append(CODEC_RAW)
+                            data += raw
+                    offsets.append(len(data))
+                field.update(offsets=sections.add(_le_bytes(offsets)), codecs=sections.add(codecs.tobytes()),
+                             data=sections.add(bytes(data)))
+                if field_type == "json":
+                    field["counts"] = sections.add(_le_bytes(counts))
+            fields[name] = field
+
+        encoded = [text.encode("utf-8") for text in strings]
+        string_offsets = array("Q", [0])
+        for text in encoded:
+            string_offsets.append(string_offsets[-1] + len(text))
+        directory = {
+            "key": key,
+            "shapes": [list(keys) for keys in shapes],
+            "shape_ids": sections.add(_le_bytes(shape_ids)),
+            "strings": {"count": len(strings), "offsets": sections.add(_le_bytes(string_offsets)),
+                        "data": sections.add(b"".join(encoded))},
+            "fields": fields
+        }
+        directory_offset, directory_length = sections.add(
+            json.dumps(directory, separators=(",", ":")).encode("utf-8"))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(records), directory_offset, directory_length))
+    return len(records)
+
+
+class BinaryRecordReader:
+    # Reads a binary record file through a memory map with the same API as
+    # JSONLRecordReader. Nothing is decoded up front: column() hands out the
+    # int and string-id columns as memoryviews over the map, string() decodes
+    # and caches one interned string, and blob() returns a stored text value
+    # without copying it unless it has to be decompressed. Views are only
+    # valid until the reader is closed.
+
+    def __init__(self, path: str, key: Optional[str] = None, skip_fields=DEFAULT_SKIP_FIELDS):
+        self.path = path
+        self.skip_fields = tuple(skip_fields)
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._map)
+        self._views = []
+        magic, version, self._count, directory_offset, directory_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} binary record file")
+        directory = json.loads(bytes(self._buffer[directory_offset:directory_offset + directory_length]))
+        self.key = key or directory["key"]
+        self._shapes = [tuple(keys) for keys in directory["shapes"]]
+        self._shape_ids = self._view(directory["shape_ids"], "I")
+        strings = directory["strings"]
+        self._string_offsets = self._view(strings["offsets"], "Q")
+        self._string_data = self._view(strings["data"])
+        self._strings = [None] * strings["count"]
+        self._all_strings = False
+        self._fields = directory["fields"]
+        for field in self._fields.values():
+            for part, typecode in (("values", field.get("typecode", "I")), ("starts", "Q"), ("pool", "I"),
+                                   ("offsets", "Q"), ("codecs", "B"), ("data", None), ("counts", "I")):
+                if part in field:
+                    field[part] = self._view(field[part], typecode)
+        self._summaries = None
+        self._by_key = None
+
+    def _view(self, section: List[int], typecode: Optional[str] = None):
+        offset, length = section
+        view = self._buffer[offset:offset + length]
+        self._views.append(view)
+        if typecode is None or typecode == "B":
+            return view
+        if sys.byteorder == "big":
+            values = array(typecode, view)
+            values.byteswap()
+            return values
+        view = view.cast(typecode)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._buffer.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # A caller still holds a blob() view; the map closes with it
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._fields)
+
+    def string(self, string_id: int) -> str:
+        text = self._strings[string_id]
+        if text is None:
+            start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+            text = self._strings[string_id] = str(self._string_data[start:end], "utf-8")
+        return text
+
+    def _string_table(self) -> List[str]:
+        if not self._all_strings:
+            for string_id in range(len(self._strings)):
+                self.string(string_id)
+            self._all_strings = True
+        return self._strings
+
+    def column(self, name: str):
+        # Int values, or string ids for str columns, of every record; absent
+        # and null values hold the type's null marker
+        return self._fields[name]["values"]
+
+    def blob(self, position: int, name: str) -> Optional[Union[memoryview, bytes]]:
+        field = self._fields[name]
+        codec = field["codecs"][position]
+        if codec == CODEC_NULL:
+            return None
+        payload = field["data"][field["offsets"][position]:field["offsets"][position + 1]]
+        return zlib.decompress(payload) if codec == CODEC_ZLIB else payload
+
+    def _decode(self, name: str, position: int):
+        field = self._fields[name]
+        field_type = field["type"]
+        if field_type == "int":
+            value = field["values"][position]
+            return None if value == INT_NULLS[field["typecode"]] else value
+        if field_type == "str":
+            string_id = field["values"][position]
+            return None if string_id == NULL_ID else self.string(string_id)
+        if field_type == "strlist":
+            pool = field["pool"]
+            return [self.string(pool[index]) for index in range(field["starts"][position],
+                                                                field["starts"][position + 1])]
+        return self._decode_range(name, position, position + 1)[0]
+
+    def _decode_range(self, name: str, start: int, end: int) -> List:
+        # Values of records start..end-1, decoded a column slice at a time
+        field = self._fields[name]
+        field_type = field["type"]
+        if field_type == "int":
+            values = field["values"][start:end].tolist()
+            null = INT_NULLS[field["typecode"]]
+            return [None if value == null else value for value in values] if null in values else values
+        if field_type == "str":
+            table = self._string_table()
+            return [None if string_id == NULL_ID else table[string_id]
+                    for string_id in field["values"][start:end].tolist()]
+        if field_type == "strlist":
+            table = self._string_table()
+            starts = field["starts"][start:end + 1].tolist()
+            pool = field["pool"][starts[0]:starts[-1]].tolist()
+            base = starts[0]
+            return [[table[string_id] for string_id in pool[first - base:last - base]]
+                    for first, last in zip(starts, starts[1:])]
+        offsets = field["offsets"][start:end + 1].tolist()
+        counts = field["counts"][start:end].tolist() if field_type == "json" else None
+        data = field["data"]
+        values = []
+        for index, codec in enumerate(field["codecs"][start:end].tolist()):
+            if codec == CODEC_NULL:
+                values.append(None)
+            elif counts is not None and counts[index] == 0:
+                values.append([])
+            else:
+                payload = data[offsets[index]:offsets[index + 1]]
+                text = str(zlib.decompress(payload) if codec == CODEC_ZLIB else payload, "utf-8")
+                values.append(text if counts is None else json.loads(text))
+        return values
+
+    def _count_column(self, name: str) -> Optional[List]:
+        # List lengths of a skipped field, None where the value is no list
+        field = self._fields[name]
+        if field["type"] == "strlist":
+            starts = field["starts"].tolist()
+            return [end - start for start, end in zip(starts, starts[1:])]
+        if field["type"] == "json":
+            return [None if count == NO_COUNT else count for count in field["counts"].tolist()]
+        return None
+
+    def summaries(self) -> List[Dict]:
+        # Same records as JSONLRecordReader.summaries(), built a column at a
+        # time; skipped fields are never decoded
+        if self._summaries is None:
+            columns = {}
+            for name in self._fields:
+                if name not in self.skip_fields:
+                    columns[name] = (name, self._decode_range(name, 0, self._count), False)
+                else:
+                    counts = self._count_column(name)
+                    if counts is not None:
+                        columns[name] = (f"{name}_count", counts, True)
+            layouts = [[columns[name] for name in keys if name in columns] for keys in self._shapes]
+            summaries = []
+            for position, shape_id in enumerate(self._shape_ids.tolist()):
+                summary = {}
+                for key, values, optional in layouts[shape_id]:
+                    value = values[position]
+                    if not optional or value is not None:
+                        summary[key] = value
+                summaries.append(summary)
+            self._summaries = summaries
+        return self._summaries
+
+    def record(self, position: int) -> Dict:
+        return {name: self._decode(name, position) for name in self._shapes[self._shape_ids[position]]}
+
+    def _key_positions(self) -> Dict:
+        if self._by_key is None:
+            self._by_key = {}
+            values = self._decode_range(self.key, 0, self._count) if self.key in self._fields else [None] * self._count
+            for position, shape_id in enumerate(self._shape_ids.tolist()):
+                value = values[position] if self.key in self._shapes[shape_id] else None
+                self._by_key.setdefault(value, []).append(position)
+        return self._by_key
+
+    def get(self, key_value: str) -> Optional[Dict]:
+        positions = self._key_positions().get(key_value)
+        return self.record(positions[0]) if positions else None
+
+    def get_all(self, key_value: str) -> List[Dict]:
+        return [self.record(position) for position in self._key_positions().get(key_value, [])]
+
+    def iter_records(self) -> Iterator[Dict]:
+        # Decodes ITER_BATCH records a column at a time, so a full pass costs
+        # little more than the values themselves while memory stays bounded
+        shape_ids = self._shape_ids.tolist()
+        for start in range(0, self._count, ITER_BATCH):
+            end = min(start + ITER_BATCH, self._count)
+            columns = {name: self._decode_range(name, start, end) for name in self._fields}
+            for index, shape_id in enumerate(shape_ids[start:end]):
+                yield {name: columns[name][index] for name in self._shapes[shape_id]}
+
+
+def open_records(path: str, key: str = "section_id", skip_fields=DEFAULT_SKIP_FIELDS):
+    # A JSONL output path, or its binary companion: the binary file is read
+    # when it exists and is not older than the JSONL, which may be absent
+    binary_path = path if path.endswith(BINARY_SUFFIX) else binary_path_for(path)
+    if os.path.exists(binary_path) and (
+            binary_path == path or not os.path.exists(path)
+            or os.path.getmtime(binary_path) >= os.path.getmtime(path)):
+        return BinaryRecordReader(binary_path, key, skip_fields)
+    return JSONLRecordReader(path, key, skip_fields)
+
+
+def read_jsonl_records(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def jsonl_to_binary(jsonl_path: str, binary_path: Optional[str] = None) -> str:
+    binary_path = binary_path or binary_path_for(jsonl_path)
+    write_binary_records(binary_path, read_jsonl_records(jsonl_path))
+    return binary_path
+
+
+def binary_to_jsonl(binary_path: str, jsonl_path: Optional[str] = None) -> str:
+    # Written the way the parser writes its outputs, so converting a binary
+    # file back reproduces the original JSONL
+    jsonl_path = jsonl_path or os.path.splitext(binary_path)[0] + ".jsonl"
+    with BinaryRecordReader(binary_path) as reader, open(jsonl_path, "w", encoding="utf-8") as f:
+        for record in reader.iter_records():
+            json.dump(record, f, ensure_ascii=False)
+            f.write("\n")
+    return jsonl_path
+
+
+def output_directories(root: str) -> List[str]:
+    # A single output directory, or every document of a batch_parser corpus
+    manifest_path = os.path.join(root, "corpus_manifest.json")
+    if not os.path.exists(manifest_path):
+        return [root]
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        documents = [entry for entry in json.load(f).get("documents", []) if entry.get("status") != "failed"]
+    return [entry.get("output_dir") or os.path.join(root, entry["document_id"]) for entry in documents]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Convert parser outputs between JSONL and the binary format")
+    arg_parser.add_argument("direction", choices=["to-binary", "to-jsonl"])
+    arg_parser.add_argument("paths", nargs="+",
+                            help="Output files, output directories or batch_parser corpus roots")
+    args = arg_parser.parse_args()
+
+    converted = 0
+    for path in args.paths:
+        if os.path.isdir(path):
+            sources = [os.path.join(directory, name) for directory in output_directories(path)
+                       for name in RECORD_FILES]
+        else:
+            sources = [path]
+        for source in sources:
+            if args.direction == "to-binary":
+                if not os.path.exists(source):
+                    continue
+                target = jsonl_to_binary(source)
+            else:
+                source = source if source.endswith(BINARY_SUFFIX) else binary_path_for(source)
+                if not os.path.exists(source):
+                    continue
+                target = binary_to_jsonl(source)
+            print(f"{source} ({os.path.getsize(source)} bytes) -> {target} ({os.path.getsize(target)} bytes)")
+            converted += 1
+    print(f"Converted {converted} file(s)")
+
+
+if __name__ == "__main__":
+    main()
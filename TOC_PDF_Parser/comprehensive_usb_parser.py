@@ -5,175 +5,585 @@ import logging
 warnings.filterwarnings("ignore", message="Cannot set gray non-stroke color.*")
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
-import pdfplumber
 import re
 import json
 import os
+import shutil
+import time
+import argparse
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
+
+from page_cache import PageCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from table_extractor import is_table_caption
+from tag_classifier import TagClassifier
+from heading_detector import HeadingDetector, SECTION_PATTERN
+from instrumentation import peak_rss_mb, page_time_summary, profiled
+from binary_records import binary_path_for, jsonl_to_binary, write_binary_records
+from cross_references import CrossReferenceIndex, XREF_FILE
+from records import SectionRecord, TOCEntry, shared_tuple, to_json
+
+if TYPE_CHECKING:
+    from page_text_source import PageTextSource
+
+
+TOC_PATTERNS = [
+    re.compile(r"^(\d+(?:\.\d+)*?)\s+(.+?)\.{2,}\s*(\d+)$"),
+    re.compile(r"^(\d+(?:\.\d+)*?)\s+(.+?)\s+(\d+)$")
+]
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SECTION_ID_PATTERN = re.compile(r"^\d+(?:\.\d+)*$")
+TOC_PAGE_WINDOW = 10
+# Pages held back from the section stage while the TOC is still being read;
+# heading styles are learned from the TOC once it is complete, or from
+# whatever TOC was found when this many pages have gone by
+MAX_PENDING_PAGES = 40
+
+TOC_FILE = "usb_pd_toc.jsonl"
+SPEC_FILE = "usb_pd_spec.jsonl"
+METADATA_FILE = "usb_pd_metadata.jsonl"
+INSTRUMENTATION_FILE = "usb_pd_instrumentation.json"
+
+
+def parse_section_selection(value: str) -> List[Tuple[str, str]]:
+    # "6.4-6.5,7.1" -> [("6.4", "6.5"), ("7.1", "7.1")]; a range runs from
+    # its first section through the end of its last one, subsections included
+    selection = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first_id, _, last_id = item.partition("-")
+        first_id, last_id = first_id.strip(), (last_id or first_id).strip()
+        if not SECTION_ID_PATTERN.match(first_id) or not SECTION_ID_PATTERN.match(last_id):
+            raise ValueError(f"Not a section id or range: {item}")
+        selection.append((first_id, last_id))
+    return selection
 
 
 class ComprehensiveUSBPDParser:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, workers: int = 1, cache: Optional[PageCache] = None,
+                 document_id: str = "usb_pd_spec_v1", document_version: str = "1.0",
+                 extract_tables: bool = False, tagger: Optional[TagClassifier] = None,
+                 tag_content: bool = False, detect_headings: bool = True,
+                 window_pages: Optional[int] = None, memory_ceiling_mb: Optional[float] = None):
         self.pdf_path = pdf_path
+        self.workers = workers
+        # None keeps the page source's default window
+        self.window_pages = window_pages
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.cache = cache
+        self.extract_tables = extract_tables
+        self.tagger = tagger or TagClassifier.from_file()
+        self.tag_content = tag_content
+        self.detect_headings = detect_headings
+        self.heading_detector = None
+        self._heading_styles_learned = False
+        self.document_id = document_id
+        self.document_version = document_version
         self.doc_title = "Universal Serial Bus Power Delivery Specification"
         self.toc_entries = []
         self.content_sections = []
         self.metadata = {}
+        # (first_id, last_id) ranges when only selected sections were
+        # extracted, see extract_selected_sections
+        self.selection = None
         self.tables = []
         self.figures = []
+        # "Section X.Y" / "Table N-M" references between sections, see cross_references.py
+        self.cross_references = CrossReferenceIndex()
+        self.toc_pages = None
+        self.section_totals = {}
+        self.page_distribution = {}
+        self.spec_streamed_to = None
+        self.stage_times = {}
+        # Pattern matches and heading decisions, see instrumentation()
+        self.counters = {"toc_lines_matched": 0, "lines_scanned": 0, "heading_candidates": 0,
+                         "headings_rejected": 0, "running_lines_dropped": 0, "tag_calls": 0}
+        # Seconds the section stage spent on each page
+        self.page_process_seconds = {}
+        self._created = time.perf_counter()
+        self._source = None
+        self._spec_stream = None
+        self._reset_section_totals()
         
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def page_source(self) -> "PageTextSource":
+        if self._source is None:
+            # pdfplumber is imported with the page source, so tools that only
+            # need this module's constants or record helpers start quickly
+            from page_text_source import DEFAULT_WINDOW_PAGES, PageTextSource
+            window_pages = DEFAULT_WINDOW_PAGES if self.window_pages is None else self.window_pages
+            self._source = PageTextSource(self.pdf_path, workers=self.workers, cache=self.cache,
+                                          extract_tables=self.extract_tables, extract_layout=self.detect_headings,
+                                          window_pages=window_pages, memory_ceiling_mb=self.memory_ceiling_mb)
+        return self._source
+    
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+    
+    @contextmanager
+    def stage_timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_stage_time(stage, time.perf_counter() - started)
+    
+    def _add_stage_time(self, stage: str, seconds: float):
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + seconds
+    
     def extract_toc(self) -> List[Dict]:
         
-        toc_entries = []
-        toc_patterns = [
-            re.compile(r"^(\d+(?:\.\d+)*?)\s+(.+?)\.{2,}\s*(\d+)$"),
-            re.compile(r"^(\d+(?:\.\d+)*?)\s+(.+?)\s+(\d+)$")
-        ]
+        # Read serially: the TOC sits in the first few pages, and iter_pages()
+        # with workers would start a pool and extract chunks past the window
+        # only to throw them away
+        self._begin_toc()
+        source = self.page_source()
+        for page_num in range(1, source.page_count + 1):
+            if self._consume_toc_page(page_num, source.page_text(page_num)):
+                break
+        
+        self.toc_entries = self._toc_entries
+        return self.toc_entries
+    
+    def _begin_toc(self):
+        self._toc_entries = []
+        self._toc_start_page = None
+        self.toc_pages = None
+    
+    def _consume_toc_page(self, page_num: int, text: str) -> bool:
+        # Returns True once the TOC window after the "Contents" page is exhausted
+        if self._toc_start_page is None:
+            if not text:
+                return False
+            if "Table of Contents" not in text and "Contents" not in text:
+                return False
+            self._toc_start_page = page_num
+        self.toc_pages = (self._toc_start_page, page_num)
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if not text:
+        if text:
+            for line in text.split('\n'):
+                clean_line = WHITESPACE_PATTERN.sub(' ', line.strip())
+                if len(clean_line) < 5:
                     continue
                     
-                if "Table of Contents" in text or "Contents" in text:
-                    
-                    for j in range(i, min(i + 10, len(pdf.pages))):
-                        pg_text = pdf.pages[j].extract_text()
-                        if not pg_text:
-                            continue
-                            
-                        lines = pg_text.split('\n')
-                        for line in lines:
-                            clean_line = re.sub(r'\s+', ' ', line.strip())
-                            if len(clean_line) < 5:
-                                continue
-                                
-                            for pattern in toc_patterns:
-                                match = pattern.match(clean_line)
-                                if match:
-                                    section_id, title, page_num = match.groups()
-                                    title = title.rstrip('. ').strip()
-                                    level = section_id.count('.') + 1
-                                    parent_id = '.'.join(section_id.split('.')[:-1]) if '.' in section_id else None
-                                    
-                                    entry = {
-                                        "section_id": section_id,
-                                        "title": title,
-                                        "page": int(page_num),
-                                        "level": level,
-                                        "parent_id": parent_id,
-                                        "full_path": f"{section_id} {title}",
-                                        "doc_title": self.doc_title,
-                                        "tags": self.generate_tags(title)
-                                    }
-                                    toc_entries.append(entry)
-                                    break
-                        # Stop after processing the ToC pages
-                    break
+                for pattern in TOC_PATTERNS:
+                    match = pattern.match(clean_line)
+                    if match:
+                        self.counters["toc_lines_matched"] += 1
+                        section_id, title, page_num_text = match.groups()
+                        title = title.rstrip('. ').strip()
+                        level = section_id.count('.') + 1
+                        parent_id = '.'.join(section_id.split('.')[:-1]) if '.' in section_id else None
+                        
+                        entry = TOCEntry.from_dict({
+                            "section_id": section_id,
+                            "title": title,
+                            "page": int(page_num_text),
+                            "level": level,
+                            "parent_id": parent_id,
+                            "full_path": f"{section_id} {title}",
+                            "doc_title": self.doc_title,
+                            "tags": self.generate_tags(title)
+                        })
+                        self._toc_entries.append(entry)
+                        break
         
-        self.toc_entries = toc_entries
-        return toc_entries
+        return page_num >= self._toc_start_page + TOC_PAGE_WINDOW - 1
+    
+    def learn_heading_styles(self, state: Optional[Dict] = None) -> Optional[HeadingDetector]:
+        # Uses the TOC found so far; state restores a previously learned
+        # detector (see HeadingDetector.to_dict) instead of sampling pages.
+        # Without a TOC or any located heading, every numbered line is taken
+        # as a heading as before.
+        self._heading_styles_learned = True
+        if not self.detect_headings:
+            return None
+        detector = HeadingDetector(self.toc_entries, self.toc_pages)
+        if state is not None:
+            detector.load_dict(state)
+        else:
+            with self.stage_timer("heading_styles"):
+                detector.learn(self.page_source(), self.page_source().page_count)
+        self.heading_detector = detector if detector.trained else None
+        return self.heading_detector
+    
+    def calibrate_page_offset(self) -> Optional[int]:
+        # Physical minus printed page number, None if no TOC heading was found
+        if not self._heading_styles_learned:
+            self.learn_heading_styles()
+        if self.heading_detector is not None:
+            return self.heading_detector.page_offset
+        source = self.page_source()
+        return HeadingDetector(self.toc_entries, self.toc_pages).calibrate_offset(source, source.page_count)
+    
+    def extract_selected_sections(self, selection: List[Tuple[str, str]]) -> List[Dict]:
+        # selection holds (first_id, last_id) ranges in TOC order, see
+        # parse_section_selection. Only the pages the TOC gives for each range
+        # are read, one page either side of the calibrated position; sections
+        # come out as a full parse would produce them.
+        if not self.toc_entries:
+            with self.stage_timer("toc"):
+                self.extract_toc()
+        offset = self.calibrate_page_offset()
+        if offset is None:
+            print("⚠️ No TOC heading found in the body; reading every page")
+        
+        ranges = sorted(self._toc_range(first_id, last_id) for first_id, last_id in selection)
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        
+        total_pages = self.page_source().page_count
+        selected = []
+        # Without an offset every range is filtered out of one full pass
+        extracted = {}
+        for start, end in merged:
+            entries = self.toc_entries[start:end + 1]
+            wanted = {entry["section_id"] for entry in entries}
+            last_page = max(entry["page"] for entry in entries)
+            following = self.toc_entries[end + 1]["page"] if end + 1 < len(self.toc_entries) else None
+            # Without a following entry at or after the range, the last
+            # section may run to the end of the document
+            close_last = following is None or following < last_page
+            if offset is None:
+                start_page, end_page, close_last = 1, total_pages, True
+            else:
+                start_page = max(1, entries[0]["page"] + offset - 1)
+                end_page = total_pages if close_last else following + offset + 1
+            
+            window = (start_page, min(end_page, total_pages), close_last)
+            if window not in extracted:
+                with self.stage_timer("sections"):
+                    extracted[window] = self.extract_sections_in_range(*window)
+            sections = extracted[window]
+            # The window's edge pages may hold the tail of the previous section
+            # and the start of the next; subsections missing from the TOC are
+            # kept with their parent
+            first_id = entries[0]["section_id"]
+            started = False
+            for section in sections:
+                started = started or section["section_id"] == first_id
+                parts = section["section_id"].split(".")
+                if started and any(".".join(parts[:depth]) in wanted for depth in range(1, len(parts) + 1)):
+                    selected.append(section)
+        
+        self.set_sections(selected)
+        self.selection = list(selection)
+        with self.stage_timer("metadata"):
+            self.generate_metadata()
+        return selected
+    
+    def _toc_range(self, first_id: str, last_id: str) -> Tuple[int, int]:
+        # Indices of the TOC entries from first_id through the last entry of
+        # last_id's subtree
+        ids = [entry["section_id"] for entry in self.toc_entries]
+        if first_id not in ids:
+            raise ValueError(f"Section {first_id} is not in the TOC")
+        start = ids.index(first_id)
+        end = None
+        for index in range(start, len(ids)):
+            if ids[index] == last_id or (end is not None and ids[index].startswith(last_id + ".")):
+                end = index
+            elif end is not None:
+                break
+        if end is None:
+            raise ValueError(f"Section {last_id} does not follow {first_id} in the TOC")
+        return start, end
     
     def extract_all_sections(self) -> List[Dict]:
         
-        content_sections = []
+        return self.extract_sections_in_range(1, None)
+    
+    def extract_sections_in_range(self, start_page: int, end_page: Optional[int],
+                                  close_last: bool = True) -> List[Dict]:
+        # Runs the section state machine from a fresh state over a page window.
+        # With close_last=False the section still open at end_page is dropped,
+        # because its content continues past the window.
+        if not self._heading_styles_learned:
+            self.learn_heading_styles()
+        self._begin_sections()
+        for page_num, text in self.page_source().iter_pages(start_page, end_page):
+            self._consume_section_page(page_num, text)
+        if not close_last:
+            self._current_section = None
+        self._finish_sections()
+        
+        return self.content_sections
+    
+    def _begin_sections(self):
+        self._sections = []
+        self._current_section = None
+        self._content_parts = []
+        self._word_count = 0
+        self.tables = []
+        self.figures = []
+        self.cross_references = CrossReferenceIndex()
+        self._reset_section_totals()
+    
+    def _reset_section_totals(self):
+        self.section_totals = {"sections": 0, "tables": 0, "tables_with_data": 0, "figures": 0}
+        self.page_distribution = {"1-50": 0, "51-100": 0, "101-200": 0, "201+": 0}
+    
+    def _account_section(self, section: Dict):
+        # Running aggregates let metadata be produced without retaining sections
+        self.section_totals["sections"] += 1
+        self.section_totals["tables"] += len(section["tables"])
+        self.section_totals["tables_with_data"] += sum(1 for table in section["tables"] if table["data"])
+        self.section_totals["figures"] += len(section["figures"])
+        page = section["page_start"]
+        if page <= 50:
+            self.page_distribution["1-50"] += 1
+        elif page <= 100:
+            self.page_distribution["51-100"] += 1
+        elif page <= 200:
+            self.page_distribution["101-200"] += 1
+        else:
+            self.page_distribution["201+"] += 1
+    
+    def _close_section(self, page_end: Optional[int] = None):
+        section = self._current_section
+        # Lines are stripped and non-empty, so joining them with single spaces
+        # gives the same text as the old " " + line accumulation, in linear time.
+        section["content"] = " ".join(self._content_parts)
+        if page_end is not None:
+            section["page_end"] = page_end
+        section["word_count"] = self._word_count
+        if self.tag_content:
+            section["tags"] = self.generate_tags(section["title"] + "\n" + section["content"])
+        # The section is complete: empty lists become the shared empty tuple
+        # and equal tag lists one shared tuple, see records.py
+        for field in ("tables", "figures", "subsections"):
+            if not section[field]:
+                section[field] = ()
+        section["tags"] = shared_tuple(section["tags"])
+        self._account_section(section)
+        with self.stage_timer("cross_references"):
+            self.cross_references.add_section(section)
+        
+        if self._spec_stream is not None:
+            with self.stage_timer("serialization"):
+                self._spec_stream.write(to_json(section))
+                self._spec_stream.write("\n")
+        else:
+            self._sections.append(section)
+            self.tables.extend(section["tables"])
+            self.figures.extend(section["figures"])
+    
+    def set_sections(self, sections: List[Dict]):
+        self._reset_section_totals()
+        self.content_sections = sections
+        self.tables = [table for section in sections for table in section["tables"]]
+        self.figures = [figure for section in sections for figure in section["figures"]]
+        for section in sections:
+            self._account_section(section)
+        self.cross_references = CrossReferenceIndex.from_sections(sections)
+    
+    def _consume_section_page(self, page_num: int, text: str, layout: Optional[Dict] = None,
+                              page_tables: Optional[List] = None):
+        started = time.perf_counter()
+        self._scan_section_page(page_num, text, layout, page_tables)
+        self.page_process_seconds[page_num] = \
+            self.page_process_seconds.get(page_num, 0.0) + time.perf_counter() - started
+    
+    def _scan_section_page(self, page_num: int, text: str, layout: Optional[Dict],
+                           page_tables: Optional[List]):
+        if not text:
+            print(f"⚠️ No text extracted on page {page_num}")
+            return
+        
+        # Tables found on this page, matched to its caption lines in reading order
+        if page_tables is None:
+            page_tables = self.page_source().page_tables(page_num) if self.extract_tables else []
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            current_section = None
-            current_content = ""
-            section_pattern = re.compile(r"^(\d+(?:\.\d+)*?)\s+(.+?)$")
+        detector = self.heading_detector
+        if detector is not None:
+            layout = layout or self.page_source().page_layout(page_num)
+            line_layouts, page_height = layout["lines"], layout["height"]
             
-            for page_num, page in enumerate(pdf.pages, 1):
-                text = page.extract_text()
-                if not text:
-                    print(f"⚠️ No text extracted on page {page_num}")
-                    continue
-                    
-                lines = text.split('\n')
-                for line in lines:
-                    clean_line = line.strip()
-                    if not clean_line:
-                        continue
-                    
-                    match = section_pattern.match(clean_line)
-                    if match and len(clean_line) < 100:
-                        if current_section:
-                            current_section["content"] = current_content.strip()
-                            current_section["page_end"] = page_num - 1
-                            current_section["word_count"] = len(current_content.split())
-                            content_sections.append(current_section)
-                        
-                        section_id, title = match.groups()
-                        current_section = {
-                            "section_id": section_id,
-                            "title": title.strip(),
-                            "content": "",
-                            "page_start": page_num,
-                            "page_end": page_num,
-                            "content_type": "text",
-                            "tables": [],
-                            "figures": [],
-                            "subsections": [],
-                            "word_count": 0,
-                            "tags": self.generate_tags(title)
+        lines = text.split('\n')
+        counters = self.counters
+        counters["lines_scanned"] += len(lines)
+        for index, line in enumerate(lines):
+            clean_line = line.strip()
+            if not clean_line:
+                continue
+            if detector is not None and detector.is_running_line(clean_line, line_layouts[index], page_height):
+                counters["running_lines_dropped"] += 1
+                continue
+            
+            match = SECTION_PATTERN.match(clean_line)
+            is_heading = False
+            if match and len(clean_line) < 100:
+                counters["heading_candidates"] += 1
+                is_heading = detector is None or \
+                    detector.is_heading(page_num, *match.groups(), line_layouts[index], page_height)
+                if not is_heading:
+                    counters["headings_rejected"] += 1
+            if is_heading:
+                if self._current_section:
+                    self._close_section(page_num - 1)
+                
+                section_id, title = match.groups()
+                self._current_section = SectionRecord(
+                    section_id=section_id,
+                    title=title.strip(),
+                    content="",
+                    page_start=page_num,
+                    page_end=page_num,
+                    content_type="text",
+                    tables=[],
+                    figures=[],
+                    subsections=[],
+                    word_count=0,
+                    tags=self.generate_tags(title)
+                )
+                self._content_parts = []
+                self._word_count = 0
+            else:
+                current_section = self._current_section
+                if current_section:
+                    self._content_parts.append(clean_line)
+                    self._word_count += len(clean_line.split())
+                
+                if "Table" in clean_line and any(c.isdigit() for c in clean_line):
+                    if current_section:
+                        table_info = {
+                            "table_id": clean_line,
+                            "caption": clean_line,
+                            "page": page_num,
+                            "data": page_tables.pop(0) if page_tables and is_table_caption(clean_line) else []
                         }
-                        current_content = ""
-                    else:
-                        
-                        if current_section:
-                            current_content += " " + clean_line
-                        
-                        if "Table" in clean_line and any(c.isdigit() for c in clean_line):
-                            if current_section:
-                                table_info = {
-                                    "table_id": clean_line,
-                                    "caption": clean_line,
-                                    "page": page_num,
-                                    "data": []
-                                }
-                                current_section["tables"].append(table_info)
-                                self.tables.append(table_info)
-                        
-                        if "Figure" in clean_line and any(c.isdigit() for c in clean_line):
-                            if current_section:
-                                figure_info = {
-                                    "figure_id": clean_line,
-                                    "caption": clean_line,
-                                    "page": page_num
-                                }
-                                current_section["figures"].append(figure_info)
-                                self.figures.append(figure_info)
+                        current_section["tables"].append(table_info)
+                
+                if "Figure" in clean_line and any(c.isdigit() for c in clean_line):
+                    if current_section:
+                        figure_info = {
+                            "figure_id": clean_line,
+                            "caption": clean_line,
+                            "page": page_num
+                        }
+                        current_section["figures"].append(figure_info)
+    
+    def _finish_sections(self):
+        if self._current_section:
+            self._close_section()
+        self._current_section = None
+        self._content_parts = []
+        self._word_count = 0
+        
+        self.content_sections = self._sections
+    
+    def parse(self, stream_dir: Optional[str] = None) -> Dict:
+        # Single streaming pass: every page is extracted once and handed to the
+        # TOC and section stages in turn, so no page text outlives its page.
+        # With stream_dir, each section is written to the spec JSONL as soon as
+        # it closes and is not kept in content_sections.
+        source = self.page_source()
+        self._begin_toc()
+        self._begin_sections()
+        toc_done = False
+        self._heading_styles_learned = False
+        self.heading_detector = None
+        # (page_num, text, layout, tables) of pages read before heading styles
+        # are known; learning them reads ahead and may evict these pages
+        pending = []
+        
+        self.spec_streamed_to = None
+        if stream_dir is not None:
+            os.makedirs(stream_dir, exist_ok=True)
+            self.spec_streamed_to = os.path.join(stream_dir, SPEC_FILE)
+            self._spec_stream = open(self.spec_streamed_to, "w", encoding="utf-8")
+        
+        try:
+            pages = source.iter_pages()
+            while True:
+                started = time.perf_counter()
+                page = next(pages, None)
+                self._add_stage_time("page_extraction", time.perf_counter() - started)
+                if page is None:
+                    break
+                page_num, text = page
+                
+                if not toc_done:
+                    with self.stage_timer("toc"):
+                        toc_done = self._consume_toc_page(page_num, text)
+                
+                if not self._heading_styles_learned and self.detect_headings:
+                    pending.append((page_num, text, source.page_layout(page_num), source.page_tables(page_num)))
+                    if toc_done or len(pending) >= MAX_PENDING_PAGES:
+                        self._flush_pending_pages(pending)
+                    continue
+                
+                with self.stage_timer("sections"):
+                    self._consume_section_page(page_num, text)
             
-            if current_section:
-                current_section["content"] = current_content.strip()
-                current_section["word_count"] = len(current_content.split())
-                content_sections.append(current_section)
+            self.toc_entries = self._toc_entries
+            if pending:
+                self._flush_pending_pages(pending)
+            with self.stage_timer("sections"):
+                self._finish_sections()
+        finally:
+            if self._spec_stream is not None:
+                self._spec_stream.close()
+                self._spec_stream = None
         
-        self.content_sections = content_sections
-        return content_sections
+        with self.stage_timer("metadata"):
+            return self.generate_metadata()
+    
+    def _flush_pending_pages(self, pending: List):
+        self.toc_entries = self._toc_entries
+        self.learn_heading_styles()
+        with self.stage_timer("sections"):
+            for page_num, text, layout, page_tables in pending:
+                self._consume_section_page(page_num, text, layout, page_tables)
+        pending.clear()
     
     def generate_metadata(self) -> Dict:
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            total_pages = len(pdf.pages)
+        total_pages = self.page_source().page_count
+        
+        processing_stats = {
+            "sections_parsed": self.section_totals["sections"],
+            "tables_extracted": self.section_totals["tables"],
+            "figures_extracted": self.section_totals["figures"],
+            "cross_references": self.cross_references.to_dict()["edges"]
+        }
+        instrumentation = self.instrumentation()
+        del instrumentation["page_seconds"]["slowest"]
+        processing_stats.update(instrumentation)
+        if self.extract_tables:
+            source = self.page_source()
+            processing_stats["tables_with_data"] = self.section_totals["tables_with_data"]
+            processing_stats["table_pages_scanned"] = source.table_pages
+            processing_stats["table_extraction_seconds"] = round(source.table_seconds, 3)
+        if self.detect_headings:
+            detector = self.heading_detector
+            processing_stats["heading_styles"] = len(detector.styles) if detector else 0
+            processing_stats["page_offset"] = detector.page_offset if detector else None
         
         metadata = {
-            "document_id": "usb_pd_spec_v1",
+            "document_id": self.document_id,
             "document_title": self.doc_title,
-            "document_version": "1.0",
+            "document_version": self.document_version,
             "total_pages": total_pages,
-            "total_sections": len(self.content_sections),
-            "total_tables": len(self.tables),
-            "total_figures": len(self.figures),
+            "total_sections": self.section_totals["sections"],
+            "total_tables": self.section_totals["tables"],
+            "total_figures": self.section_totals["figures"],
             "extraction_date": datetime.now().isoformat(),
-            "processing_stats": {
-                "sections_parsed": len(self.content_sections),
-                "sections_failed": 0,
-                "tables_extracted": len(self.tables),
-                "figures_extracted": len(self.figures)
-            },
+            "processing_stats": processing_stats,
             "document_structure": {
                 "max_depth": max([entry["level"] for entry in self.toc_entries]) if self.toc_entries else 0,
                 "level_distribution": self.get_level_distribution(),
@@ -181,20 +591,19 @@ class ComprehensiveUSBPDParser:
             }
         }
         
+        if self.selection is not None:
+            # The section counts and stats cover these ranges only
+            metadata["selection"] = [list(section_range) for section_range in self.selection]
+        
         self.metadata = metadata
         return metadata
     
     def generate_tags(self, title: str) -> List[str]:
-        
-        keywords = {
-            "contract": "contracts", "negotiation": "negotiation", "device": "devices",
-            "communication": "communication", "avoidance": "avoidance", "cable": "cable",
-            "message": "messages", "partner": "partners", "policy": "policy",
-            "power": "power", "voltage": "voltage", "source": "source", "sink": "sink",
-            "protocol": "protocol", "data": "data", "control": "control"
-        }
-        title_lower = title.lower()
-        return [tag for keyword, tag in keywords.items() if keyword in title_lower]
+        started = time.perf_counter()
+        tags = self.tagger.tags(title)
+        self.counters["tag_calls"] += 1
+        self._add_stage_time("tagging", time.perf_counter() - started)
+        return tags
     
     def get_level_distribution(self) -> Dict:
         distribution = {}
@@ -204,67 +613,220 @@ class ComprehensiveUSBPDParser:
         return distribution
     
     def get_page_distribution(self) -> Dict:
-        if not self.content_sections:
+        if not self.section_totals["sections"]:
             return {}
         
-        page_ranges = {"1-50": 0, "51-100": 0, "101-200": 0, "201+": 0}
-        for section in self.content_sections:
-            page = section["page_start"]
-            if page <= 50:
-                page_ranges["1-50"] += 1
-            elif page <= 100:
-                page_ranges["51-100"] += 1
-            elif page <= 200:
-                page_ranges["101-200"] += 1
-            else:
-                page_ranges["201+"] += 1
-        return page_ranges
+        return dict(self.page_distribution)
     
-    def save_all_outputs(self):
-        with open("usb_pd_toc.jsonl", "w", encoding="utf-8") as f:
+    def save_all_outputs(self, output_dir: str = ".", binary: bool = False):
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, TOC_FILE), "w", encoding="utf-8") as f:
             for entry in self.toc_entries:
-                json.dump(entry, f, ensure_ascii=False)
+                f.write(to_json(entry))
                 f.write("\n")
         
-        with open("usb_pd_spec.jsonl", "w", encoding="utf-8") as f:
-            for section in self.content_sections:
-                json.dump(section, f, ensure_ascii=False)
-                f.write("\n")
+        spec_path = os.path.join(output_dir, SPEC_FILE)
+        if self.spec_streamed_to is None:
+            with open(spec_path, "w", encoding="utf-8") as f:
+                for section in self.content_sections:
+                    f.write(to_json(section))
+                    f.write("\n")
+        elif os.path.abspath(self.spec_streamed_to) != os.path.abspath(spec_path):
+            shutil.copyfile(self.spec_streamed_to, spec_path)
         
-        with open("usb_pd_metadata.jsonl", "w", encoding="utf-8") as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        self.save_metadata(output_dir)
+        self.cross_references.save(os.path.join(output_dir, XREF_FILE))
         
-        print(f"Saved {len(self.toc_entries)} TOC entries to usb_pd_toc.jsonl")
-        print(f"Saved {len(self.content_sections)} content sections to usb_pd_spec.jsonl")
-        print(f"Saved metadata to usb_pd_metadata.jsonl")
+        print(f"Saved {len(self.toc_entries)} TOC entries to {TOC_FILE}")
+        print(f"Saved {self.section_totals['sections']} content sections to {SPEC_FILE}")
+        print(f"Saved metadata to {METADATA_FILE}")
+        print(f"Saved {len(self.cross_references.forward)} sections' cross-references to {XREF_FILE}")
+        if binary:
+            self.save_binary_outputs(output_dir)
+    
+    def save_binary_outputs(self, output_dir: str = "."):
+        # Columnar companions of the two JSONL files, see binary_records.py
+        write_binary_records(binary_path_for(os.path.join(output_dir, TOC_FILE)), self.toc_entries)
+        spec_path = os.path.join(output_dir, SPEC_FILE)
+        if self.spec_streamed_to is None:
+            write_binary_records(binary_path_for(spec_path), self.content_sections)
+        else:
+            jsonl_to_binary(spec_path)
+        print(f"Saved binary records to {os.path.basename(binary_path_for(TOC_FILE))} "
+              f"and {os.path.basename(binary_path_for(SPEC_FILE))}")
+    
+    def save_metadata(self, output_dir: str = "."):
+        with open(os.path.join(output_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+    
+    def instrumentation(self) -> Dict:
+        # Where the time went so far. Stages nest: "tagging" and
+        # "serialization" are also part of the stage they ran in, and
+        # "page_extraction" is the time spent waiting for page text, while
+        # extraction_seconds is the time the extraction itself took.
+        source = self.page_source()
+        wall_seconds = time.perf_counter() - self._created
+        pages = len(self.page_process_seconds)
+        page_seconds = {
+            page_num: source.page_seconds.get(page_num, 0.0) + seconds
+            for page_num, seconds in self.page_process_seconds.items()
+        }
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "pages_processed": pages,
+            "pages_per_second": round(pages / wall_seconds, 2) if wall_seconds else None,
+            "pages_extracted": source.pages_extracted,
+            "cache_hits": source.cache_hits,
+            "stage_seconds": {stage: round(seconds, 4) for stage, seconds in self.stage_times.items()},
+            "extraction_seconds": {step: round(seconds, 4) for step, seconds in source.extraction_seconds.items()},
+            "page_seconds": page_time_summary(page_seconds),
+            "counters": dict(self.counters),
+            "page_window": source.window_stats(),
+            "peak_rss_mb": peak_rss_mb()
+        }
+    
+    def save_instrumentation(self, output_dir: str = "."):
+        # Standalone copy for regression tooling, with per-page timings
+        report = {
+            "document_id": self.document_id,
+            "document_version": self.document_version,
+            "pdf": os.path.basename(self.pdf_path),
+            "generated": datetime.now().isoformat(),
+            **self.instrumentation(),
+            "page_columns": ["page", "extraction_seconds", "section_seconds"],
+            "pages": [
+                [page_num, round(self.page_source().page_seconds.get(page_num, 0.0), 5), round(seconds, 5)]
+                for page_num, seconds in sorted(self.page_process_seconds.items())
+            ]
+        }
+        with open(os.path.join(output_dir, INSTRUMENTATION_FILE), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
 
 
-def main():
-    pdf_file = r"C:\\Users\\SRUDHI\\Desktop\\toc assement\\USB.pdf"
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Parse a USB PD specification PDF into JSONL outputs")
+    arg_parser.add_argument("--input", required=True, help="Path to the specification PDF")
+    arg_parser.add_argument("--workers", type=int, default=1,
+                            help="Number of processes used for page text extraction")
+    arg_parser.add_argument("--output", default=".",
+                            help="Directory the JSONL outputs are written to")
+    arg_parser.add_argument("--document-id", default="usb_pd_spec_v1",
+                            help="document_id written to the metadata")
+    arg_parser.add_argument("--document-version", default="1.0",
+                            help="document_version written to the metadata")
+    arg_parser.add_argument("--tables", action="store_true",
+                            help="Extract table rows with pdfplumber on pages that carry a table caption")
+    arg_parser.add_argument("--tag-vocabulary",
+                            help="Tag vocabulary JSON file (defaults to tag_vocabulary.json next to this script)")
+    arg_parser.add_argument("--tag-content", action="store_true",
+                            help="Tag sections by their full content instead of only their title")
+    arg_parser.add_argument("--legacy-headings", action="store_true",
+                            help="Treat every numbered line as a heading instead of matching learned heading styles")
+    arg_parser.add_argument("--sections", metavar="IDS",
+                            help="Extract only these sections, e.g. 6.4-6.5 or 6.4,7.1, reading just their TOC pages")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="Write each section to the spec JSONL as soon as it closes instead of keeping it in memory")
+    arg_parser.add_argument("--binary", action="store_true",
+                            help="Also write the TOC and sections in the compact binary record format (.bin)")
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="Reuse per-page text from the on-disk extraction cache")
+    arg_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                            help="Directory of the extraction cache")
+    arg_parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                            help="Cache size limit; least recently used pages are evicted beyond it")
+    arg_parser.add_argument("--page-window", type=int, metavar="PAGES",
+                            help="Drop pdfminer's parsed objects and fonts after this many pages, as reopening "
+                                 "the PDF would; 0 never does (default: 100)")
+    arg_parser.add_argument("--memory-ceiling-mb", type=float,
+                            help="Once resident memory passes this, end the page window and halve it")
+    arg_parser.add_argument("--profile", metavar="STATS_FILE",
+                            help="Run under cProfile, save the stats to this file and print the top calls")
+    arg_parser.add_argument("--incremental", metavar="PREVIOUS_OUTPUT",
+                            help="Re-extract only pages that changed since the outputs in this directory")
+    arg_parser.add_argument("--previous-pdf",
+                            help="PDF the previous outputs came from, if they have no page fingerprints")
+    args = arg_parser.parse_args(argv)
+    pdf_file = args.input
     
     if not os.path.isfile(pdf_file):
         print(f"PDF not found: {pdf_file}")
         return
     
-    parser = ComprehensiveUSBPDParser(pdf_file)
+    selection = None
+    selection_error = None
+    if args.sections:
+        try:
+            selection = parse_section_selection(args.sections)
+        except ValueError as e:
+            print(e)
+            return
     
-    print("Extracting Table of Contents...")
-    toc_entries = parser.extract_toc()
+    # Imported here because incremental_parser builds on this module
+    from incremental_parser import IncrementalUSBPDParser, save_page_fingerprints
     
-    print("Extracting all content sections...")
-    content_sections = parser.extract_all_sections()
+    cache = PageCache(args.cache_dir, args.cache_size_mb * 1024 * 1024) if args.cache else None
+    with profiled(args.profile), \
+            ComprehensiveUSBPDParser(pdf_file, workers=args.workers, cache=cache, document_id=args.document_id,
+                                     document_version=args.document_version, extract_tables=args.tables,
+                                     tagger=TagClassifier.from_file(args.tag_vocabulary),
+                                     tag_content=args.tag_content,
+                                     detect_headings=not args.legacy_headings, window_pages=args.page_window,
+                                     memory_ceiling_mb=args.memory_ceiling_mb) as parser:
+        if selection is not None:
+            print(f"Extracting sections {args.sections}...")
+            try:
+                parser.extract_selected_sections(selection)
+            except ValueError as e:
+                selection_error = str(e)
+            else:
+                print("Saving all outputs...")
+                with parser.stage_timer("save"):
+                    parser.save_all_outputs(args.output, binary=args.binary)
+        elif args.incremental:
+            print(f"Re-parsing pages changed since {args.incremental}...")
+            incremental = IncrementalUSBPDParser(parser, args.incremental, args.previous_pdf)
+            incremental.run()
+            
+            print("Saving all outputs...")
+            with parser.stage_timer("save"):
+                incremental.save_all_outputs(args.output, binary=args.binary)
+        else:
+            print("Extracting Table of Contents and content sections...")
+            parser.parse(stream_dir=args.output if args.stream else None)
+            
+            print("Saving all outputs...")
+            with parser.stage_timer("save"):
+                parser.save_all_outputs(args.output, binary=args.binary)
+                detector = parser.heading_detector
+                save_page_fingerprints(args.output, pdf_file, parser.toc_pages,
+                                       heading_styles=detector.to_dict() if detector is not None else None)
+        if selection_error is None:
+            parser.save_instrumentation(args.output)
+        instrumentation = parser.instrumentation()
+    if cache is not None:
+        cache.close()
+    if selection_error is not None:
+        print(selection_error)
+        return
     
-    print("Generating metadata...")
-    metadata = parser.generate_metadata()
+    print(f"\nExtraction complete!")
+    print(f"- TOC entries: {len(parser.toc_entries)}")
+    print(f"- Content sections: {parser.section_totals['sections']}")
+    print(f"- Tables found: {parser.section_totals['tables']}")
+    print(f"- Figures found: {parser.section_totals['figures']}")
     
-    print("Saving all outputs...")
-    parser.save_all_outputs()
+    print(f"- Pages extracted: {instrumentation['pages_extracted']} "
+          f"(cache hits: {instrumentation['cache_hits']})")
+    print(f"- Pages/s: {instrumentation['pages_per_second']}, peak RSS: {instrumentation['peak_rss_mb']} MB")
+    window = instrumentation["page_window"]
+    if window["reopens"]:
+        print(f"- pdfminer caches dropped {window['reopens']} times, page window {window['window_pages']} "
+              f"({window['window_shrinks']} shrinks under the memory ceiling)")
     
-    print(f"\nExtraction complete!")
-    print(f"- TOC entries: {len(toc_entries)}")
-    print(f"- Content sections: {len(content_sections)}")
-    print(f"- Tables found: {len(parser.tables)}")
-    print(f"- Figures found: {len(parser.figures)}")
+    print("\nStage timings:")
+    for stage, seconds in parser.stage_times.items():
+        print(f"- {stage}: {seconds:.2f}s")
+    print(f"Instrumentation saved to {os.path.join(args.output, INSTRUMENTATION_FILE)}")
 
 
 if __name__ == "__main__":
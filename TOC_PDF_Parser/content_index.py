@@ -0,0 +1,303 @@
+import argparse
+import json
+import math
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+
+INDEX_FILE = "usb_pd_content.idx"
+INDEX_MAGIC = b"USBPDIX1"
+
+# Keeps dotted section numbers ("6.4.1") and primes ("SOP'") as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*'*")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# Positions of different fields are separated so phrases never span them
+FIELD_GAP = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _source_stamp(spec_jsonl: str) -> Dict:
+    stat = os.stat(spec_jsonl)
+    return {"path": os.path.abspath(spec_jsonl), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class ContentSearchIndex:
+    # Inverted index over usb_pd_spec.jsonl. Each record is one document
+    # (section_ids repeat, so the record ordinal is the document id) made of
+    # its title, tags and content. Postings hold the document ids, term
+    # frequencies and term positions, stored as flat little-endian arrays so a
+    # saved index loads with one read and decodes a term only when queried.
+    # The index records the spec's path, size and mtime; loading rebuilds it
+    # when the spec has changed since.
+
+    def __init__(self):
+        self.docs = []
+        self.doc_lengths = array("I")
+        self.avg_doc_length = 0.0
+        self.terms = []
+        self._term_slots = {}
+        self._blob = b""
+        self._position_code = "I"
+        self.source = None
+
+    @classmethod
+    def build(cls, spec_jsonl: str) -> "ContentSearchIndex":
+        postings = defaultdict(list)
+        index = cls()
+        index.source = _source_stamp(spec_jsonl)
+        with open(spec_jsonl, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                section = json.loads(line)
+                doc_id = len(index.docs)
+                index.docs.append([section["section_id"], section["title"], section.get("page_start")])
+
+                positions = defaultdict(list)
+                position = 0
+                for field_text in (section["title"], " ".join(section.get("tags", [])), section.get("content", "")):
+                    for token in tokenize(field_text):
+                        positions[token].append(position)
+                        position += 1
+                    position += FIELD_GAP
+                index.doc_lengths.append(max(position - 3 * FIELD_GAP, 0))
+                for term, term_positions in positions.items():
+                    postings[term].append((doc_id, term_positions))
+
+        index._encode(postings)
+        return index
+
+    def _encode(self, postings: Dict[str, List[Tuple[int, List[int]]]]):
+        longest = max(self.doc_lengths) if self.doc_lengths else 0
+        self._position_code = "H" if longest + 3 * FIELD_GAP < 65536 else "I"
+        self.avg_doc_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        self.terms = sorted(postings)
+
+        chunks = []
+        offset = 0
+        self._term_slots = {}
+        for term in self.terms:
+            entries = postings[term]
+            doc_ids = array("I", [doc_id for doc_id, _ in entries])
+            doc_deltas = array("I", [doc_ids[0]] + [b - a for a, b in zip(doc_ids, doc_ids[1:])])
+            frequencies = array(self._position_code, [len(positions) for _, positions in entries])
+            positions = array(self._position_code, [p for _, term_positions in entries for p in term_positions])
+            encoded = [doc_deltas, frequencies, positions]
+            if sys.byteorder != "little":
+                for column in encoded:
+                    column.byteswap()
+            data = b"".join(column.tobytes() for column in encoded)
+            self._term_slots[term] = (offset, len(doc_ids), len(positions))
+            chunks.append(data)
+            offset += len(data)
+        self._blob = b"".join(chunks)
+
+    def save(self, path: str = INDEX_FILE):
+        lengths = array("I", self.doc_lengths)
+        if sys.byteorder != "little":
+            lengths.byteswap()
+        header = json.dumps({
+            "docs": self.docs,
+            "avg_doc_length": self.avg_doc_length,
+            "position_code": self._position_code,
+            "terms": self.terms,
+            "slots": [self._term_slots[term] for term in self.terms],
+            "source": self.source
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        lengths_bytes = lengths.tobytes()
+        with open(path, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(struct.pack("<II", len(header), len(lengths_bytes)))
+            f.write(header)
+            f.write(lengths_bytes)
+            f.write(self._blob)
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> "ContentSearchIndex":
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a content index")
+        start = len(INDEX_MAGIC)
+        header_length, lengths_length = struct.unpack_from("<II", data, start)
+        start += 8
+        header = json.loads(data[start:start + header_length].decode("utf-8"))
+        start += header_length
+
+        index = cls()
+        index.docs = header["docs"]
+        index.avg_doc_length = header["avg_doc_length"]
+        index._position_code = header["position_code"]
+        index.terms = header["terms"]
+        index._term_slots = {term: tuple(slot) for term, slot in zip(index.terms, header["slots"])}
+        index.doc_lengths = array("I")
+        index.doc_lengths.frombytes(data[start:start + lengths_length])
+        if sys.byteorder != "little":
+            index.doc_lengths.byteswap()
+        index._blob = memoryview(data)[start + lengths_length:]
+        index.source = header.get("source")
+        if index.source:
+            try:
+                stamp = _source_stamp(index.source["path"])
+            except OSError:
+                # The spec is gone: the index is all there is to search
+                return index
+            if stamp != index.source:
+                index = cls.build(index.source["path"])
+                try:
+                    index.save(path)
+                except OSError:
+                    pass
+        return index
+
+    def _decode(self, term: str, with_positions: bool = False):
+        slot = self._term_slots.get(term)
+        if slot is None:
+            return [], [], []
+        offset, doc_count, position_count = slot
+        width = array(self._position_code).itemsize
+
+        doc_deltas = array("I")
+        doc_deltas.frombytes(self._blob[offset:offset + 4 * doc_count])
+        offset += 4 * doc_count
+        frequencies = array(self._position_code)
+        frequencies.frombytes(self._blob[offset:offset + width * doc_count])
+        offset += width * doc_count
+        positions = array(self._position_code)
+        if with_positions:
+            positions.frombytes(self._blob[offset:offset + width * position_count])
+        if sys.byteorder != "little":
+            for column in (doc_deltas, frequencies, positions):
+                column.byteswap()
+        return list(accumulate(doc_deltas)), frequencies, positions
+
+    def _positions_by_doc(self, term: str) -> Dict[int, array]:
+        doc_ids, frequencies, positions = self._decode(term, with_positions=True)
+        result = {}
+        start = 0
+        for doc_id, frequency in zip(doc_ids, frequencies):
+            result[doc_id] = positions[start:start + frequency]
+            start += frequency
+        return result
+
+    def expand_prefix(self, prefix: str) -> List[str]:
+        prefix = prefix.lower()
+        matches = []
+        for i in range(bisect_left(self.terms, prefix), len(self.terms)):
+            if not self.terms[i].startswith(prefix) or len(matches) >= MAX_PREFIX_EXPANSIONS:
+                break
+            matches.append(self.terms[i])
+        return matches
+
+    def _bm25(self, terms: List[str], scores: Dict[int, float]):
+        total_docs = len(self.docs)
+        for term in terms:
+            doc_ids, frequencies, _ = self._decode(term)
+            if not doc_ids:
+                continue
+            idf = math.log(1 + (total_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for doc_id, frequency in zip(doc_ids, frequencies):
+                norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / (self.avg_doc_length or 1)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+
+    def phrase_docs(self, phrase: str) -> Dict[int, int]:
+        # Returns doc_id -> number of occurrences of the exact token sequence
+        tokens = tokenize(phrase)
+        if not tokens:
+            return {}
+        postings = [self._positions_by_doc(token) for token in tokens]
+        candidates = set(postings[0])
+        for term_postings in postings[1:]:
+            candidates &= term_postings.keys()
+
+        matches = {}
+        for doc_id in candidates:
+            starts = set(postings[0][doc_id])
+            for offset, term_postings in enumerate(postings[1:], 1):
+                starts &= {position - offset for position in term_postings[doc_id]}
+                if not starts:
+                    break
+            if starts:
+                matches[doc_id] = len(starts)
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = 10) -> List[Dict]:
+        # Query syntax: plain words are ranked with BM25, "quoted phrases" must
+        # occur verbatim, and word* expands to every indexed term with that prefix.
+        scoring_terms = []
+        required = None
+        for phrase, word in QUERY_PATTERN.findall(query):
+            if phrase:
+                phrase_matches = set(self.phrase_docs(phrase))
+                required = phrase_matches if required is None else required & phrase_matches
+                scoring_terms.extend(tokenize(phrase))
+            elif word.endswith("*") and len(word) > 1:
+                scoring_terms.extend(self.expand_prefix(word[:-1]))
+            else:
+                scoring_terms.extend(tokenize(word))
+
+        scores = {}
+        self._bm25(scoring_terms, scores)
+        if required is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in required}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self._hit(doc_id, score) for doc_id, score in ranked]
+
+    def search_phrase(self, phrase: str, limit: Optional[int] = 10) -> List[Dict]:
+        return self.search(f'"{phrase}"', limit)
+
+    def search_prefix(self, prefix: str, limit: Optional[int] = 10) -> List[Dict]:
+        return self.search(f"{prefix}*", limit)
+
+    def _hit(self, doc_id: int, score: float) -> Dict:
+        section_id, title, page_start = self.docs[doc_id]
+        return {"section_id": section_id, "title": title, "page_start": page_start,
+                "record": doc_id, "score": round(score, 4)}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Full-text search over usb_pd_spec.jsonl")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser("build", help="Build the index from a spec JSONL file")
+    build_parser.add_argument("spec", nargs="?", default="usb_pd_spec.jsonl")
+    build_parser.add_argument("--index", default=INDEX_FILE)
+    search_parser = subcommands.add_parser("search", help='Query the index, e.g. \'"source capabilities" vconn*\'')
+    search_parser.add_argument("query")
+    search_parser.add_argument("--index", default=INDEX_FILE)
+    search_parser.add_argument("--limit", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    if args.command == "build":
+        index = ContentSearchIndex.build(args.spec)
+        index.save(args.index)
+        print(f"Indexed {len(index.docs)} sections, {len(index.terms)} terms into {args.index}")
+        return
+
+    try:
+        index = ContentSearchIndex.load(args.index)
+    except FileNotFoundError:
+        print(f"Index {args.index} not found. Run 'content_index.py build' first!")
+        return
+    for hit in index.search(args.query, args.limit):
+        print(f"   {hit['section_id']} - {hit['title']} (Page {hit['page_start']}) score {hit['score']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+from itertools import chain
+from typing import Dict, List, Optional
+
+
+XREF_FILE = "usb_pd_xrefs.json"
+XREF_VERSION = 1
+
+# "Section 6.4.1", "Sections 6.4", "Table 6-12", "Figure 6.3"; the spec's
+# captions use non-breaking hyphens and en dashes as well
+REFERENCE_PATTERN = re.compile(r"\b(Section|Table|Figure)s?\s+(\d+(?:[-‑–.]\d+)*)")
+CAPTION_PATTERN = re.compile(r"^\s*(Table|Figure)\s+(\d+(?:[-‑–.]\d+)*)")
+DASHES = str.maketrans({"‑": "-", "–": "-"})
+
+
+def reference_node(kind: str, number: str) -> str:
+    # Sections are keyed by their plain section_id, like the TOC; tables and
+    # figures by "Table 6-12" / "Figure 6-1"
+    number = number.translate(DASHES)
+    return number if kind == "Section" else f"{kind} {number}"
+
+
+def section_captions(section: Dict) -> List[str]:
+    # Nodes of the tables and figures whose caption line is in this section
+    captions = []
+    for item in chain(section["tables"], section["figures"]):
+        match = CAPTION_PATTERN.match(item["caption"])
+        if match:
+            captions.append(reference_node(*match.groups()))
+    return captions
+
+
+def section_references(section: Dict) -> List[str]:
+    # Every node the section's content mentions, in order of first mention.
+    # Caption lines also match the pattern, so one mention per caption is not
+    # a reference; neither is a section naming itself.
+    mentions = Counter()
+    order = []
+    for match in REFERENCE_PATTERN.finditer(section["content"]):
+        node = reference_node(*match.groups())
+        if node not in mentions:
+            order.append(node)
+        mentions[node] += 1
+    mentions.subtract(section_captions(section))
+    return [node for node in order if mentions[node] > 0 and node != section["section_id"]]
+
+
+class CrossReferenceIndex:
+    # Forward and reverse adjacency of the references between sections, tables
+    # and figures. Edges always start at a section_id; targets are sections,
+    # tables or figures. definitions maps each table and figure to the section
+    # holding its caption. Sections that repeat a section_id share one node.
+
+    def __init__(self):
+        self.forward = {}
+        self.reverse = {}
+        self.definitions = {}
+
+    @classmethod
+    def from_sections(cls, sections) -> "CrossReferenceIndex":
+        index = cls()
+        for section in sections:
+            index.add_section(section)
+        return index
+
+    def add_section(self, section: Dict):
+        source = section["section_id"]
+        for node in section_captions(section):
+            self.definitions.setdefault(node, source)
+        self.add_edges(source, section_references(section))
+
+    def add_edges(self, source: str, targets: List[str]):
+        known = self.forward.setdefault(source, [])
+        for target in targets:
+            if target in known:
+                continue
+            known.append(target)
+            self.reverse.setdefault(target, []).append(source)
+        if not known:
+            del self.forward[source]
+
+    def merge(self, other: "CrossReferenceIndex"):
+        # For a corpus of several revisions: the union of the edges, with a
+        # repeated section_id still one node, and for a table or figure
+        # defined more than once the first definition, as in add_section
+        for node, source in other.definitions.items():
+            self.definitions.setdefault(node, source)
+        for source, targets in other.forward.items():
+            self.add_edges(source, targets)
+
+    def references(self, node: str) -> List[str]:
+        return list(self.forward.get(node, []))
+
+    def referenced_by(self, node: str) -> List[str]:
+        return list(self.reverse.get(node, []))
+
+    def closure(self, node: str, max_depth: Optional[int] = 3, reverse: bool = False) -> Dict[str, int]:
+        # Breadth-first over forward (or reverse) edges: every node reachable
+        # within max_depth hops, with its distance; None for no limit
+        adjacency = self.reverse if reverse else self.forward
+        depths = {node: 0}
+        frontier = [node]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for current in frontier:
+                for neighbour in adjacency.get(current, ()):
+                    if neighbour not in depths:
+                        depths[neighbour] = depth
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        del depths[node]
+        return depths
+
+    def to_dict(self) -> Dict:
+        return {"version": XREF_VERSION, "edges": sum(len(targets) for targets in self.forward.values()),
+                "definitions": self.definitions, "forward": self.forward, "reverse": self.reverse}
+
+    def save(self, path: str = XREF_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str = XREF_FILE) -> "CrossReferenceIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != XREF_VERSION:
+            raise ValueError(f"{path} has cross-reference index version {data.get('version')}, "
+                             f"expected {XREF_VERSION}")
+        index = cls()
+        index.definitions = data["definitions"]
+        index.forward = data["forward"]
+        index.reverse = data["reverse"]
+        return index
+
+    @classmethod
+    def build(cls, spec_jsonl: str) -> "CrossReferenceIndex":
+        # For spec files written before the parser saved the index
+        from binary_records import open_records
+
+        with open_records(spec_jsonl) as reader:
+            return cls.from_sections(reader.iter_records())
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Build the cross-reference index of an existing spec JSONL")
+    arg_parser.add_argument("--spec", default="usb_pd_spec.jsonl")
+    arg_parser.add_argument("--output", default=XREF_FILE)
+    args = arg_parser.parse_args()
+    try:
+        index = CrossReferenceIndex.build(args.spec)
+    except FileNotFoundError:
+        print(f"File {args.spec} not found")
+        sys.exit(2)
+    index.save(args.output)
+    print(f"Saved {index.to_dict()['edges']} references from {len(index.forward)} sections to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import re
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+
+# Running headers and footers live in these fractions of the page height
+HEADER_BAND = 0.06
+FOOTER_BAND = 0.06
+# A heading's left edge may drift this many points from the learned margin
+X0_TOLERANCE = 4.0
+SIZE_TOLERANCE = 0.3
+SAMPLES_PER_LEVEL = 4
+# Pages after the TOC searched for the first heading when calibrating the
+# offset between printed and physical page numbers
+OFFSET_SEARCH_PAGES = 40
+
+SECTION_PATTERN = re.compile(r"^(\d+(?:\.\d+)*?)\s+(.+?)$")
+TITLE_NOISE = re.compile(r"[\s.]+")
+DIGITS = re.compile(r"\d+")
+
+
+def page_line_layout(page) -> Dict:
+    # Call this right after page.extract_text(): pdfplumber caches the page's
+    # TextMap, so the per-line font and position come from the same word and
+    # line clustering that produced the text instead of a second pass. Each
+    # entry lines up with text.split("\n") and describes the line's first
+    # visible character as [fontname, size, x0, top, bottom], or None. Bump
+    # KIND_VERSIONS["layout"] in page_cache.py when this output changes.
+    lines = [None]
+    for text, char in page.get_textmap().tuples:
+        if text == "\n":
+            lines.append(None)
+        elif char is not None and lines[-1] is None and not text.isspace():
+            lines[-1] = [char["fontname"], round(char["size"], 2), round(char["x0"], 1),
+                         round(char["top"], 1), round(char["bottom"], 1)]
+    return {"height": round(float(page.height), 1), "lines": lines}
+
+
+def normalize_title(title: str) -> str:
+    return TITLE_NOISE.sub(" ", title.lower()).strip()
+
+
+def running_line_key(text: str) -> str:
+    # Page numbers and revision dates change from page to page
+    return DIGITS.sub("#", normalize_title(text))
+
+
+class HeadingDetector:
+    # Decides whether a numbered line is a real section heading. Heading
+    # styles (font, size and left margin) are learned up front from a sample
+    # of TOC entries located on their body pages, so every later decision is
+    # independent of page order and a re-parsed page window sees the same
+    # detector as a full run. A candidate is a heading when it is set in a
+    # learned heading style at a learned margin, or matches a TOC entry outside
+    # the header and footer bands; the entries of the TOC itself never are.
+
+    def __init__(self, toc_entries: List[Dict], toc_pages: Optional[Tuple[int, int]] = None):
+        self.toc_pages = tuple(toc_pages) if toc_pages else None
+        self._toc_titles = {}
+        self._toc_lines = set()
+        self._toc_page_numbers = {}
+        for entry in toc_entries:
+            title = normalize_title(entry["title"])
+            self._toc_titles.setdefault(entry["section_id"], []).append(title)
+            self._toc_page_numbers.setdefault(entry["section_id"], []).append(entry["page"])
+            self._toc_lines.add((entry["section_id"], f"{title} {entry['page']}"))
+        self.toc_entries = toc_entries
+        # (fontname, size) -> left margins seen for headings in that style
+        self.styles = {}
+        self.page_offset = None
+        # Every page looked at while learning; the state stays valid for a new
+        # revision as long as none of them changed
+        self.pages_read = []
+        # Header and footer lines repeated across the pages read, see running_line_key
+        self.running_lines = set()
+        self._band_lines = {}
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.styles)
+
+    def to_dict(self) -> Dict:
+        return {
+            "styles": [[fontname, size, margins] for (fontname, size), margins in sorted(self.styles.items())],
+            "page_offset": self.page_offset,
+            "pages_read": self.pages_read,
+            "running_lines": sorted(self.running_lines)
+        }
+
+    def load_dict(self, state: Dict):
+        self.styles = {(fontname, size): margins for fontname, size, margins in state["styles"]}
+        self.page_offset = state["page_offset"]
+        self.pages_read = state["pages_read"]
+        self.running_lines = set(state["running_lines"])
+
+    def is_toc_heading(self, section_id: str, title: str) -> bool:
+        # Heading lines may be cut short by wrapping, and TOC titles by dot
+        # leaders, so either title may be a prefix of the other
+        candidate = normalize_title(title)
+        for toc_title in self._toc_titles.get(section_id, ()):
+            shorter = min(len(candidate), len(toc_title))
+            if shorter >= 4 and (toc_title.startswith(candidate) or candidate.startswith(toc_title)):
+                return True
+        return False
+
+    def in_margin_band(self, line: Optional[List], height: float) -> bool:
+        if line is None or not height:
+            return False
+        return line[3] < height * HEADER_BAND or line[4] > height * (1 - FOOTER_BAND)
+
+    def is_running_line(self, text: str, line: Optional[List], height: float) -> bool:
+        # Only lines that recur in the margin bands are dropped, so body text
+        # set close to the page edge survives
+        return self.in_margin_band(line, height) and running_line_key(text) in self.running_lines
+
+    def is_toc_line(self, page_num: int, section_id: str, title: str) -> bool:
+        # toc_pages is the whole window scanned for the TOC, which may run
+        # into the first body pages, so the line itself must be an entry and
+        # not be on the page the entry points to
+        if self.toc_pages is None or not self.toc_pages[0] <= page_num <= self.toc_pages[1] or \
+                (section_id, normalize_title(title)) not in self._toc_lines:
+            return False
+        return self.page_offset is None or all(
+            abs(page + self.page_offset - page_num) > 1 for page in self._toc_page_numbers[section_id]
+        )
+
+    def matches_style(self, line: List) -> bool:
+        fontname, size, x0 = line[0], line[1], line[2]
+        for (style_font, style_size), margins in self.styles.items():
+            if style_font == fontname and abs(style_size - size) <= SIZE_TOLERANCE and \
+                    any(abs(margin - x0) <= X0_TOLERANCE for margin in margins):
+                return True
+        return False
+
+    def is_heading(self, page_num: int, section_id: str, title: str, line: Optional[List], height: float) -> bool:
+        # A running header repeating a chapter title matches the TOC, so in
+        # the margin bands only the learned heading styles count
+        if self.is_toc_line(page_num, section_id, title):
+            return False
+        if line is not None and self.matches_style(line):
+            return True
+        return not self.in_margin_band(line, height) and self.is_toc_heading(section_id, title)
+
+    def _observe(self, line: List):
+        margins = self.styles.setdefault((line[0], line[1]), [])
+        if not any(abs(margin - line[2]) <= X0_TOLERANCE for margin in margins):
+            margins.append(line[2])
+
+    def _find_on_page(self, source, page_num: int, wanted: Optional[Dict] = None) -> Optional[Dict]:
+        # Returns the TOC entry whose heading is on the page (the wanted one if
+        # given) after learning its style
+        # A source without layouts still serves offset calibration
+        text = source.page_text(page_num)
+        text_lines = text.split("\n")
+        layout = source.page_layout(page_num) if source.extract_layout else \
+            {"height": 0, "lines": [None] * len(text_lines)}
+        lines = list(zip(text_lines, layout["lines"]))
+        if page_num not in self.pages_read:
+            self.pages_read.append(page_num)
+            for line_text, line in lines:
+                if self.in_margin_band(line, layout["height"]):
+                    key = running_line_key(line_text)
+                    self._band_lines[key] = self._band_lines.get(key, 0) + 1
+        for line_text, line in lines:
+            match = SECTION_PATTERN.match(line_text.strip())
+            if not match or self.in_margin_band(line, layout["height"]):
+                continue
+            section_id, title = match.groups()
+            if wanted is not None and section_id != wanted["section_id"]:
+                continue
+            if self.is_toc_heading(section_id, title):
+                if line is not None:
+                    self._observe(line)
+                return next(entry for entry in self.toc_entries if entry["section_id"] == section_id)
+        return None
+
+    def calibrate_offset(self, source, page_count: int) -> Optional[int]:
+        # Physical minus printed page number, taken from the first heading
+        # after the TOC
+        if not self.toc_entries:
+            return None
+        first_page = self.toc_pages[1] + 1 if self.toc_pages else 1
+        for page_num in range(first_page, min(first_page + OFFSET_SEARCH_PAGES, page_count + 1)):
+            entry = self._find_on_page(source, page_num)
+            if entry is not None:
+                return page_num - entry["page"]
+        return None
+
+    def learn(self, source, page_count: int):
+        offset = self.calibrate_offset(source, page_count)
+        if offset is None:
+            return
+        offsets = [offset]
+
+        # Then sample entries spread over each level, so chapter, section and
+        # subsection styles are all seen
+        by_level = {}
+        for entry in self.toc_entries:
+            by_level.setdefault(entry["level"], []).append(entry)
+        for entries in by_level.values():
+            step = max(1, len(entries) // SAMPLES_PER_LEVEL)
+            for entry in entries[::step][:SAMPLES_PER_LEVEL]:
+                expected = entry["page"] + offsets[0]
+                for page_num in (expected, expected + 1, expected - 1):
+                    if 1 <= page_num <= page_count and self._find_on_page(source, page_num, entry):
+                        offsets.append(page_num - entry["page"])
+                        break
+        self.page_offset = int(median(offsets))
+        self.pages_read.sort()
+        self.running_lines = {key for key, pages in self._band_lines.items() if pages > 1}
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+
+from binary_records import binary_path_for, write_binary_records
+from comprehensive_usb_parser import ComprehensiveUSBPDParser, TOC_FILE, SPEC_FILE
+from cross_references import XREF_FILE
+from records import to_json
+
+
+FINGERPRINTS_FILE = "usb_pd_page_fingerprints.json"
+DIFF_FILE = "usb_pd_diff.json"
+
+
+def page_fingerprints(pdf_path: str) -> List[str]:
+    # Hashes each page's raw content streams and media box. This only walks the
+    # page tree; no layout analysis or text extraction is done.
+    fingerprints = []
+    with open(pdf_path, "rb") as f:
+        document = PDFDocument(PDFParser(f))
+        for page in PDFPage.create_pages(document):
+            digest = hashlib.sha1(repr(page.mediabox).encode("ascii"))
+            for stream in page.contents:
+                stream = resolve1(stream)
+                if stream is None:
+                    continue
+                digest.update(stream.get_rawdata() or stream.get_data())
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+def changed_pages(previous: List[str], current: List[str]) -> List[int]:
+    changed = [page_num for page_num, (old, new) in enumerate(zip(previous, current), 1) if old != new]
+    if len(current) != len(previous):
+        # Inserted or removed pages shift every later page number; when pages
+        # were dropped from the end, the new last page closes the last section.
+        first_shift = min(len(current), len(previous) + 1)
+        if changed:
+            first_shift = min(first_shift, changed[0])
+        changed = sorted(set(changed) | set(range(max(first_shift, 1), len(current) + 1)))
+    return changed
+
+
+def save_page_fingerprints(output_dir: str, pdf_path: str, toc_pages: Optional[Tuple[int, int]],
+                           fingerprints: Optional[List[str]] = None, heading_styles: Optional[Dict] = None):
+    # heading_styles is the learned HeadingDetector state, reused by the next
+    # incremental run when none of the pages it was learned from changed
+    if fingerprints is None:
+        fingerprints = page_fingerprints(pdf_path)
+    with open(os.path.join(output_dir, FINGERPRINTS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"pages": fingerprints, "toc_pages": toc_pages, "heading_styles": heading_styles}, f)
+
+
+def read_jsonl_lines(path: str) -> List[Tuple[str, Dict]]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append((line.rstrip("\n"), json.loads(line)))
+    return records
+
+
+def diff_records(old_records: List[Dict], new_records: List[Dict]) -> Dict[str, List[str]]:
+    # Section ids repeat in real output (e.g. revision history rows), so records
+    # are compared as per-id lists rather than through an id -> record dict.
+    old_by_id = defaultdict(list)
+    new_by_id = defaultdict(list)
+    for record in old_records:
+        old_by_id[record["section_id"]].append(record)
+    for record in new_records:
+        new_by_id[record["section_id"]].append(record)
+
+    diff = {"added": [], "removed": [], "changed": []}
+    for section_id in dict.fromkeys(list(old_by_id) + list(new_by_id)):
+        if section_id not in old_by_id:
+            diff["added"].append(section_id)
+        elif section_id not in new_by_id:
+            diff["removed"].append(section_id)
+        elif old_by_id[section_id] != new_by_id[section_id]:
+            diff["changed"].append(section_id)
+    return diff
+
+
+class IncrementalUSBPDParser:
+    # Re-parses a new revision of a specification against the outputs of a
+    # previous run. Pages whose content streams are unchanged are not
+    # extracted; only the window covering sections that touch changed pages is
+    # run through the section state machine and spliced into the old records.
+
+    def __init__(self, parser: ComprehensiveUSBPDParser, previous_dir: str, previous_pdf: Optional[str] = None):
+        self.parser = parser
+        self.previous_dir = previous_dir
+        self.previous_pdf = previous_pdf
+        self.fingerprints = []
+        self.toc_pages = None
+        self.heading_styles = None
+        self.changed = []
+        self.diff = {}
+        self._spec_lines = []
+        self._toc_lines = []
+
+    def load_previous(self) -> Tuple[List[str], Optional[Tuple[int, int]]]:
+        fingerprints_path = os.path.join(self.previous_dir, FINGERPRINTS_FILE)
+        if os.path.isfile(fingerprints_path):
+            with open(fingerprints_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            toc_pages = tuple(stored["toc_pages"]) if stored.get("toc_pages") else None
+            self.heading_styles = stored.get("heading_styles")
+            return stored["pages"], toc_pages
+        if self.previous_pdf:
+            return page_fingerprints(self.previous_pdf), None
+        raise FileNotFoundError(
+            f"{fingerprints_path} not found; pass the previous PDF to fingerprint it instead"
+        )
+
+    def run(self) -> Dict:
+        parser = self.parser
+        previous_fingerprints, previous_toc_pages = self.load_previous()
+        old_spec = read_jsonl_lines(os.path.join(self.previous_dir, SPEC_FILE))
+        old_toc = read_jsonl_lines(os.path.join(self.previous_dir, TOC_FILE))
+
+        with parser.stage_timer("fingerprints"):
+            self.fingerprints = page_fingerprints(parser.pdf_path)
+            self.changed = changed_pages(previous_fingerprints, self.fingerprints)
+        changed = set(self.changed)
+        total_pages = len(self.fingerprints)
+
+        with parser.stage_timer("toc"):
+            toc_touched = previous_toc_pages is None or any(
+                previous_toc_pages[0] <= page_num <= previous_toc_pages[1] for page_num in changed
+            )
+            if toc_touched:
+                new_toc = parser.extract_toc()
+                self.toc_pages = parser.toc_pages
+                self._toc_lines = [
+                    (old_line if old_entry == entry else to_json(entry), entry)
+                    for (old_line, old_entry), entry in self._align(old_toc, new_toc)
+                ]
+            else:
+                self.toc_pages = previous_toc_pages
+                self._toc_lines = old_toc
+                parser.toc_entries = [entry for _, entry in old_toc]
+                parser.toc_pages = previous_toc_pages
+            toc_diff = diff_records([entry for _, entry in old_toc], parser.toc_entries)
+        
+        # Heading styles come from the TOC and a few sampled pages; they are
+        # learned again only if any of those changed
+        previous_styles = self.heading_styles
+        if toc_touched or previous_styles is None or changed.intersection(previous_styles["pages_read"]):
+            previous_styles = None
+        detector = parser.learn_heading_styles(previous_styles)
+        self.heading_styles = detector.to_dict() if detector is not None else None
+
+        with parser.stage_timer("sections"):
+            first, last, start_page, end_page = self._affected_window(old_spec, changed, total_pages)
+            if first is None:
+                new_window = []
+                old_window = []
+                self._spec_lines = old_spec
+            else:
+                close_last = last + 1 >= len(old_spec)
+                extracted = parser.extract_sections_in_range(start_page, end_page, close_last=close_last)
+                # Sections that start on the unchanged edge pages of the window
+                # but lie outside the affected run are identical to the old ones.
+                skip_head = sum(
+                    1 for _, section in old_spec[:first] if section["page_start"] == start_page
+                )
+                new_window = extracted[skip_head:]
+                if not close_last:
+                    new_window = [section for section in new_window if section["page_start"] != end_page]
+                old_window = [section for _, section in old_spec[first:last + 1]]
+                self._spec_lines = (
+                    old_spec[:first]
+                    + [(to_json(section), section) for section in new_window]
+                    + old_spec[last + 1:]
+                )
+
+        parser.set_sections([section for _, section in self._spec_lines])
+        with parser.stage_timer("metadata"):
+            parser.generate_metadata()
+
+        self.diff = {
+            "document": os.path.basename(parser.pdf_path),
+            "previous_output": self.previous_dir,
+            "total_pages": total_pages,
+            "pages_changed": self.changed,
+            "pages_extracted": parser.page_source().pages_extracted,
+            "toc_reparsed": toc_touched,
+            "sections": diff_records(old_window, new_window),
+            "toc": toc_diff
+        }
+        return self.diff
+
+    def _affected_window(self, old_spec: List[Tuple[str, Dict]], changed: set,
+                         total_pages: int) -> Tuple[Optional[int], Optional[int], int, int]:
+        # A section's text spans from its own start page up to and including the
+        # start page of the next section, because lines above the next heading
+        # still belong to it. Any section whose span touches a changed page is
+        # re-extracted, and the window ends at the first untouched heading.
+        if not changed:
+            return None, None, 1, total_pages
+        if not old_spec:
+            return 0, -1, 1, total_pages
+
+        # Pages above the first heading count towards the first section, since a
+        # new heading there would open a section of its own.
+        first = last = None
+        for index, (_, section) in enumerate(old_spec):
+            span_start = 1 if index == 0 else section["page_start"]
+            if index + 1 < len(old_spec):
+                span_end = old_spec[index + 1][1]["page_start"]
+            else:
+                span_end = total_pages
+            beyond_end = section["page_start"] > total_pages
+            if beyond_end or any(span_start <= page_num <= span_end for page_num in changed):
+                if first is None:
+                    first = index
+                last = index
+
+        if first is None:
+            return None, None, 1, total_pages
+
+        start_page = min(old_spec[first][1]["page_start"], min(changed))
+        if last + 1 < len(old_spec):
+            end_page = old_spec[last + 1][1]["page_start"]
+        else:
+            end_page = total_pages
+        return first, last, start_page, end_page
+
+    @staticmethod
+    def _align(old_lines: List[Tuple[str, Dict]], new_records: List[Dict]):
+        # Pairs each new record with the old line at the same position so that
+        # unchanged entries keep their exact previous serialization.
+        for index, record in enumerate(new_records):
+            old = old_lines[index] if index < len(old_lines) else (None, None)
+            yield old, record
+
+    def save_all_outputs(self, output_dir: str = ".", binary: bool = False):
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, TOC_FILE), "w", encoding="utf-8") as f:
+            for line, _ in self._toc_lines:
+                f.write(line)
+                f.write("\n")
+
+        with open(os.path.join(output_dir, SPEC_FILE), "w", encoding="utf-8") as f:
+            for line, _ in self._spec_lines:
+                f.write(line)
+                f.write("\n")
+
+        self.parser.save_metadata(output_dir)
+        self.parser.cross_references.save(os.path.join(output_dir, XREF_FILE))
+        if binary:
+            write_binary_records(binary_path_for(os.path.join(output_dir, TOC_FILE)),
+                                 [entry for _, entry in self._toc_lines])
+            write_binary_records(binary_path_for(os.path.join(output_dir, SPEC_FILE)),
+                                 [record for _, record in self._spec_lines])
+
+        save_page_fingerprints(output_dir, self.parser.pdf_path, self.toc_pages, self.fingerprints,
+                               self.heading_styles)
+
+        with open(os.path.join(output_dir, DIFF_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.diff, f, ensure_ascii=False, indent=2)
+
+        sections = self.diff["sections"]
+        print(f"Pages changed: {len(self.changed)}, extracted: {self.diff['pages_extracted']}")
+        print(f"Sections added: {len(sections['added'])}, removed: {len(sections['removed'])}, "
+              f"changed: {len(sections['changed'])}")
+        print(f"Saved diff to {DIFF_FILE}")
@@ -0,0 +1,72 @@
+import cProfile
+import os
+import pstats
+import sys
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then reported as null
+    resource = None
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+PROFILE_TOP_FUNCTIONS = 25
+SLOWEST_PAGES = 10
+
+
+def peak_rss_mb() -> Optional[float]:
+    # Largest resident set of this process or of any finished child, such as
+    # the page extraction workers
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def current_rss_mb() -> Optional[float]:
+    # Resident set right now, from /proc on Linux; None where that is not
+    # available, which disables memory ceilings
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * PAGE_SIZE / (1024 * 1024), 1)
+
+
+def page_time_summary(page_seconds: Dict[int, float]) -> Dict:
+    if not page_seconds:
+        return {"pages": 0}
+    ordered = sorted(page_seconds.values())
+    slowest = sorted(page_seconds.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_PAGES]
+    return {
+        "pages": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max": round(ordered[-1], 4),
+        "slowest": [[page_num, round(seconds, 4)] for page_num, seconds in slowest]
+    }
+
+
+@contextmanager
+def profiled(stats_path: Optional[str]) -> Iterator[Optional[cProfile.Profile]]:
+    # With a path, runs the block under cProfile, saves the stats there (load
+    # them with pstats or snakeviz) and prints the most expensive calls
+    if not stats_path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(stats_path)
+        print(f"\nProfile saved to {stats_path}; top {PROFILE_TOP_FUNCTIONS} by cumulative time:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
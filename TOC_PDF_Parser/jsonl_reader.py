@@ -0,0 +1,118 @@
+import json
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional
+
+# Fields too large to decode when only the record summary is wanted. Strings
+# are skipped outright; lists are replaced by their length as "<field>_count".
+DEFAULT_SKIP_FIELDS = ("content", "tables", "figures", "subsections")
+SIDECAR_SUFFIX = ".offsets.json"
+SIDECAR_VERSION = 1
+
+
+def summarize(record: Dict, skip_fields=DEFAULT_SKIP_FIELDS) -> Dict:
+    summary = {}
+    for key, value in record.items():
+        if key not in skip_fields:
+            summary[key] = value
+        elif isinstance(value, list):
+            summary[f"{key}_count"] = len(value)
+    return summary
+
+
+class JSONLRecordReader:
+    # Memory-maps a JSONL output and keeps a sidecar index of every record's
+    # byte offset and length, keyed by section_id, plus a summary of the small
+    # fields. The sidecar is rebuilt when the JSONL's size or mtime changes, so
+    # later opens never touch the record bodies; full records are decoded
+    # lazily from the map on access.
+
+    def __init__(self, path: str, key: str = "section_id", skip_fields=DEFAULT_SKIP_FIELDS):
+        self.path = path
+        self.key = key
+        self.skip_fields = tuple(skip_fields)
+        self.sidecar_path = path + SIDECAR_SUFFIX
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._offsets = []
+        self._summaries = []
+        self._by_key = {}
+        self._load_index()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _source_stamp(self) -> Dict:
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "skip_fields": list(self.skip_fields),
+                "version": SIDECAR_VERSION}
+
+    def _load_index(self):
+        stamp = self._source_stamp()
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+            if sidecar.get("source") == stamp:
+                self._offsets = sidecar["offsets"]
+                self._summaries = sidecar["summaries"]
+        except (OSError, ValueError):
+            pass
+
+        if not self._offsets and stamp["size"]:
+            self._build_index()
+            try:
+                with open(self.sidecar_path, "w", encoding="utf-8") as f:
+                    json.dump({"source": stamp, "offsets": self._offsets, "summaries": self._summaries},
+                              f, ensure_ascii=False, separators=(",", ":"))
+            except OSError:
+                # Read-only location: the index simply lives in memory this time
+                pass
+
+        for position, summary in enumerate(self._summaries):
+            self._by_key.setdefault(summary.get(self.key), []).append(position)
+
+    def _build_index(self):
+        data = self._map
+        offset = 0
+        end = len(data)
+        while offset < end:
+            newline = data.find(b"\n", offset)
+            if newline == -1:
+                newline = end
+            raw = data[offset:newline]
+            if raw.strip():
+                self._offsets.append([offset, newline - offset])
+                # Decoded once here; later opens read the summary from the sidecar
+                self._summaries.append(summarize(json.loads(raw), self.skip_fields))
+            offset = newline + 1
+
+    def summaries(self) -> List[Dict]:
+        # Fast path: small fields only, no record body is decoded
+        return self._summaries
+
+    def record(self, position: int) -> Dict:
+        offset, length = self._offsets[position]
+        return json.loads(self._map[offset:offset + length].decode("utf-8"))
+
+    def get(self, key_value: str) -> Optional[Dict]:
+        positions = self._by_key.get(key_value)
+        return self.record(positions[0]) if positions else None
+
+    def get_all(self, key_value: str) -> List[Dict]:
+        return [self.record(position) for position in self._by_key.get(key_value, [])]
+
+    def iter_records(self) -> Iterator[Dict]:
+        for position in range(len(self._offsets)):
+            yield self.record(position)
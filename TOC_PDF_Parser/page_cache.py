@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "usb_pd_parser")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# How long a write waits for another process's transaction, e.g. between the
+# parse_server workers, before SQLite reports the database as locked
+BUSY_TIMEOUT_SECONDS = 30.0
+# Bump a kind's number when the code producing it changes what it returns:
+# page_text_source._extract_page for text, table_extractor.find_page_tables
+# for tables, heading_detector.page_line_layout for layout
+KIND_VERSIONS = {"text": 1, "tables": 1, "layout": 1, "page_count": 1}
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageCache:
+    # On-disk cache of per-page extraction results. Entries are keyed by the
+    # PDF's content hash, the page number, the kind of result ("text",
+    # "tables", "layout", and "page_count" stored as page 0) and a version
+    # made of the pdfplumber version and the kind's entry in KIND_VERSIONS,
+    # so neither an upgrade of pdfplumber nor a change to the code producing
+    # a kind serves stale results. When the stored bytes exceed max_bytes the
+    # least recently used entries are evicted.
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Imported here so file_digest and the constants stay cheap to import
+        import pdfplumber
+        self.pdfplumber_version = pdfplumber.__version__
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "pages.sqlite3"), timeout=BUSY_TIMEOUT_SECONDS)
+        # Readers then never wait for a writer, only writers for each other
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                doc_hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (doc_hash, page, kind, version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, doc_hash: str, page_num: int, kind: str = "text") -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM pages WHERE doc_hash = ? AND page = ? AND kind = ? AND version = ?",
+            (doc_hash, page_num, kind, self._version(kind))
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch(doc_hash, page_num, page_num, kind)
+        return row[0]
+
+    def get_range(self, doc_hash: str, start: int, end: int, kind: str = "text") -> Dict[int, str]:
+        rows = self._conn.execute(
+            "SELECT page, value FROM pages WHERE doc_hash = ? AND kind = ? AND version = ? AND page BETWEEN ? AND ?",
+            (doc_hash, kind, self._version(kind), start, end)
+        ).fetchall()
+        if rows:
+            self._touch(doc_hash, start, end, kind)
+        return dict(rows)
+
+    def count_range(self, doc_hash: str, start: int, end: int, kind: str = "text") -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM pages WHERE doc_hash = ? AND kind = ? AND version = ? AND page BETWEEN ? AND ?",
+            (doc_hash, kind, self._version(kind), start, end)
+        ).fetchone()[0]
+
+    def put(self, doc_hash: str, page_num: int, value: str, kind: str = "text"):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc_hash, page_num, kind, self._version(kind), value, len(value.encode("utf-8")), time.time())
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= 256:
+            self.flush()
+
+    def get_page_count(self, doc_hash: str) -> Optional[int]:
+        # The page count is stored as page 0 so a warm run never opens the PDF
+        value = self.get(doc_hash, 0, "page_count")
+        return int(value) if value is not None else None
+
+    def put_page_count(self, doc_hash: str, page_count: int):
+        self.put(doc_hash, 0, str(page_count), "page_count")
+
+    def flush(self):
+        if self._pending_writes:
+            self.evict()
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def evict(self):
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        freed = 0
+        victims = []
+        for rowid, size in self._conn.execute("SELECT rowid, size FROM pages ORDER BY last_used"):
+            victims.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM pages WHERE rowid = ?", victims)
+
+    def clear(self):
+        self._conn.execute("DELETE FROM pages")
+        self._conn.commit()
+
+    def _version(self, kind: str) -> str:
+        return f"{self.pdfplumber_version}/{kind}-{KIND_VERSIONS.get(kind, 1)}"
+
+    def _touch(self, doc_hash: str, start: int, end: int, kind: str):
+        self._conn.execute(
+            "UPDATE pages SET last_used = ? WHERE doc_hash = ? AND kind = ? AND version = ? AND page BETWEEN ? AND ?",
+            (time.time(), doc_hash, kind, self._version(kind), start, end)
+        )
+        self._pending_writes += 1
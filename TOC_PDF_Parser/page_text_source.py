@@ -0,0 +1,461 @@
+import warnings
+import logging
+
+warnings.filterwarnings("ignore", message="Cannot set gray non-stroke color.*")
+logging.getLogger("pdfminer").setLevel(logging.ERROR)
+
+import gc
+import json
+import time
+import pdfplumber
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfplumber.page import Page
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from page_cache import PageCache, file_digest
+from table_extractor import has_table_caption, find_page_tables
+from heading_detector import page_line_layout
+from instrumentation import current_rss_mb
+
+# Pages read between resets of the document, see PageWindow; 0 never resets
+DEFAULT_WINDOW_PAGES = 100
+MIN_WINDOW_PAGES = 16
+
+
+def release_page(page):
+    # Page.close() drops pdfplumber's chars, objects and layout, but the page's
+    # lru-cached TextMap still references every char; without both, each
+    # visited page keeps megabytes alive until the PDF is closed
+    page.close()
+    page.get_textmap.cache_clear()
+
+
+class PageWindow:
+    # The open PDF handle. pdfplumber's PDF.pages builds a Page for every page
+    # of the document up front, so pages are instead created one at a time by
+    # walking pdfminer's page tree, and each is released as soon as it has
+    # been read. Reading backwards starts the walk over.
+    #
+    # pdfminer also keeps every object it has parsed and every font it has
+    # loaded until the document is closed, so after window_pages pages these
+    # are dropped, as reopening the document would, while the walk carries on
+    # from the next page. When the process's resident memory passes
+    # memory_ceiling_mb, the current window ends at once and later windows
+    # are half as long, down to MIN_WINDOW_PAGES.
+
+    def __init__(self, pdf_path: str, window_pages: int = DEFAULT_WINDOW_PAGES,
+                 memory_ceiling_mb: Optional[float] = None):
+        self.pdf_path = pdf_path
+        self.window_pages = window_pages
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.reopens = 0
+        self.window_shrinks = 0
+        self._pdf = None
+        self._pages_read = 0
+        self._walk = None
+        self._next_page = 1
+        self._doctop = 0
+
+    def open(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.pdf_path)
+            self._walk = None
+        return self._pdf
+
+    def close(self):
+        if self._pdf is not None:
+            # PDF.close() would build PDF.pages only to close every page; the
+            # pages handed out have been released already
+            self._pdf.flush_cache()
+            self._pdf.stream.close()
+            self._pdf = None
+        self._walk = None
+        self._pages_read = 0
+
+    def page_count(self) -> int:
+        # Counted by walking the page tree, as PDF.pages does, rather than
+        # trusting /Count
+        self._walk = None
+        count = 0
+        while self._next_page_obj() is not None:
+            count += 1
+            if count % (self.window_pages or DEFAULT_WINDOW_PAGES) == 0:
+                self._drop_parsed()
+        self._drop_parsed()
+        return count
+
+    def page(self, page_num: int):
+        if page_num < self._next_page:
+            self._walk = None
+        while True:
+            page_obj = self._next_page_obj()
+            if page_obj is None:
+                raise IndexError(f"{self.pdf_path} has no page {page_num}")
+            page = Page(self._pdf, page_obj, page_number=self._next_page, initial_doctop=self._doctop)
+            self._doctop += page.height
+            self._next_page += 1
+            if page.page_number == page_num:
+                return page
+            # Pages walked past are never read, but pdfminer has still parsed
+            # their objects
+            release_page(page)
+            if self.window_pages and page.page_number % self.window_pages == 0:
+                self._drop_parsed()
+
+    def _next_page_obj(self):
+        if self._walk is None:
+            self._walk = PDFPage.create_pages(self.open().doc)
+            self._next_page = 1
+            self._doctop = 0
+        page_obj = next(self._walk, None)
+        if page_obj is None:
+            self._walk = None
+        return page_obj
+
+    def release(self, page):
+        release_page(page)
+        self._pages_read += 1
+        if self.window_pages and self._pages_read >= self.window_pages:
+            self._reopen()
+        elif self._over_ceiling() and self.window_pages != MIN_WINDOW_PAGES:
+            # Once the window is at its minimum, the ceiling no longer forces
+            # a reopen on every page
+            self.window_pages = max(MIN_WINDOW_PAGES, (self.window_pages or self._pages_read) // 2)
+            self.window_shrinks += 1
+            self._reopen()
+
+    def _over_ceiling(self) -> bool:
+        if self.memory_ceiling_mb is None:
+            return False
+        rss = current_rss_mb()
+        return rss is not None and rss > self.memory_ceiling_mb
+
+    def _reopen(self):
+        self._pages_read = 0
+        self.reopens += 1
+        if not self._drop_parsed():
+            # Closing frees the same with any pdfminer, but the next page()
+            # walks the page tree again from the first page
+            self.close()
+        gc.collect()
+
+    def _drop_parsed(self) -> bool:
+        # pdfminer has no public way to drop its caches. Emptying them frees
+        # what closing the document does and keeps the walk's place; False
+        # when this pdfminer does not keep them where expected.
+        if self._pdf is None:
+            return True
+        caches = [getattr(self._pdf.doc, name, None) for name in ("_cached_objs", "_parsed_objs")]
+        if not all(isinstance(cache, dict) for cache in caches):
+            return False
+        for cache in caches:
+            cache.clear()
+        self._pdf.rsrcmgr = PDFResourceManager()
+        return True
+
+
+_worker_window = None
+
+
+def _open_worker_pdf(pdf_path: str, window_pages: int = DEFAULT_WINDOW_PAGES,
+                     memory_ceiling_mb: Optional[float] = None):
+    # Each pool process opens its own handle; pdfplumber objects cannot be
+    # shared across processes, and every process keeps its own window.
+    global _worker_window
+    _worker_window = PageWindow(pdf_path, window_pages, memory_ceiling_mb)
+
+
+def _extract_page(page, extract_tables: bool,
+                  extract_layout: bool = False) -> Tuple[str, Optional[list], Dict[str, float], Optional[dict]]:
+    # Timings split pdfminer's content-stream interpretation (page.chars,
+    # cached by pdfplumber) from pdfplumber's text clustering. Bump
+    # KIND_VERSIONS["text"] in page_cache.py when the text returned changes.
+    started = time.perf_counter()
+    page.chars
+    interpreted = time.perf_counter()
+    text = page.extract_text() or ""
+    timings = {"pdfminer_layout": interpreted - started, "extract_text": time.perf_counter() - interpreted}
+    tables = None
+    if extract_tables and has_table_caption(text):
+        started = time.perf_counter()
+        tables = find_page_tables(page)
+        timings["tables"] = time.perf_counter() - started
+    layout = None
+    if extract_layout:
+        started = time.perf_counter()
+        layout = page_line_layout(page)
+        timings["line_layout"] = time.perf_counter() - started
+    return text, tables, timings, layout
+
+
+def _extract_page_range(start: int, end: int, extract_tables: bool = False,
+                        extract_layout: bool = False) -> List[Tuple[str, Optional[list], Dict[str, float], Optional[dict]]]:
+    results = []
+    for page_num in range(start, end + 1):
+        page = _worker_window.page(page_num)
+        results.append(_extract_page(page, extract_tables, extract_layout))
+        _worker_window.release(page)
+    return results
+
+
+class PageTextSource:
+    # Opens the PDF once and extracts every page's text at most once. Recently
+    # extracted pages are kept in a small LRU so the TOC, section and metadata
+    # stages can share them without holding the whole document in memory.
+    # The pdfplumber pages themselves are released right after extraction,
+    # see PageWindow.
+
+    def __init__(self, pdf_path: str, max_cached_pages: int = 64, workers: int = 1, chunk_size: int = 16,
+                 cache: Optional[PageCache] = None, extract_tables: bool = False, extract_layout: bool = False,
+                 window_pages: int = DEFAULT_WINDOW_PAGES, memory_ceiling_mb: Optional[float] = None):
+        self.pdf_path = pdf_path
+        self.max_cached_pages = max_cached_pages
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.cache = cache
+        self.extract_tables = extract_tables
+        self.extract_layout = extract_layout
+        self.pages_extracted = 0
+        self.cache_hits = 0
+        self.table_pages = 0
+        self.table_seconds = 0.0
+        # Seconds per extraction step over all extracted pages, and in total
+        # per page, see _extract_page
+        self.extraction_seconds = {}
+        self.page_seconds = {}
+        self._page_tables = {}
+        self._page_layouts = {}
+        self._window = PageWindow(pdf_path, window_pages, memory_ceiling_mb)
+        self._page_count = None
+        self._doc_hash = None
+        self._text_cache = OrderedDict()
+
+    def open(self):
+        self._window.open()
+        return self
+
+    def close(self):
+        self._window.close()
+        if self.cache is not None:
+            self.cache.flush()
+        self._text_cache.clear()
+        self._page_tables.clear()
+        self._page_layouts.clear()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def doc_hash(self) -> str:
+        if self._doc_hash is None:
+            self._doc_hash = file_digest(self.pdf_path)
+        return self._doc_hash
+
+    @property
+    def page_count(self) -> int:
+        if self._page_count is None:
+            if self.cache is not None:
+                self._page_count = self.cache.get_page_count(self.doc_hash)
+            if self._page_count is None:
+                self._page_count = self._window.page_count()
+                if self.cache is not None:
+                    self.cache.put_page_count(self.doc_hash, self._page_count)
+        return self._page_count
+
+    def page_text(self, page_num: int) -> str:
+        # page_num is 1-based, matching the page numbers written to the outputs
+        cached = self._text_cache.get(page_num)
+        if cached is not None:
+            self._text_cache.move_to_end(page_num)
+            return cached
+
+        if self.cache is not None:
+            text = self.cache.get(self.doc_hash, page_num)
+            if text is not None:
+                self.cache_hits += 1
+                self._remember(page_num, text)
+                if self.extract_tables:
+                    self._load_cached_tables(page_num, text)
+                if self.extract_layout:
+                    self._load_cached_layout(page_num)
+                return text
+
+        page = self._window.page(page_num)
+        text, tables, timings, layout = _extract_page(page, self.extract_tables, self.extract_layout)
+        self._window.release(page)
+        self.pages_extracted += 1
+        self._store(page_num, text, tables, timings, layout)
+        return text
+
+    def _load_cached_layout(self, page_num: int):
+        cached = self.cache.get(self.doc_hash, page_num, "layout")
+        if cached is not None:
+            self._page_layouts[page_num] = json.loads(cached)
+            return
+        # Text came from the cache but the layout was never recorded for it;
+        # the text is extracted again only to rebuild the TextMap
+        started = time.perf_counter()
+        page = self._window.page(page_num)
+        page.extract_text()
+        self.pages_extracted += 1
+        self._store_layout(page_num, page_line_layout(page))
+        self._window.release(page)
+        self._add_timings(page_num, {"line_layout": time.perf_counter() - started})
+
+    def _load_cached_tables(self, page_num: int, text: str):
+        cached = self.cache.get(self.doc_hash, page_num, "tables")
+        if cached is not None:
+            tables = json.loads(cached)
+            if tables is not None:
+                self._page_tables[page_num] = tables
+            return
+        tables = None
+        seconds = 0.0
+        if has_table_caption(text):
+            # Text came from the cache but tables were never extracted for it
+            started = time.perf_counter()
+            page = self._window.page(page_num)
+            tables = find_page_tables(page)
+            self._window.release(page)
+            seconds = time.perf_counter() - started
+            self._add_timings(page_num, {"tables": seconds})
+        self._store_tables(page_num, tables, seconds)
+
+    def _store(self, page_num: int, text: str, tables: Optional[list] = None,
+               timings: Optional[Dict[str, float]] = None, layout: Optional[dict] = None):
+        self._remember(page_num, text)
+        timings = timings or {}
+        self._add_timings(page_num, timings)
+        if self.cache is not None:
+            self.cache.put(self.doc_hash, page_num, text)
+        if self.extract_tables:
+            self._store_tables(page_num, tables, timings.get("tables", 0.0))
+        if self.extract_layout:
+            self._store_layout(page_num, layout)
+
+    def _add_timings(self, page_num: int, timings: Dict[str, float]):
+        for step, seconds in timings.items():
+            self.extraction_seconds[step] = self.extraction_seconds.get(step, 0.0) + seconds
+        self.page_seconds[page_num] = self.page_seconds.get(page_num, 0.0) + sum(timings.values())
+
+    def _store_layout(self, page_num: int, layout: dict):
+        self._page_layouts[page_num] = layout
+        if len(self._page_layouts) > max(self.max_cached_pages, 1):
+            del self._page_layouts[next(iter(self._page_layouts))]
+        if self.cache is not None:
+            self.cache.put(self.doc_hash, page_num, json.dumps(layout, ensure_ascii=False), "layout")
+
+    def _store_tables(self, page_num: int, tables: Optional[list], seconds: float):
+        # Every page gets a "tables" cache entry, null when it has no caption,
+        # so a warm cache can tell checked pages from pages never looked at.
+        if tables is not None:
+            self._page_tables[page_num] = tables
+            if len(self._page_tables) > max(self.max_cached_pages, 1):
+                del self._page_tables[next(iter(self._page_tables))]
+            self.table_pages += 1
+            self.table_seconds += seconds
+        if self.cache is not None:
+            self.cache.put(self.doc_hash, page_num, json.dumps(tables, ensure_ascii=False), "tables")
+
+    def page_tables(self, page_num: int) -> List[List[List[str]]]:
+        # Rows of every table found on a recently extracted page, top to bottom
+        return list(self._page_tables.get(page_num, []))
+
+    def page_layout(self, page_num: int) -> dict:
+        # Font and position of every text line of the page, see page_line_layout
+        layout = self._page_layouts.get(page_num)
+        if layout is None:
+            self._text_cache.pop(page_num, None)
+            self.page_text(page_num)
+            layout = self._page_layouts[page_num]
+        return layout
+
+    def window_stats(self) -> Dict:
+        # Page window of this process; pool workers keep their own
+        return {"window_pages": self._window.window_pages, "memory_ceiling_mb": self._window.memory_ceiling_mb,
+                "reopens": self._window.reopens, "window_shrinks": self._window.window_shrinks}
+
+    def _remember(self, page_num: int, text: str):
+        if self.max_cached_pages > 0:
+            self._text_cache[page_num] = text
+            if len(self._text_cache) > self.max_cached_pages:
+                evicted, _ = self._text_cache.popitem(last=False)
+                self._page_tables.pop(evicted, None)
+                self._page_layouts.pop(evicted, None)
+
+    def iter_pages(self, start: int = 1, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        last = self.page_count if end is None else min(end, self.page_count)
+        if self.workers > 1 and last - start + 1 > self.chunk_size:
+            yield from self._iter_pages_parallel(start, last)
+            return
+        for page_num in range(start, last + 1):
+            yield page_num, self.page_text(page_num)
+
+    def _iter_pages_parallel(self, start: int, last: int) -> Iterator[Tuple[int, str]]:
+        # Chunks are submitted a few at a time and consumed strictly in page
+        # order, so callers see exactly the sequence the serial path produces
+        # while at most 2 * workers chunks of text are in flight.
+        chunks = deque(
+            (chunk_start, min(chunk_start + self.chunk_size - 1, last))
+            for chunk_start in range(start, last + 1, self.chunk_size)
+        )
+        pending = deque()
+
+        if self.cache is not None and self._is_chunk_cached(start, last):
+            # Fully warm cache: no reason to spin up the pool at all
+            for page_num in range(start, last + 1):
+                yield page_num, self.page_text(page_num)
+            return
+
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_open_worker_pdf,
+                                       initargs=(self.pdf_path, self._window.window_pages,
+                                                 self._window.memory_ceiling_mb))
+        try:
+            while chunks or pending:
+                while chunks and len(pending) < self.workers * 2:
+                    chunk_start, chunk_end = chunks.popleft()
+                    if self._is_chunk_cached(chunk_start, chunk_end):
+                        pending.append((chunk_start, None))
+                    else:
+                        pending.append((chunk_start, executor.submit(_extract_page_range, chunk_start, chunk_end,
+                                                                     self.extract_tables, self.extract_layout)))
+
+                chunk_start, future = pending.popleft()
+                if future is None:
+                    for page_num in range(chunk_start, min(chunk_start + self.chunk_size, last + 1)):
+                        yield page_num, self.page_text(page_num)
+                    continue
+
+                for offset, (text, tables, timings, layout) in enumerate(future.result()):
+                    page_num = chunk_start + offset
+                    self.pages_extracted += 1
+                    self._store(page_num, text, tables, timings, layout)
+                    yield page_num, text
+        finally:
+            # A consumer that stops early (e.g. the TOC stage) should not wait
+            # for chunks nobody will read.
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            executor.shutdown(wait=True)
+
+    def _is_chunk_cached(self, start: int, end: int) -> bool:
+        missing = [page_num for page_num in range(start, end + 1) if page_num not in self._text_cache]
+        if not missing:
+            return True
+        if self.cache is None:
+            return False
+        expected = missing[-1] - missing[0] + 1
+        if self.cache.count_range(self.doc_hash, missing[0], missing[-1]) != expected:
+            return False
+        if self.extract_tables and \
+                self.cache.count_range(self.doc_hash, missing[0], missing[-1], "tables") != expected:
+            return False
+        return not self.extract_layout or \
+            self.cache.count_range(self.doc_hash, missing[0], missing[-1], "layout") == expected
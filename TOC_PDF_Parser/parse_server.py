@@ -0,0 +1,468 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from comprehensive_usb_parser import ComprehensiveUSBPDParser, parse_section_selection
+from page_cache import PageCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from records import json_default
+from toc_search_utilities import TOCSearchEngine
+
+
+# Page requests for one document arriving within this many seconds are
+# extracted by a single worker call
+BATCH_WINDOW = 0.002
+LATENCY_SAMPLES = 1024
+MAX_REQUEST_LINE = 8192
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+_worker_documents = OrderedDict()
+_worker_settings = {}
+
+
+def _init_worker(max_documents: int, cache_dir: Optional[str], cache_bytes: int):
+    _worker_settings["max_documents"] = max_documents
+    _worker_settings["cache"] = PageCache(cache_dir, cache_bytes) if cache_dir else None
+
+
+@contextlib.contextmanager
+def _worker_call():
+    # Parser output is dropped, and the cache's writes are committed before
+    # the result goes back, so no worker holds the cache's write lock while
+    # it waits for its next call
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        cache = _worker_settings.get("cache")
+        if cache is not None:
+            cache.flush()
+
+
+def _worker_parser(pdf_path: str, stamp: Tuple[int, int]) -> ComprehensiveUSBPDParser:
+    # Each pool process keeps its own LRU of open documents; the stamp (mtime
+    # and size) retires a handle once the file on disk is replaced
+    key = (pdf_path, tuple(stamp))
+    parser = _worker_documents.get(key)
+    if parser is not None:
+        _worker_documents.move_to_end(key)
+        return parser
+    parser = ComprehensiveUSBPDParser(pdf_path, cache=_worker_settings.get("cache"))
+    _worker_documents[key] = parser
+    while len(_worker_documents) > _worker_settings.get("max_documents", 1):
+        _, evicted = _worker_documents.popitem(last=False)
+        evicted.close()
+    return parser
+
+
+def _load_toc(pdf_path: str, stamp: Tuple[int, int]) -> Dict:
+    with _worker_call():
+        parser = _worker_parser(pdf_path, stamp)
+        if parser.toc_pages is None:
+            parser.extract_toc()
+        return {
+            "entries": parser.toc_entries,
+            "toc_pages": parser.toc_pages,
+            "total_pages": parser.page_source().page_count
+        }
+
+
+def _extract_pages(pdf_path: str, stamp: Tuple[int, int], pages: List[int]) -> List[str]:
+    with _worker_call():
+        source = _worker_parser(pdf_path, stamp).page_source()
+        return [source.page_text(page_num) for page_num in pages]
+
+
+def _extract_sections(pdf_path: str, stamp: Tuple[int, int], selection: List[Tuple[str, str]]) -> List[Dict]:
+    # The worker's parser keeps its TOC and learned heading styles, so only
+    # the first request for a document pays for them
+    with _worker_call():
+        return _worker_parser(pdf_path, stamp).extract_selected_sections(selection)
+
+
+def parse_page_list(value: str) -> List[int]:
+    # "3,5-7" -> [3, 5, 6, 7]
+    pages = []
+    for item in value.split(","):
+        first, _, last = item.strip().partition("-")
+        if not first.isdigit() or (last and not last.isdigit()):
+            raise ValueError(f"Not a page or page range: {item}")
+        pages.extend(range(int(first), int(last or first) + 1))
+    return list(dict.fromkeys(pages))
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ServedDocument:
+    # Server-side state of one open document: its TOC and search index, a
+    # small LRU of page texts, and the page extractions currently in flight
+
+    def __init__(self, pdf_path: str, stamp: Tuple[int, int]):
+        self.pdf_path = pdf_path
+        self.stamp = stamp
+        self.toc = None
+        self.search = None
+        self.pages = OrderedDict()
+        self.inflight = {}
+        self.batch = []
+        self.batch_scheduled = False
+        self.toc_task = None
+        self.section_tasks = {}
+
+
+class ParseServer:
+    # asyncio HTTP front end over a process pool of warm parsers. Every
+    # response is JSON. Concurrent requests for the same pages of a document
+    # share one extraction, and pages requested within BATCH_WINDOW of each
+    # other go to the pool as one call.
+
+    def __init__(self, root: str = ".", workers: int = 2, max_documents: int = 8,
+                 max_cached_pages: int = 512, cache_dir: Optional[str] = None,
+                 cache_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = os.path.realpath(root)
+        self.workers = max(1, workers)
+        self.max_documents = max(1, max_documents)
+        self.max_cached_pages = max_cached_pages
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+        self.documents = OrderedDict()
+        self.executor = None
+        self.started = time.time()
+        self.routes = {
+            "/toc": self.handle_toc,
+            "/sections": self.handle_sections,
+            "/pages": self.handle_pages,
+            "/search": self.handle_search,
+            "/stats": self.handle_stats
+        }
+        self.counters = {
+            "requests": 0,
+            "errors": 0,
+            "pages_served": 0,
+            "page_memory_hits": 0,
+            "pages_coalesced": 0,
+            "pages_extracted": 0,
+            "worker_calls": 0,
+            "documents_opened": 0,
+            "documents_evicted": 0
+        }
+        self.latencies = {route: deque(maxlen=LATENCY_SAMPLES) for route in self.routes}
+        self.route_counts = {route: 0 for route in self.routes}
+
+    def start_executor(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.max_documents, self.cache_dir, self.cache_bytes))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def _run(self, function, *args):
+        self.counters["worker_calls"] += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def document(self, params: Dict[str, str]) -> ServedDocument:
+        name = params.get("pdf")
+        if not name:
+            raise RequestError(400, "Missing pdf parameter")
+        pdf_path = os.path.realpath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, pdf_path]) != self.root:
+            raise RequestError(400, f"{name} is outside the served directory")
+        try:
+            stat = os.stat(pdf_path)
+        except OSError:
+            raise RequestError(404, f"{name} not found")
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        document = self.documents.get(pdf_path)
+        if document is not None and document.stamp == stamp:
+            self.documents.move_to_end(pdf_path)
+            return document
+        document = ServedDocument(pdf_path, stamp)
+        self.documents[pdf_path] = document
+        self.documents.move_to_end(pdf_path)
+        self.counters["documents_opened"] += 1
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+            self.counters["documents_evicted"] += 1
+        return document
+
+    async def toc(self, document: ServedDocument) -> Dict:
+        if document.toc is None:
+            if document.toc_task is None:
+                document.toc_task = asyncio.ensure_future(self._run(_load_toc, document.pdf_path, document.stamp))
+            try:
+                document.toc = await document.toc_task
+            except Exception:
+                document.toc_task = None
+                raise
+        return document.toc
+
+    async def page_texts(self, document: ServedDocument, pages: List[int]) -> List[str]:
+        loop = asyncio.get_running_loop()
+        waiting = []
+        for page_num in pages:
+            text = document.pages.get(page_num)
+            if text is not None:
+                document.pages.move_to_end(page_num)
+                self.counters["page_memory_hits"] += 1
+                future = loop.create_future()
+                future.set_result(text)
+            elif page_num in document.inflight:
+                self.counters["pages_coalesced"] += 1
+                future = document.inflight[page_num]
+            else:
+                future = loop.create_future()
+                document.inflight[page_num] = future
+                document.batch.append(page_num)
+                if not document.batch_scheduled:
+                    document.batch_scheduled = True
+                    loop.call_later(BATCH_WINDOW, self._flush_batch, document)
+            waiting.append(future)
+        texts = await asyncio.gather(*waiting)
+        self.counters["pages_served"] += len(texts)
+        return texts
+
+    def _flush_batch(self, document: ServedDocument):
+        # A large batch is split into one run of consecutive pages per worker
+        pages = sorted(document.batch)
+        document.batch = []
+        document.batch_scheduled = False
+        chunk_size = -(-len(pages) // self.workers)
+        for start in range(0, len(pages), chunk_size):
+            chunk = pages[start:start + chunk_size]
+            task = asyncio.ensure_future(self._run(_extract_pages, document.pdf_path, document.stamp, chunk))
+            task.add_done_callback(lambda done, chunk=chunk: self._finish_batch(document, chunk, done))
+
+    def _finish_batch(self, document: ServedDocument, pages: List[int], done: asyncio.Future):
+        if done.cancelled():
+            # E.g. at shutdown; requests waiting on these pages are cancelled
+            # too rather than left waiting forever
+            for page_num in pages:
+                future = document.inflight.pop(page_num, None)
+                if future is not None:
+                    future.cancel()
+            return
+        error = done.exception()
+        texts = None if error else done.result()
+        for index, page_num in enumerate(pages):
+            future = document.inflight.pop(page_num)
+            # A waiting request may have been cancelled, and this future with it
+            if error:
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            if not future.done():
+                future.set_result(texts[index])
+            document.pages[page_num] = texts[index]
+            if len(document.pages) > self.max_cached_pages:
+                document.pages.popitem(last=False)
+        if not error:
+            self.counters["pages_extracted"] += len(pages)
+
+    async def handle_toc(self, params: Dict[str, str]) -> Dict:
+        toc = await self.toc(self.document(params))
+        return {"toc_pages": toc["toc_pages"], "total_pages": toc["total_pages"], "entries": toc["entries"]}
+
+    async def handle_sections(self, params: Dict[str, str]) -> Dict:
+        document = self.document(params)
+        try:
+            selection = parse_section_selection(params.get("ids", ""))
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        if not selection:
+            raise RequestError(400, "Missing ids parameter")
+        key = tuple(selection)
+        task = document.section_tasks.get(key)
+        if task is None:
+            # Identical selections in flight share one extraction
+            task = asyncio.ensure_future(self._run(_extract_sections, document.pdf_path, document.stamp, selection))
+            document.section_tasks[key] = task
+            task.add_done_callback(lambda _: document.section_tasks.pop(key, None))
+        try:
+            sections = await asyncio.shield(task)
+        except ValueError as e:
+            raise RequestError(404, str(e))
+        return {"sections": sections}
+
+    async def handle_pages(self, params: Dict[str, str]) -> Dict:
+        document = self.document(params)
+        try:
+            pages = parse_page_list(params.get("pages", ""))
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        toc = await self.toc(document)
+        out_of_range = [page_num for page_num in pages if not 1 <= page_num <= toc["total_pages"]]
+        if out_of_range:
+            raise RequestError(404, f"Pages {out_of_range} are outside 1-{toc['total_pages']}")
+        texts = await self.page_texts(document, pages)
+        return {"pages": [{"page": page_num, "text": text} for page_num, text in zip(pages, texts)]}
+
+    async def handle_search(self, params: Dict[str, str]) -> Dict:
+        document = self.document(params)
+        keyword = params.get("q")
+        if not keyword:
+            raise RequestError(400, "Missing q parameter")
+        try:
+            limit = int(params.get("limit", 20))
+        except ValueError:
+            raise RequestError(400, "limit must be an integer")
+        toc = await self.toc(document)
+        if document.search is None:
+            document.search = TOCSearchEngine.from_entries(toc["entries"])
+        results = document.search.search_by_keyword(keyword)
+        return {"total": len(results), "results": results[:limit]}
+
+    async def handle_stats(self, params: Dict[str, str]) -> Dict:
+        return self.stats()
+
+    def stats(self) -> Dict:
+        uptime = time.time() - self.started
+        routes = {}
+        for route, samples in self.latencies.items():
+            if not self.route_counts[route]:
+                continue
+            ordered = sorted(samples)
+            routes[route] = {
+                "count": self.route_counts[route],
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3)
+            }
+        counters = dict(self.counters)
+        return {
+            "uptime_seconds": round(uptime, 3),
+            "requests_per_second": round(counters["requests"] / uptime, 3) if uptime else None,
+            "pages_per_worker_call": round(counters["pages_extracted"] / counters["worker_calls"], 2)
+            if counters["worker_calls"] else None,
+            "documents_open": len(self.documents),
+            "counters": counters,
+            "routes": routes
+        }
+
+    async def dispatch(self, method: str, target: str) -> Tuple[int, Dict]:
+        url = urlsplit(target)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            self.counters["errors"] += 1
+            return 404, {"error": f"Unknown path {url.path}", "paths": sorted(self.routes)}
+        if method != "GET":
+            self.counters["errors"] += 1
+            return 405, {"error": "Only GET is supported"}
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        started = time.perf_counter()
+        try:
+            return 200, await handler(params)
+        except RequestError as e:
+            self.counters["errors"] += 1
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            self.counters["errors"] += 1
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.route_counts[url.path] += 1
+            self.latencies[url.path].append(time.perf_counter() - started)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Minimal HTTP/1.1: GET requests with keep-alive, no request bodies
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3 or len(request_line) > MAX_REQUEST_LINE:
+                    status, body = 400, {"error": "Malformed request line"}
+                    keep_alive = False
+                else:
+                    method, target, version = parts
+                    self.counters["requests"] += 1
+                    status, body = await self.dispatch(method, target)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                payload = json.dumps(body, ensure_ascii=False, default=json_default).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        self.start_executor()
+        try:
+            if unix_path:
+                server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+                print(f"Serving {self.root} on {unix_path}")
+            else:
+                server = await asyncio.start_server(self.handle_connection, host, port)
+                print(f"Serving {self.root} on http://{host}:{port}")
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.shutdown()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Serve TOC, section, page-text and search queries over HTTP")
+    arg_parser.add_argument("--root", default=".", help="Directory the pdf parameter of every request is resolved in")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--unix", metavar="SOCKET_PATH", help="Listen on a Unix socket instead of TCP")
+    arg_parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                            help="Extraction processes")
+    arg_parser.add_argument("--max-documents", type=int, default=8,
+                            help="Documents kept open; the least recently used is closed beyond it")
+    arg_parser.add_argument("--max-cached-pages", type=int, default=512,
+                            help="Page texts kept in server memory per document")
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="Share extracted pages through the on-disk extraction cache")
+    arg_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                            help="Directory of the extraction cache")
+    arg_parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                            help="Cache size limit; least recently used pages are evicted beyond it")
+    args = arg_parser.parse_args()
+
+    server = ParseServer(args.root, workers=args.workers, max_documents=args.max_documents,
+                         max_cached_pages=args.max_cached_pages, cache_dir=args.cache_dir if args.cache else None,
+                         cache_bytes=args.cache_size_mb * 1024 * 1024)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print("\nStopped")
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+# One entry point for parsing and for the quick lookups run against existing
+# outputs. Only argparse and json are imported up front; every subcommand
+# imports what it needs when it runs, so toc, search and validate never load
+# pdfplumber/pdfminer, and only report loads openpyxl.
+
+# Wall-clock budget, in milliseconds and including interpreter start-up, for
+# the lookup subcommands on a few thousand sections; checked by
+# benchmarks/bench_startup.py. Each leaves a third or more over the median
+# measured for it (about 100 ms for toc and search, 290 ms for validate).
+STARTUP_BUDGET_MS = {"toc": 150, "search": 150, "validate": 400}
+# Modules the lookup subcommands must not import
+HEAVY_MODULES = ("pdfplumber", "pdfminer", "openpyxl", "PIL")
+
+# The names comprehensive_usb_parser.py writes; that module is not imported
+# here because it is only needed to parse
+TOC_FILE = "usb_pd_toc.jsonl"
+METADATA_FILE = "usb_pd_metadata.jsonl"
+
+
+def emit(value, as_json: bool, lines: Optional[List[str]] = None):
+    if as_json:
+        from records import json_default
+
+        json.dump(value, sys.stdout, ensure_ascii=False, default=json_default)
+        sys.stdout.write("\n")
+    else:
+        for line in lines or []:
+            print(line)
+
+
+def page_range(value: str) -> List[int]:
+    start, _, end = value.partition("-")
+    try:
+        return [int(start), int(end or start)]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a page or a range such as 50-60, got {value!r}")
+
+
+def load_toc(output_dir: str, cross_references: bool = False, trigram_index: bool = False):
+    from binary_records import open_records
+    from toc_search_utilities import TOCSearchEngine
+
+    # One lookup per process: a keyword scan is quicker than building the
+    # trigram index first, which only fuzzy search needs, and the rows are
+    # not kept long enough for compacting them into records to pay off
+    with open_records(os.path.join(output_dir, TOC_FILE)) as reader:
+        engine = TOCSearchEngine.from_entries(reader.summaries(), trigram_index=trigram_index,
+                                              compact_entries=False)
+    if cross_references:
+        from cross_references import CrossReferenceIndex, XREF_FILE
+
+        engine.cross_references = CrossReferenceIndex.load(os.path.join(output_dir, XREF_FILE))
+    return engine
+
+
+def entry_line(entry: Dict) -> str:
+    return f"{entry['section_id']} - {entry['title']} (Page {entry['page']})"
+
+
+def run_parse(args) -> int:
+    from comprehensive_usb_parser import main as parse_main
+
+    argv = ["--input", args.pdf, "--output", args.output] + args.parser_args
+    if not args.json:
+        parse_main(argv)
+        return 0
+    # Progress goes to stderr so stdout carries only the metadata
+    with contextlib.redirect_stdout(sys.stderr):
+        parse_main(argv)
+    try:
+        with open(os.path.join(args.output, METADATA_FILE), "r", encoding="utf-8") as f:
+            emit(json.load(f), True)
+    except FileNotFoundError:
+        return 1
+    return 0
+
+
+def run_toc(args) -> int:
+    engine = load_toc(args.output_dir)
+    if args.id:
+        entry = engine.get_section_by_id(args.id)
+        entries = [entry] if entry is not None else []
+    elif args.children:
+        entries = engine.get_children(args.children)
+    elif args.descendants:
+        entries = engine.get_all_descendants(args.descendants)
+    elif args.path:
+        entries = engine.get_path_to_root(args.path)
+    elif args.level:
+        entries = engine.search_by_level(args.level)
+    elif args.pages:
+        entries = engine.search_by_page_range(*args.pages)
+    else:
+        entries = engine.entries
+    if args.level:
+        entries = [entry for entry in entries if entry["level"] == args.level]
+    if args.pages:
+        entries = [entry for entry in entries if args.pages[0] <= entry["page"] <= args.pages[1]]
+    emit(entries, args.json, ["  " * (entry["level"] - 1) + entry_line(entry) for entry in entries])
+    return 0 if entries else 1
+
+
+def run_search(args) -> int:
+    if args.content:
+        from content_index import ContentSearchIndex, INDEX_FILE
+
+        index_path = args.index or os.path.join(args.output_dir, INDEX_FILE)
+        try:
+            index = ContentSearchIndex.load(index_path)
+        except FileNotFoundError:
+            print(f"Index {index_path} not found. Run 'content_index.py build' first!", file=sys.stderr)
+            return 2
+        hits = index.search(args.query, args.limit)
+        emit(hits, args.json, [f"{hit['section_id']} - {hit['title']} (Page {hit['page_start']}) "
+                               f"score {hit['score']}" for hit in hits])
+        return 0 if hits else 1
+
+    if args.fuzzy:
+        results = load_toc(args.output_dir, trigram_index=True).fuzzy_search(args.query, args.limit or None,
+                                                                            args.fields)
+        emit(results, args.json, [f"{entry_line(entry)} score {entry['score']}" for entry in results])
+        return 0 if results else 1
+    from binary_records import open_records
+    from toc_search_utilities import scan_keyword
+
+    # A single scan needs neither records nor the engine's indexes: the rows
+    # are matched as read and dropped
+    with open_records(os.path.join(args.output_dir, TOC_FILE)) as reader:
+        results = scan_keyword(reader.summaries(), args.query, args.fields, args.limit or None)
+    emit(results, args.json, [entry_line(entry) for entry in results])
+    return 0 if results else 1
+
+
+def run_refs(args) -> int:
+    engine = load_toc(args.output_dir, cross_references=True)
+    if args.depth == 1:
+        nodes = engine.referenced_by(args.node) if args.reverse else engine.references(args.node)
+        depths = {node: 1 for node in nodes}
+    else:
+        depths = engine.reference_closure(args.node, args.depth or None, args.reverse)
+    results = []
+    for node, depth in depths.items():
+        entry = engine.get_section_by_id(node)
+        results.append({"node": node, "depth": depth, "title": entry["title"] if entry else None,
+                        "page": entry["page"] if entry else None})
+    lines = []
+    for result in results:
+        label = f"{result['node']} - {result['title']} (Page {result['page']})" if result["title"] else result["node"]
+        lines.append("  " * (result["depth"] - 1) + label)
+    emit(results, args.json, lines)
+    return 0 if results else 1
+
+
+def validation_generator(args):
+    from validation_report_generator import ValidationReportGenerator
+
+    generator = ValidationReportGenerator(args.output_dir)
+    # Missing-file warnings stay off stdout, which may carry JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.corpus:
+            generator.load_corpus(args.corpus)
+        else:
+            generator.load_data()
+    return generator
+
+
+def run_validate(args) -> int:
+    from validation_report_generator import print_validation_summary, validation_summary
+
+    generator = validation_generator(args)
+    summary = validation_summary(generator.analyze_validation())
+    if args.json:
+        emit(summary, True)
+    else:
+        print_validation_summary(summary)
+    return 0 if summary["issues"] == 0 else 1
+
+
+def run_report(args) -> int:
+    from validation_report_generator import print_validation_summary, validation_summary
+
+    generator = validation_generator(args)
+    changes = None
+    if args.previous_output:
+        from revision_diff import compare_outputs
+        changes = compare_outputs(args.previous_output, args.output_dir)
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        results = generator.generate_excel_report(args.report, csv_dir=args.csv_dir, changes=changes)
+    summary = validation_summary(results)
+    if changes is not None:
+        summary["changes"] = changes["summary"]
+    if args.json:
+        emit(dict(summary, report=args.report), True)
+    else:
+        print_validation_summary(summary)
+    return 0
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(prog="pdfparser", description="Parse USB PD specifications and query the outputs")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+
+    def add_output_options(subparser, corpus=False):
+        subparser.add_argument("--output-dir", default=".", help="Directory holding the parser outputs")
+        if corpus:
+            subparser.add_argument("--corpus", help="Corpus root written by batch_parser.py; covers every document")
+        subparser.add_argument("--json", action="store_true", help="Write the result to stdout as JSON")
+
+    parse_parser = subcommands.add_parser(
+        "parse", help="Parse a PDF; other options after the PDF, e.g. --tables, go to comprehensive_usb_parser.py")
+    parse_parser.add_argument("pdf")
+    parse_parser.add_argument("--output", default=".", help="Directory the outputs are written to")
+    parse_parser.add_argument("--json", action="store_true",
+                              help="Print progress to stderr and the document metadata to stdout as JSON")
+    parse_parser.set_defaults(handler=run_parse)
+
+    toc_parser = subcommands.add_parser("toc", help="List TOC entries, optionally filtered")
+    add_output_options(toc_parser)
+    toc_parser.add_argument("--id", help="The entry with this section id")
+    toc_parser.add_argument("--children", metavar="ID", help="Direct children of a section")
+    toc_parser.add_argument("--descendants", metavar="ID", help="Every entry below a section")
+    toc_parser.add_argument("--path", metavar="ID", help="A section and its ancestors up to the chapter")
+    toc_parser.add_argument("--level", type=int, help="Only entries at this level")
+    toc_parser.add_argument("--pages", type=page_range, help="Only entries on these pages, e.g. 50-60")
+    toc_parser.set_defaults(handler=run_toc)
+
+    search_parser = subcommands.add_parser("search", help="Keyword search over TOC entries, or full text with --content")
+    add_output_options(search_parser)
+    search_parser.add_argument("query")
+    search_parser.add_argument("--fields", nargs="+", help="TOC fields to match (default: title, tags, id, path)")
+    search_parser.add_argument("--fuzzy", action="store_true",
+                               help="Typo-tolerant TOC search ranked by trigram similarity and edit distance")
+    search_parser.add_argument("--content", action="store_true",
+                               help="Query the full-text index built by content_index.py instead")
+    search_parser.add_argument("--index", help="Full-text index file (default: usb_pd_content.idx in --output-dir)")
+    search_parser.add_argument("--limit", type=int, default=20, help="At most this many results; 0 for all")
+    search_parser.set_defaults(handler=run_search)
+
+    refs_parser = subcommands.add_parser(
+        "refs", help="What a section refers to, or with --reverse what refers to a section, table or figure")
+    add_output_options(refs_parser)
+    refs_parser.add_argument("node", help='A section id, or e.g. "Table 6-12" or "Figure 6-1"')
+    refs_parser.add_argument("--reverse", action="store_true", help="Follow references backwards")
+    refs_parser.add_argument("--depth", type=int, default=1,
+                             help="Follow references this many hops; 0 for no limit")
+    refs_parser.set_defaults(handler=run_refs)
+
+    validate_parser = subcommands.add_parser(
+        "validate", help="Check parsed sections against the TOC without writing a workbook; exits 1 on issues")
+    add_output_options(validate_parser, corpus=True)
+    validate_parser.set_defaults(handler=run_validate)
+
+    report_parser = subcommands.add_parser("report", help="Validate and write the Excel report")
+    add_output_options(report_parser, corpus=True)
+    report_parser.add_argument("--report", default="usb_pd_validation_report.xlsx", help="Excel report path")
+    report_parser.add_argument("--csv-dir", help="Also write every report sheet as a CSV file into this directory")
+    report_parser.add_argument("--previous-output",
+                               help="Outputs of the previous revision; adds a Changes sheet comparing to it")
+    report_parser.set_defaults(handler=run_report)
+    return arg_parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = build_arg_parser()
+    # Options the parse subcommand does not know itself go to the parser
+    args, parser_args = arg_parser.parse_known_args(argv)
+    if parser_args and args.command != "parse":
+        arg_parser.error(f"unrecognized arguments: {' '.join(parser_args)}")
+    args.parser_args = parser_args
+    try:
+        return args.handler(args)
+    except FileNotFoundError as e:
+        print(f"{e.filename or e} not found", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import json
+import sys
+from abc import abstractmethod
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional
+
+# Slotted record types for TOC entries and sections. A record reads like the
+# dict it replaces (record["title"], .get, in, iteration in JSONL key order)
+# but keeps its values in slots, so it carries no per-record hash table.
+# Records are converted to a dict or to JSON only when written out.
+#
+# compact() builds a record from a dict of a known shape, interning the
+# strings that repeat across records (ids, doc_title, content_type) and
+# storing list fields as tuples: every section without tables holds the same
+# empty tuple, and records with equal tags share one tuple. Dicts of any other
+# shape are returned unchanged.
+
+TOC_FIELDS = ("section_id", "title", "page", "level", "parent_id", "full_path", "doc_title", "tags")
+SECTION_FIELDS = ("section_id", "title", "content", "page_start", "page_end", "content_type", "tables",
+                  "figures", "subsections", "word_count", "tags")
+# What JSONLRecordReader.summaries() keeps of a section, see jsonl_reader.py
+SECTION_SUMMARY_FIELDS = ("section_id", "title", "page_start", "page_end", "content_type", "tables_count",
+                          "figures_count", "subsections_count", "word_count", "tags")
+# Short strings repeated across records; titles and content are left alone
+INTERNED_FIELDS = frozenset(["section_id", "parent_id", "doc_title", "content_type"])
+LIST_FIELDS = frozenset(["tags", "tables", "figures", "subsections"])
+# List fields drawn from a small vocabulary, so that equal lists are common;
+# subsections, tables and figures differ per document and are only frozen
+SHARED_FIELDS = frozenset(["tags"])
+# The shared tuples are dropped once there are this many; a long-running
+# parse_server keeps loading documents
+SHARED_TUPLES_LIMIT = 4096
+
+_shared_tuples = {}
+
+
+def shared_tuple(values) -> tuple:
+    # One tuple per distinct list of strings. tuple() of an empty list is
+    # always the same empty tuple.
+    values = tuple(values)
+    shared = _shared_tuples.get(values)
+    if shared is not None:
+        return shared
+    if len(_shared_tuples) >= SHARED_TUPLES_LIMIT:
+        _shared_tuples.clear()
+    _shared_tuples[values] = values
+    return values
+
+
+def intern_optional(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class RecordMapping(Mapping):
+    # What records and search hits have in common: equal to the dict they
+    # stand for, and serializable through to_dict()
+    __slots__ = ()
+
+    # Mapping's metaclass is ABCMeta, so subclasses without to_dict cannot be
+    # instantiated
+    @abstractmethod
+    def to_dict(self) -> Dict:
+        ...
+
+    def copy(self) -> Dict:
+        return self.to_dict()
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def __eq__(self, other):
+        if isinstance(other, RecordMapping):
+            other = other.to_dict()
+        elif not isinstance(other, Mapping):
+            return NotImplemented
+        return self.to_dict() == dict(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Record(RecordMapping):
+    # Subclasses set __slots__ = FIELDS = (...) in JSONL key order
+    __slots__ = ()
+    FIELDS = ()
+    KEYS = frozenset()
+    CONVERSIONS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.KEYS = frozenset(cls.FIELDS)
+        # How from_dict stores each field, worked out once per class
+        conversions = []
+        for name in cls.FIELDS:
+            if name in INTERNED_FIELDS:
+                conversions.append((name, intern_optional))
+            elif name in SHARED_FIELDS:
+                conversions.append((name, shared_tuple))
+            elif name in LIST_FIELDS:
+                conversions.append((name, tuple))
+            else:
+                conversions.append((name, None))
+        cls.CONVERSIONS = tuple(conversions)
+
+    @classmethod
+    def from_dict(cls, record: Dict):
+        self = object.__new__(cls)
+        for name, convert in cls.CONVERSIONS:
+            value = record[name]
+            setattr(self, name, value if convert is None else convert(value))
+        return self
+
+    def __init__(self, *values, **fields):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+        for name, value in fields.items():
+            self[name] = value
+
+    def __getitem__(self, key: str):
+        if key in self.KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key not in self.KEYS:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        setattr(self, key, value)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def __contains__(self, key) -> bool:
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def to_dict(self) -> Dict:
+        # Tuples go back to the lists of the JSONL schema
+        record = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            record[name] = list(value) if type(value) is tuple else value
+        return record
+
+
+class TOCEntry(Record):
+    __slots__ = FIELDS = TOC_FIELDS
+
+
+class SectionRecord(Record):
+    __slots__ = FIELDS = SECTION_FIELDS
+
+
+class SectionSummary(Record):
+    __slots__ = FIELDS = SECTION_SUMMARY_FIELDS
+
+
+RECORD_TYPES = {record_type.FIELDS: record_type for record_type in (TOCEntry, SectionRecord, SectionSummary)}
+
+
+def compact(record: Dict):
+    if isinstance(record, Record):
+        return record
+    record_type = RECORD_TYPES.get(tuple(record))
+    return record_type.from_dict(record) if record_type is not None else record
+
+
+def compact_records(records: Iterable[Dict]) -> List:
+    return [compact(record) for record in records]
+
+
+class SearchHit(RecordMapping):
+    # A search result: the matched entry plus its match details (and score),
+    # read through to the entry instead of copying it. Keys come in the order
+    # of the dict copies results used to be.
+    __slots__ = ("entry", "match_details", "score")
+
+    def __init__(self, entry: Dict, match_details: List[str], score: Optional[float] = None):
+        self.entry = entry
+        self.match_details = match_details
+        self.score = score
+
+    def _extra_keys(self) -> tuple:
+        return ("match_details",) if self.score is None else ("score", "match_details")
+
+    def __getitem__(self, key: str):
+        if key == "match_details":
+            return self.match_details
+        if key == "score" and self.score is not None:
+            return self.score
+        return self.entry[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._extra_keys() or key in self.entry
+
+    def __iter__(self):
+        extra_keys = self._extra_keys()
+        yield from (key for key in self.entry if key not in extra_keys)
+        yield from extra_keys
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict:
+        result = self.entry.to_dict() if isinstance(self.entry, RecordMapping) else dict(self.entry)
+        if self.score is not None:
+            result["score"] = self.score
+        result["match_details"] = self.match_details
+        return result
+
+
+def to_json(record) -> str:
+    # One JSONL line for a record or a plain dict, as json.dump writes it
+    if isinstance(record, RecordMapping):
+        return record.to_json()
+    return json.dumps(record, ensure_ascii=False)
+
+
+def json_default(value):
+    # For json.dump(..., default=json_default) over results holding records
+    if isinstance(value, RecordMapping):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from binary_records import open_records
+
+DIFF_FILE = "usb_pd_revision_diff.json"
+# The name comprehensive_usb_parser.py writes; that module is not imported
+# here because comparing never opens a PDF
+SPEC_FILE = "usb_pd_spec.jsonl"
+
+# One-permutation MinHash over word shingles: every shingle hash falls into
+# one of MINHASH_BINS bins and each bin keeps its smallest value. Sections
+# sharing all rows of any LSH band become candidate pairs; only those are
+# compared, never every removed section against every added one.
+SHINGLE_WORDS = 3
+MINHASH_BINS = 64
+LSH_ROWS = 4
+EMPTY_BIN = 1 << 32
+# Estimated Jaccard similarity below which a removed and an added section
+# are not taken to be the same section renumbered
+MIN_SIMILARITY = 0.5
+# Word-diff hunks kept per changed section
+MAX_HUNKS = 50
+STATUSES = ["changed", "retitled", "renumbered", "added", "removed"]
+
+
+def content_hash(words: List[str]) -> bytes:
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+
+
+def minhash_signature(words: List[str]) -> Tuple[int, ...]:
+    signature = [EMPTY_BIN] * MINHASH_BINS
+    for start in range(max(1, len(words) - SHINGLE_WORDS + 1)):
+        shingle = zlib.crc32(" ".join(words[start:start + SHINGLE_WORDS]).encode("utf-8"))
+        slot, value = shingle % MINHASH_BINS, shingle // MINHASH_BINS
+        if value < signature[slot]:
+            signature[slot] = value
+    return tuple(signature)
+
+
+def signature_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    # Bins empty in both signatures say nothing about either section
+    used = [a == b for a, b in zip(first, second) if a != EMPTY_BIN or b != EMPTY_BIN]
+    return sum(used) / len(used) if used else 1.0
+
+
+def word_diff(old_words: List[str], new_words: List[str]) -> Dict:
+    matcher = SequenceMatcher(None, old_words, new_words)
+    hunks = []
+    added = removed = hunk_count = 0
+    for op, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        removed += old_end - old_start
+        added += new_end - new_start
+        hunk_count += 1
+        if hunk_count <= MAX_HUNKS:
+            hunks.append([op, " ".join(old_words[old_start:old_end]), " ".join(new_words[new_start:new_end])])
+    return {"similarity": round(matcher.ratio(), 3), "words_added": added, "words_removed": removed,
+            "diff": hunks, "diff_truncated": hunk_count > MAX_HUNKS}
+
+
+class _Side:
+    # One revision's sections, with their words and hashes computed once
+
+    def __init__(self, sections: List[Dict]):
+        self.sections = sections
+        self.words = [section["content"].split() for section in sections]
+        self.hashes = [content_hash(words) for words in self.words]
+        self.free = set(range(len(sections)))
+        self._signatures = {}
+
+    def signature(self, index: int) -> Tuple[int, ...]:
+        if index not in self._signatures:
+            self._signatures[index] = minhash_signature(self.words[index])
+        return self._signatures[index]
+
+    def group(self, key) -> Dict:
+        groups = {}
+        for index in sorted(self.free):
+            groups.setdefault(key(index), []).append(index)
+        return groups
+
+    def title(self, index: int) -> str:
+        return " ".join(self.sections[index]["title"].lower().split())
+
+
+def _pair_by(old: _Side, new: _Side, old_key, new_key, pairs: List, accept=None):
+    # Pairs still-unmatched sections whose keys are equal, in document order;
+    # repeated keys pair up first with first, and None never pairs. With
+    # accept, each section pairs with the first one of equal key it accepts.
+    old_groups = old.group(old_key)
+    for key, new_indexes in new.group(new_key).items():
+        if key is None:
+            continue
+        old_indexes = old_groups.get(key, [])
+        for new_index in new_indexes:
+            for old_index in old_indexes:
+                if accept is None or accept(old_index, new_index):
+                    pairs.append((old_index, new_index))
+                    old.free.discard(old_index)
+                    new.free.discard(new_index)
+                    old_indexes.remove(old_index)
+                    break
+
+
+def _content_key(side: _Side, index: int, side_key=None):
+    if not side.words[index]:
+        return None
+    return side.hashes[index] if side_key is None else (side.hashes[index], side_key(side, index))
+
+
+def _similar_content(old: _Side, new: _Side):
+    # For rounds keyed on numbers and titles, which repeat across a spec
+    # ("Overview", "Introduction"): the key only decides when a side has no
+    # content to compare
+    def accept(old_index: int, new_index: int) -> bool:
+        if not old.words[old_index] or not new.words[new_index]:
+            return True
+        return signature_similarity(old.signature(old_index), new.signature(new_index)) >= MIN_SIMILARITY
+    return accept
+
+
+def _pair_similar(old: _Side, new: _Side, pairs: List):
+    # Sections without content have nothing to compare
+    old_indexes = [index for index in old.free if old.words[index]]
+    new_indexes = [index for index in new.free if new.words[index]]
+    signatures = {("old", index): old.signature(index) for index in old_indexes}
+    signatures.update({("new", index): new.signature(index) for index in new_indexes})
+    buckets = {}
+    for index in old_indexes:
+        signature = signatures[("old", index)]
+        for band in range(0, MINHASH_BINS, LSH_ROWS):
+            rows = signature[band:band + LSH_ROWS]
+            if any(row != EMPTY_BIN for row in rows):
+                buckets.setdefault((band, rows), []).append(index)
+    candidates = {}
+    for new_index in new_indexes:
+        signature = signatures[("new", new_index)]
+        for band in range(0, MINHASH_BINS, LSH_ROWS):
+            for old_index in buckets.get((band, signature[band:band + LSH_ROWS]), ()):
+                if (old_index, new_index) not in candidates:
+                    candidates[(old_index, new_index)] = signature_similarity(signatures[("old", old_index)],
+                                                                              signature)
+    # Most similar pairs first, each section used once
+    for (old_index, new_index), similarity in sorted(candidates.items(), key=lambda item: -item[1]):
+        if similarity < MIN_SIMILARITY:
+            break
+        if old_index in old.free and new_index in new.free:
+            pairs.append((old_index, new_index))
+            old.free.discard(old_index)
+            new.free.discard(new_index)
+
+
+def _change(status: str, old_section: Optional[Dict], new_section: Optional[Dict]) -> Dict:
+    return {
+        "status": status,
+        "old_section_id": old_section["section_id"] if old_section else None,
+        "new_section_id": new_section["section_id"] if new_section else None,
+        "old_title": old_section["title"] if old_section else None,
+        "new_title": new_section["title"] if new_section else None,
+        "old_page": old_section["page_start"] if old_section else None,
+        "new_page": new_section["page_start"] if new_section else None,
+    }
+
+
+def compare_revisions(old_sections: List[Dict], new_sections: List[Dict]) -> Dict:
+    # Sections are aligned in rounds, each only over what is still unmatched:
+    # identical content (unchanged, or renumbered or retitled verbatim), same
+    # section_id and title, same title (renumbered), similar content by
+    # MinHash (renumbered and edited), and finally same section_id
+    # (retitled). Content goes first so that after an inserted chapter a
+    # repeated title such as "Overview" is not matched by its old number; the
+    # id and title rounds also require similar content. Word diffs are
+    # computed only for aligned pairs whose content differs.
+    started = time.perf_counter()
+    old, new = _Side(old_sections), _Side(new_sections)
+    pairs = []
+    similar = _similar_content(old, new)
+    # Sections repeating the same boilerplate text keep their own number and
+    # title where they can
+    for side_key in (lambda side, i: (side.sections[i]["section_id"], side.title(i)), _Side.title, None):
+        _pair_by(old, new, lambda i: _content_key(old, i, side_key), lambda i: _content_key(new, i, side_key), pairs)
+    _pair_by(old, new, lambda i: (old.sections[i]["section_id"], old.title(i)),
+             lambda i: (new.sections[i]["section_id"], new.title(i)), pairs, similar)
+    _pair_by(old, new, old.title, new.title, pairs, similar)
+    _pair_similar(old, new, pairs)
+    _pair_by(old, new, lambda i: old.sections[i]["section_id"], lambda i: new.sections[i]["section_id"], pairs)
+
+    changes = []
+    unchanged = 0
+    for old_index, new_index in pairs:
+        old_section, new_section = old.sections[old_index], new.sections[new_index]
+        if old_section["section_id"] != new_section["section_id"]:
+            status = "renumbered"
+        elif old.title(old_index) != new.title(new_index):
+            status = "retitled"
+        elif old.hashes[old_index] != new.hashes[new_index]:
+            status = "changed"
+        else:
+            unchanged += 1
+            continue
+        change = _change(status, old_section, new_section)
+        change["content_changed"] = old.hashes[old_index] != new.hashes[new_index]
+        if change["content_changed"]:
+            change.update(word_diff(old.words[old_index], new.words[new_index]))
+        else:
+            change.update({"similarity": 1.0, "words_added": 0, "words_removed": 0, "diff": []})
+        changes.append((new_index, change))
+    # Changes follow the new revision's order; removed sections come last
+    for old_index in sorted(old.free):
+        changes.append((None, dict(_change("removed", old.sections[old_index], None),
+                                   words_removed=len(old.words[old_index]))))
+    for new_index in sorted(new.free):
+        changes.append((new_index, dict(_change("added", None, new.sections[new_index]),
+                                        words_added=len(new.words[new_index]))))
+
+    changes.sort(key=lambda item: (item[0] is None, item[0] or 0))
+    summary = {status: 0 for status in STATUSES}
+    for _, change in changes:
+        summary[change["status"]] += 1
+    summary["unchanged"] = unchanged
+    return {
+        "old_sections": len(old_sections),
+        "new_sections": len(new_sections),
+        "summary": summary,
+        "seconds": round(time.perf_counter() - started, 3),
+        "changes": [change for _, change in changes]
+    }
+
+
+def read_sections(output_dir: str) -> List[Dict]:
+    with open_records(os.path.join(output_dir, SPEC_FILE)) as reader:
+        return list(reader.iter_records())
+
+
+def compare_outputs(old_dir: str, new_dir: str) -> Dict:
+    result = compare_revisions(read_sections(old_dir), read_sections(new_dir))
+    result["old_output"] = old_dir
+    result["new_output"] = new_dir
+    return result
+
+
+def print_revision_summary(result: Dict):
+    summary = result["summary"]
+    print(f"Compared {result['old_sections']} -> {result['new_sections']} sections in {result['seconds']}s")
+    print(", ".join(f"{status}: {summary[status]}" for status in STATUSES + ["unchanged"]))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Section-level diff between two parsed specification revisions")
+    arg_parser.add_argument("old_output", help="Output directory of the earlier revision")
+    arg_parser.add_argument("new_output", help="Output directory of the later revision")
+    arg_parser.add_argument("--output", help=f"Where to write the diff (default: {DIFF_FILE} in new_output)")
+    args = arg_parser.parse_args()
+    try:
+        result = compare_outputs(args.old_output, args.new_output)
+    except FileNotFoundError as e:
+        print(f"{e.filename} not found")
+        sys.exit(2)
+    output = args.output or os.path.join(args.new_output, DIFF_FILE)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print_revision_summary(result)
+    print(f"Saved revision diff to {output}")
+
+
+if __name__ == "__main__":
+    main()
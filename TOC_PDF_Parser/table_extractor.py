@@ -0,0 +1,27 @@
+import re
+from typing import List
+
+# A caption line such as "Table 6-12 Timing Parameters", as opposed to a
+# reference to a table inside running text
+TABLE_CAPTION_PATTERN = re.compile(r"^\s*Table\s+\d+(?:[-‑–.]\d+)*\b", re.MULTILINE)
+
+
+def has_table_caption(text: str) -> bool:
+    return bool(text) and TABLE_CAPTION_PATTERN.search(text) is not None
+
+
+def is_table_caption(line: str) -> bool:
+    return TABLE_CAPTION_PATTERN.match(line) is not None
+
+
+def find_page_tables(page) -> List[List[List[str]]]:
+    # Call this on the same pdfplumber Page whose text was just extracted: the
+    # page caches its parsed chars, lines and rects, so table finding reuses
+    # that layout instead of running pdfminer over the page again. Results are
+    # cached per page: bump KIND_VERSIONS["tables"] in page_cache.py when
+    # what this returns changes.
+    tables = sorted(page.find_tables(), key=lambda table: (table.bbox[1], table.bbox[0]))
+    return [
+        [[cell if cell is not None else "" for cell in row] for row in table.extract()]
+        for table in tables
+    ]
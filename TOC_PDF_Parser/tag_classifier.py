@@ -0,0 +1,107 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+DEFAULT_VOCABULARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag_vocabulary.json")
+
+# A term starts where no letter or digit precedes it or at a camelCase hump
+# ("tCableMessage", "PSSourceOffTimer"); "word" terms end likewise. The prime
+# counts as part of a word so "SOP", "SOP'" and "SOP''" stay distinct. The
+# start is checked after the term's first character has been consumed, which
+# lets the regex engine skip ahead to candidate characters instead of trying
+# every position.
+WORD_START_AFTER_FIRST = r"(?:(?<![A-Za-z0-9].)|(?<=[a-z0-9][A-Z])|(?<=[A-Z][A-Z])(?=[a-z]))"
+WORD_END = r"(?-i:(?![A-Za-z0-9'])|(?<=[a-z0-9])(?=[A-Z]))"
+TERM_SPACE = re.compile(r"\s+")
+
+
+def _char_pattern(char: str) -> str:
+    return r"\s+" if char == " " else re.escape(char)
+
+
+def _trie_pattern(node: Dict, end_assertions: Dict[str, str]) -> str:
+    # Vocabulary terms merged into one prefix tree of nested groups. At any
+    # position the regex follows a single path down the tree, so the cost per
+    # character is bounded by the longest term, not by the vocabulary size.
+    # Longer continuations come before the end of a term, so the longest
+    # matching term wins.
+    branches = [_char_pattern(char) + _trie_pattern(node[char], end_assertions)
+                for char in sorted(key for key in node if key)]
+    if "" in node:
+        branches.append(end_assertions[node[""]])
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+def _vocabulary_pattern(trie: Dict, end_assertions: Dict[str, str]) -> str:
+    # Group 1 consumes a term's first character, group 2 captures the rest of
+    # the term without consuming it, so terms starting inside another term
+    # are still found. Only the boundaries are case-sensitive.
+    first_chars = "".join(sorted({case for char in trie for case in (char.lower(), char.upper())}))
+    rests = "|".join(f"(?<={_char_pattern(char)}){_trie_pattern(trie[char], end_assertions)}"
+                     for char in sorted(trie))
+    return f"([{re.escape(first_chars)}]){WORD_START_AFTER_FIRST}(?=((?i:{rests})))"
+
+
+class TagClassifier:
+    # Tags text against a vocabulary of tag -> terms loaded from
+    # tag_vocabulary.json using one compiled pattern, so each call is a single
+    # pass over the text however many terms the vocabulary holds.
+
+    def __init__(self, vocabulary: List[Dict]):
+        self.tag_order = []
+        term_tags = {}
+        term_modes = {}
+        for entry in vocabulary:
+            tag = entry["tag"]
+            if tag not in self.tag_order:
+                self.tag_order.append(tag)
+            for term in entry["terms"]:
+                term = TERM_SPACE.sub(" ", term.lower().strip())
+                term_tags.setdefault(term, set()).add(tag)
+                # A term listed as both keeps the looser prefix match
+                if entry.get("match", "word") == "prefix" or term_modes.get(term) == "prefix":
+                    term_modes[term] = "prefix"
+                else:
+                    term_modes[term] = "word"
+
+        # The scan reports only the longest term at each start position, so a
+        # term also carries the tags of shorter terms it begins with
+        # ("source capabilities" implies "source").
+        rank = {tag: position for position, tag in enumerate(self.tag_order)}
+        self._term_tags = {}
+        for term, tags in term_tags.items():
+            implied = set(tags)
+            for end in range(1, len(term)):
+                shorter = term[:end]
+                if shorter in term_modes and (term_modes[shorter] == "prefix" or
+                                              not re.match(r"[a-z0-9']", term[end])):
+                    implied |= term_tags[shorter]
+            self._term_tags[term] = sorted(implied, key=rank.__getitem__)
+        self._rank = rank
+
+        trie = {}
+        for term, mode in term_modes.items():
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = mode
+        self.term_count = len(term_modes)
+        self.pattern = re.compile(_vocabulary_pattern(trie, {"prefix": "", "word": WORD_END}) if trie else "(?!)")
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "TagClassifier":
+        with open(path or DEFAULT_VOCABULARY_FILE, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["tags"])
+
+    def tags(self, text: str) -> List[str]:
+        if not text:
+            return []
+        found = set()
+        for first, rest in set(self.pattern.findall(text.replace("’", "'"))):
+            term = (first + rest).lower()
+            found.update(self._term_tags[term] if term in self._term_tags
+                         else self._term_tags[TERM_SPACE.sub(" ", term)])
+        return sorted(found, key=self._rank.__getitem__)
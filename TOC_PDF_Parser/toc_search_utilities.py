@@ -1,97 +1,409 @@
-import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from typing import List, Dict, Optional
 
+from binary_records import open_records
+from cross_references import CrossReferenceIndex, XREF_FILE
+from records import SearchHit, compact, compact_records
+
+KEYWORD_FIELDS = ["title", "tags", "section_id", "full_path"]
+# Fields the trigram index covers; search_by_keyword scans any other field
+TRIGRAM_FIELDS = ["title", "full_path", "tags", "section_id"]
+FUZZY_FIELDS = ["title", "full_path", "tags"]
+# Posting lists are intersected shortest first until this few candidates are
+# left; those are then checked against the text directly
+MIN_CANDIDATES = 16
+# Fuzzy search re-ranks this many times the result limit by edit distance
+SHORTLIST_FACTOR = 3
+COMMON_TRIGRAM_FRACTION = 0.05
+# Separates tags in the indexed text so no trigram spans two tags
+TAG_SEPARATOR = "\x00"
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def fuzzy_trigrams(text: str) -> set:
+    # Word by word, padded with a space on either side, so word starts and
+    # ends count and the gap between words does not
+    grams = set()
+    for word in text.lower().split():
+        grams.update(trigrams(f" {word} "))
+    return grams
+
+
+def edit_distance(first: str, second: str) -> int:
+    previous = list(range(len(second) + 1))
+    for i, a in enumerate(first, 1):
+        current = [i]
+        for j, b in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        previous = current
+    return previous[-1]
+
+
+def word_distance(query_words: List[str], text: str, memo: Dict) -> float:
+    # Each query word against its closest word in the text, as a fraction of
+    # the query's length: 0 when every word occurs as typed. memo keeps
+    # distances between calls for the same query.
+    words = set(text.lower().split())
+    if not words or not query_words:
+        return 1.0
+    total = 0
+    for query_word in query_words:
+        if query_word in words:
+            continue
+        best = len(query_word)
+        for word in words:
+            # The length difference alone is a lower bound
+            if abs(len(word) - len(query_word)) >= best:
+                continue
+            distance = memo.get((query_word, word))
+            if distance is None:
+                distance = memo[(query_word, word)] = edit_distance(query_word, word)
+            best = min(best, distance)
+        total += best
+    return min(1.0, total / sum(len(query_word) for query_word in query_words))
+
+
+def scan_keyword(entries, keyword: str, fields: Optional[List[str]] = None, limit: Optional[int] = None) -> List[Dict]:
+    # The keyword search without any index, over records or plain dicts;
+    # stops once limit entries have matched
+    if fields is None:
+        fields = KEYWORD_FIELDS
+    keyword_lower = keyword.lower()
+    results = []
+    for entry in entries:
+        match_found = False
+        match_details = []
+        for field in fields:
+            if field == "tags":
+                matching_tags = [tag for tag in entry["tags"] if keyword_lower in tag.lower()]
+                if matching_tags:
+                    match_found = True
+                    match_details.append(f"tags: {matching_tags}")
+            elif field in entry:
+                if keyword_lower in str(entry[field]).lower():
+                    match_found = True
+                    match_details.append(f"{field}: {entry[field]}")
+        if match_found:
+            results.append(SearchHit(entry, match_details))
+            if len(results) == limit:
+                break
+    return results
+
+
 class TOCSearchEngine:
-    def __init__(self, jsonl_file: str):
+    def __init__(self, jsonl_file: Optional[str] = None, trigram_index: bool = True):
         
+        # TOCEntry records, see records.py; search results are SearchHit views
+        # over them rather than copies
         self.entries = []
-        self.load_entries(jsonl_file)
+        # Whether build_indexes() also builds the trigram index; one-off
+        # command-line lookups are quicker with a plain scan
+        self.trigram_index = trigram_index
+        self._texts = {}
+        self._text_entries = {}
+        self._trigrams = {}
+        self._trigram_counts = {}
+        self._by_id = {}
+        self._children = {}
+        self._by_level = {}
+        self._page_keys = []
+        self._page_order = []
+        # Empty until a cross-reference index is loaded
+        self.cross_references = CrossReferenceIndex()
+        if jsonl_file is not None:
+            self.load_entries(jsonl_file)
+    
+    @classmethod
+    def from_entries(cls, entries: List[Dict], cross_references: Optional[CrossReferenceIndex] = None,
+                     trigram_index: bool = True, compact_entries: bool = True) -> "TOCSearchEngine":
+        # For TOC entries already in memory, e.g. straight from the parser.
+        # Entries are compacted into records unless the engine is short-lived.
+        engine = cls(trigram_index=trigram_index)
+        engine.entries = [compact(entry) for entry in entries] if compact_entries else list(entries)
+        if cross_references is not None:
+            engine.cross_references = cross_references
+        engine.build_indexes()
+        return engine
         
     def load_entries(self, jsonl_file: str):
+        # May be called again to merge further revisions into the same engine.
+        # Takes a JSONL file or its .bin companion.
         
         try:
-            with open(jsonl_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        self.entries.append(json.loads(line))
+            with open_records(jsonl_file) as reader:
+                self.entries.extend(compact_records(reader.summaries()))
             print(f"Loaded {len(self.entries)} TOC entries")
         except FileNotFoundError:
             print(f"File {jsonl_file} not found")
+            return
         except Exception as e:
             print(f"Error loading entries: {e}")
+            return
+        
+        # The parser saves the cross-reference index next to the TOC; it is
+        # merged into the edges of the files loaded before, like the entries
+        xref_file = os.path.join(os.path.dirname(jsonl_file), XREF_FILE)
+        if os.path.exists(xref_file):
+            self.load_cross_references(xref_file)
+        
+        self.build_indexes()
+    
+    def load_cross_references(self, xref_file: str):
+        try:
+            self.cross_references.merge(CrossReferenceIndex.load(xref_file))
+        except (OSError, ValueError) as e:
+            print(f"Error loading cross-references: {e}")
     
-    def search_by_keyword(self, keyword: str, fields: List[str] = None) -> List[Dict]:
+    def build_indexes(self):
+        # Every lookup below is answered from these structures. Lists keep file
+        # order so results match a linear scan over self.entries; for repeated
+        # section_ids the first entry wins, as it did with next(...).
+        self._by_id = {}
+        self._children = {}
+        self._by_level = {}
+        for entry in self.entries:
+            self._by_id.setdefault(entry["section_id"], entry)
+            self._children.setdefault(entry["parent_id"], []).append(entry)
+            self._by_level.setdefault(entry["level"], []).append(entry)
+        
+        self._page_order = sorted(range(len(self.entries)), key=lambda index: self.entries[index]["page"])
+        self._page_keys = [self.entries[index]["page"] for index in self._page_order]
+        
+        self._texts = {}
+        self._text_entries = {}
+        self._trigrams = {}
+        self._trigram_counts = {}
+        if self.trigram_index:
+            self.build_trigram_index()
+    
+    def build_trigram_index(self):
+        
+        # Per field, each distinct lowercased value is indexed once, so the
+        # revisions of a merged corpus share their titles' postings. Posting
+        # lists hold ascending text ids; _text_entries maps a text id back to
+        # the entries carrying it. Texts are padded with a space at either
+        # end, which fuzzy matching uses as word boundaries.
+        for field in TRIGRAM_FIELDS:
+            text_ids = {}
+            texts = []
+            text_entries = []
+            postings = {}
+            counts = array("H")
+            for index, entry in enumerate(self.entries):
+                if field == "tags":
+                    value = tuple(tag.lower() for tag in entry["tags"])
+                else:
+                    value = str(entry[field]).lower()
+                text_id = text_ids.get(value)
+                if text_id is None:
+                    text_id = text_ids[value] = len(texts)
+                    texts.append(value)
+                    text_entries.append(array("I"))
+                    padded = TAG_SEPARATOR.join(f" {tag} " for tag in value) if field == "tags" else f" {value} "
+                    grams = trigrams(padded)
+                    counts.append(min(len(grams), 65535))
+                    for gram in grams:
+                        posting = postings.get(gram)
+                        if posting is None:
+                            postings[gram] = posting = array("I")
+                        posting.append(text_id)
+                text_entries[text_id].append(index)
+            self._texts[field] = texts
+            self._text_entries[field] = text_entries
+            self._trigrams[field] = postings
+            self._trigram_counts[field] = counts
+    
+    def _matching_texts(self, field: str, keyword_lower: str) -> List[int]:
+        
+        # Posting lists are intersected shortest first, then the few texts
+        # left are checked directly, so hits are exactly those of a scan
+        texts = self._texts[field]
+        grams = trigrams(keyword_lower)
+        if grams:
+            postings = self._trigrams[field]
+            lists = sorted((postings.get(gram, ()) for gram in grams), key=len)
+            candidates = set(lists[0])
+            for posting in lists[1:]:
+                if len(candidates) <= MIN_CANDIDATES:
+                    break
+                candidates.intersection_update(posting)
+        else:
+            candidates = range(len(texts))
+        if field == "tags":
+            return [text_id for text_id in candidates if any(keyword_lower in tag for tag in texts[text_id])]
+        return [text_id for text_id in candidates if keyword_lower in texts[text_id]]
+    
+    def search_by_keyword(self, keyword: str, fields: List[str] = None, limit: Optional[int] = None) -> List[Dict]:
         
         if fields is None:
-            fields = ["title", "tags", "section_id", "full_path"]
+            fields = KEYWORD_FIELDS
+        if not self._trigrams:
+            results = self._scan_keyword(keyword, fields)
+            return results[:limit] if limit else results
         
         keyword_lower = keyword.lower()
-        results = []
+        matched = set()
+        for field in fields:
+            if field not in self._trigrams:
+                # Not indexed: scanned as before
+                matched.update(index for index, entry in enumerate(self.entries)
+                               if field in entry and keyword_lower in str(entry[field]).lower())
+                continue
+            text_entries = self._text_entries[field]
+            for text_id in self._matching_texts(field, keyword_lower):
+                matched.update(text_entries[text_id])
         
-        for entry in self.entries:
-            match_found = False
+        # Details only for the results returned, in the order of fields as
+        # the scan lists them
+        results = []
+        for index in sorted(matched)[:limit] if limit else sorted(matched):
+            entry = self.entries[index]
             match_details = []
-            
             for field in fields:
                 if field == "tags":
                     matching_tags = [tag for tag in entry["tags"] if keyword_lower in tag.lower()]
                     if matching_tags:
-                        match_found = True
                         match_details.append(f"tags: {matching_tags}")
-                elif field in entry:
-                    if keyword_lower in str(entry[field]).lower():
-                        match_found = True
-                        match_details.append(f"{field}: {entry[field]}")
-            
-            if match_found:
-                result = entry.copy()
-                result["match_details"] = match_details
-                results.append(result)
+                elif field in entry and keyword_lower in str(entry[field]).lower():
+                    match_details.append(f"{field}: {entry[field]}")
+            results.append(SearchHit(entry, match_details))
+        return results
+    
+    def fuzzy_search(self, query: str, limit: Optional[int] = 10, fields: List[str] = None,
+                     min_similarity: float = 0.3) -> List[Dict]:
+        
+        # Typo-tolerant search. Texts sharing the most of the query's rarer
+        # trigrams are shortlisted from the posting lists, scored by how much
+        # of the query they contain (nudged by Jaccard so shorter texts rank
+        # first), then re-ranked with the word edit distance to the query.
+        if fields is None:
+            fields = FUZZY_FIELDS
+        if not self._trigrams:
+            self.build_trigram_index()
+        query_grams = fuzzy_trigrams(query)
+        query_words = query.lower().split()
+        if not query_grams:
+            return []
+        shortlist_size = (limit or 10) * SHORTLIST_FACTOR
+        
+        scored = []
+        for field in fields:
+            postings = self._trigrams[field]
+            counts = self._trigram_counts[field]
+            texts = self._texts[field]
+            # Trigrams found in most texts ("pow", "ion") only select
+            # candidates when the query has nothing rarer
+            lists = sorted((postings.get(gram, ()) for gram in query_grams), key=len)
+            common = COMMON_TRIGRAM_FRACTION * len(texts)
+            shared = Counter()
+            for posting in lists:
+                if shared and len(posting) > common:
+                    break
+                shared.update(posting)
+            for text_id, _ in shared.most_common(shortlist_size):
+                value = texts[text_id]
+                padded = TAG_SEPARATOR.join(f" {tag} " for tag in value) if field == "tags" else f" {value} "
+                count = len(query_grams & trigrams(padded))
+                containment = count / len(query_grams)
+                jaccard = count / (len(query_grams) + counts[text_id] - count)
+                score = 0.8 * containment + 0.2 * jaccard
+                if score >= min_similarity:
+                    scored.append((score, field, text_id))
+        scored.sort(key=lambda item: -item[0])
+        
+        best = {}
+        memo = {}
+        for score, field, text_id in scored[:shortlist_size]:
+            value = self._texts[field][text_id]
+            text = " ".join(value) if field == "tags" else value
+            similarity = 0.5 * score + 0.5 * (1.0 - word_distance(query_words, text, memo))
+            for index in self._text_entries[field][text_id]:
+                if similarity > best.get(index, (0.0, None))[0]:
+                    best[index] = (similarity, field)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))
         
+        results = []
+        for index, (similarity, field) in ranked[:limit] if limit else ranked:
+            entry = self.entries[index]
+            value = entry[field]
+            # Records hold tags as a tuple; details show the list the JSONL has
+            value = list(value) if type(value) is tuple else value
+            results.append(SearchHit(entry, [f"{field}: {value}"], round(similarity, 3)))
         return results
     
+    def _scan_keyword(self, keyword: str, fields: List[str]) -> List[Dict]:
+        
+        return scan_keyword(self.entries, keyword, fields)
+    
     def search_by_level(self, level: int) -> List[Dict]:
         
-        return [entry for entry in self.entries if entry["level"] == level]
+        return list(self._by_level.get(level, []))
     
     def search_by_page_range(self, start_page: int, end_page: int) -> List[Dict]:
         
-        return [entry for entry in self.entries if start_page <= entry["page"] <= end_page]
+        lo = bisect_left(self._page_keys, start_page)
+        hi = bisect_right(self._page_keys, end_page)
+        # Back to file order, which is what callers have always received
+        return [self.entries[index] for index in sorted(self._page_order[lo:hi])]
     
     def get_children(self, section_id: str) -> List[Dict]:
         
-        return [entry for entry in self.entries if entry["parent_id"] == section_id]
+        return list(self._children.get(section_id, []))
     
     def get_all_descendants(self, section_id: str) -> List[Dict]:
         
+        # Iterative pre-order walk over the children index
         descendants = []
-        
-        def collect_descendants(parent_id):
-            children = self.get_children(parent_id)
-            for child in children:
-                descendants.append(child)
-                collect_descendants(child["section_id"])
-        
-        collect_descendants(section_id)
+        stack = [iter(self._children.get(section_id, []))]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            descendants.append(child)
+            stack.append(iter(self._children.get(child["section_id"], [])))
         return descendants
     
     def get_path_to_root(self, section_id: str) -> List[Dict]:
         
         path = []
-        current_entry = next((entry for entry in self.entries if entry["section_id"] == section_id), None)
+        current_entry = self._by_id.get(section_id)
         
         while current_entry:
-            path.insert(0, current_entry)
+            path.append(current_entry)
             if current_entry["parent_id"]:
-                current_entry = next((entry for entry in self.entries if entry["section_id"] == current_entry["parent_id"]), None)
+                current_entry = self._by_id.get(current_entry["parent_id"])
             else:
                 break
         
+        path.reverse()
         return path
     
     def get_section_by_id(self, section_id: str) -> Optional[Dict]:
         
-        return next((entry for entry in self.entries if entry["section_id"] == section_id), None)
+        return self._by_id.get(section_id)
+    
+    def references(self, node: str) -> List[str]:
+        
+        # Section ids, "Table N-M" and "Figure N-M" the section's content refers to
+        return self.cross_references.references(node)
+    
+    def referenced_by(self, node: str) -> List[str]:
+        
+        # Section ids whose content refers to this section, table or figure
+        return self.cross_references.referenced_by(node)
+    
+    def reference_closure(self, node: str, max_depth: Optional[int] = 3, reverse: bool = False) -> Dict[str, int]:
+        
+        # Everything reachable within max_depth references (or, with reverse,
+        # everything that reaches node), mapped to its distance
+        return self.cross_references.closure(node, max_depth, reverse)
 
 def demo_search():
     
@@ -130,12 +442,16 @@ def demo_search():
     
     
     if engine.entries:
-        sample_section = "2.1.1" if any(e["section_id"] == "2.1.1" for e in engine.entries) else engine.entries[0]["section_id"]
+        sample_section = "2.1.1" if engine.get_section_by_id("2.1.1") else engine.entries[0]["section_id"]
         print(f"\n5. Path to Root for Section '{sample_section}':")
         path = engine.get_path_to_root(sample_section)
         for i, section in enumerate(path):
             indent = "   " + "  " * i
             print(f"{indent}{section['section_id']} - {section['title']}")
+        
+        print(f"\n6. Sections Referring to Section '{sample_section}':")
+        for section_id in engine.referenced_by(sample_section)[:5]:
+            print(f"   {section_id}")
 
 if __name__ == "__main__":
     demo_search()
@@ -0,0 +1,209 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+# Page differences larger than this between a TOC entry and its parsed section
+# are reported as order errors
+PAGE_TOLERANCE = 2
+# Upper bound on ids listed for a single numbering gap, so one bogus id such
+# as "2012" cannot flood the report
+MAX_GAP_EXPANSION = 20
+
+
+class SectionColumns:
+    # Column-oriented view of TOC entries or parsed sections: one NumPy array
+    # per field, plus the index of the document each row came from when a
+    # corpus of revisions is validated together.
+
+    def __init__(self, records: Sequence[Dict], page_field: str, doc_index: Optional[Sequence[int]] = None):
+        count = len(records)
+        self.records = records
+        # Python strings for report rows, the array for joins and sorts
+        self.id_list = [record["section_id"] for record in records]
+        self.section_ids = np.array(self.id_list, dtype=str)
+        self.pages = np.fromiter(
+            (page if isinstance(page, int) else -1 for page in (record.get(page_field) for record in records)),
+            dtype=np.int64, count=count
+        )
+        if doc_index is None:
+            self.docs = np.zeros(count, dtype=np.int64)
+        else:
+            self.docs = np.asarray(doc_index, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.section_ids)
+
+    def total(self, field: str) -> int:
+        # Sums "<field>_count" from record summaries, or the list lengths when
+        # full records were loaded
+        count_field = f"{field}_count"
+        return int(np.fromiter(
+            (record[count_field] if count_field in record else len(record.get(field, ()))
+             for record in self.records),
+            dtype=np.int64, count=len(self.records)
+        ).sum())
+
+
+
+def occurrence_rank(keys: np.ndarray) -> np.ndarray:
+    # 0 for the first row of each key in file order, 1 for the second, ...
+    count = len(keys)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(count), 0))
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count) - group_start
+    return rank
+
+
+class ColumnarValidator:
+    # Validates parsed sections against the TOC with array joins instead of
+    # per-entry dict lookups. Rows are keyed by (document, section_id); the
+    # k-th TOC entry with a key is paired with the k-th parsed section with the
+    # same key, so repeated ids are matched one-to-one rather than collapsed.
+
+    def __init__(self, toc: SectionColumns, content: SectionColumns, document_ids: Optional[List[str]] = None):
+        self.toc = toc
+        self.content = content
+        self.document_ids = document_ids
+
+        all_ids = np.concatenate([toc.section_ids, content.section_ids])
+        self.unique_ids, inverse = np.unique(all_ids, return_inverse=True)
+        id_count = max(len(self.unique_ids), 1)
+        self.toc_keys = toc.docs * id_count + inverse[:len(toc)]
+        self.content_keys = content.docs * id_count + inverse[len(toc):]
+
+    def _document(self, doc: int) -> Dict:
+        if self.document_ids is None:
+            return {}
+        return {"document_id": self.document_ids[doc]}
+
+    def pair(self):
+        toc_rank = occurrence_rank(self.toc_keys)
+        content_rank = occurrence_rank(self.content_keys)
+        width = int(max(toc_rank.max(initial=0), content_rank.max(initial=0))) + 1
+        toc_pairs = self.toc_keys * width + toc_rank
+        content_pairs = self.content_keys * width + content_rank
+        _, toc_index, content_index = np.intersect1d(toc_pairs, content_pairs, assume_unique=True,
+                                                     return_indices=True)
+        order = np.argsort(toc_index)
+        return toc_index[order], content_index[order]
+
+    def analyze(self) -> Dict:
+        toc, content = self.toc, self.content
+        toc_index, content_index = self.pair()
+
+        matched_toc = np.zeros(len(toc), dtype=bool)
+        matched_toc[toc_index] = True
+        matched_content = np.zeros(len(content), dtype=bool)
+        matched_content[content_index] = True
+
+        toc_pages = toc.pages[toc_index]
+        content_pages = content.pages[content_index]
+        deltas = np.where(content_pages >= 0, content_pages - toc_pages, 0)
+        order_errors = np.nonzero(np.abs(deltas) > PAGE_TOLERANCE)[0]
+
+        toc_docs, toc_page_list = toc.docs.tolist(), toc.pages.tolist()
+        content_docs, content_page_list = content.docs.tolist(), content.pages.tolist()
+        toc_index_list, pair_toc_pages = toc_index.tolist(), toc_pages.tolist()
+        pair_content_pages, pair_deltas = content_pages.tolist(), np.abs(deltas).tolist()
+        return {
+            "matches": len(toc_index_list),
+            "missing_in_content": [
+                {**self._document(toc_docs[i]), "section_id": toc.id_list[i],
+                 "title": toc.records[i]["title"], "page": toc_page_list[i]}
+                for i in np.nonzero(~matched_toc)[0].tolist()
+            ],
+            "extra_in_content": [
+                {**self._document(content_docs[i]), "section_id": content.id_list[i],
+                 "title": content.records[i]["title"],
+                 "page": content_page_list[i] if content_page_list[i] >= 0 else "N/A"}
+                for i in np.nonzero(~matched_content)[0].tolist()
+            ],
+            "order_errors": [
+                {**self._document(toc_docs[toc_index_list[i]]), "section_id": toc.id_list[toc_index_list[i]],
+                 "toc_page": pair_toc_pages[i],
+                 "content_page": pair_content_pages[i] if pair_content_pages[i] >= 0 else "N/A",
+                 "difference": pair_deltas[i]}
+                for i in order_errors.tolist()
+            ],
+            "duplicates": self.duplicates(),
+            "page_inversions": self.page_inversions(toc, "toc") + self.page_inversions(content, "content"),
+            "gaps": self.numbering_gaps(toc),
+            "page_delta_stats": {
+                "mean_abs": round(float(np.abs(deltas).mean()), 3) if len(deltas) else 0.0,
+                "max_abs": int(np.abs(deltas).max()) if len(deltas) else 0,
+                "within_tolerance": int((np.abs(deltas) <= PAGE_TOLERANCE).sum())
+            }
+        }
+
+    def duplicates(self) -> List[Dict]:
+        key_count = int(max(self.toc_keys.max(initial=-1), self.content_keys.max(initial=-1))) + 1
+        toc_counts = np.bincount(self.toc_keys, minlength=key_count)
+        content_counts = np.bincount(self.content_keys, minlength=key_count)
+        id_count = max(len(self.unique_ids), 1)
+        return [
+            {**self._document(key // id_count), "section_id": str(self.unique_ids[key % id_count]),
+             "toc_count": int(toc_counts[key]), "content_count": int(content_counts[key])}
+            for key in np.nonzero((toc_counts > 1) | (content_counts > 1))[0].tolist()
+        ]
+
+    def page_inversions(self, columns: SectionColumns, source: str) -> List[Dict]:
+        # Rows whose page is lower than the row before them in the same document
+        if len(columns) < 2:
+            return []
+        pages = columns.pages
+        inverted = np.nonzero((pages[1:] < pages[:-1]) & (columns.docs[1:] == columns.docs[:-1])
+                              & (pages[1:] >= 0))[0] + 1
+        docs, page_list = columns.docs.tolist(), pages.tolist()
+        return [
+            {**self._document(docs[i]), "source": source, "section_id": columns.id_list[i],
+             "page": page_list[i], "previous_section_id": columns.id_list[i - 1],
+             "previous_page": page_list[i - 1]}
+            for i in inverted.tolist()
+        ]
+
+    def numbering_gaps(self, columns: SectionColumns) -> List[Dict]:
+        # Siblings are grouped by (document, parent id) and sorted by their last
+        # number; a step of more than one between neighbours is a gap, e.g.
+        # 2.1.2 followed by 2.1.4 reports 2.1.3 as missing. Chapters rarely have
+        # TOC entries of their own, so every id also stands in for its chapter
+        # number and a chapter with no entries at all shows up as a gap too.
+        parents = []
+        numbers = []
+        rows = []
+        for row, section_id in enumerate(columns.id_list):
+            parent, _, last = section_id.rpartition(".")
+            if last.isdigit():
+                parents.append(parent)
+                numbers.append(int(last))
+                rows.append(row)
+            chapter = section_id.partition(".")[0]
+            if parent and chapter.isdigit():
+                parents.append("")
+                numbers.append(int(chapter))
+                rows.append(row)
+        if len(rows) < 2:
+            return []
+
+        unique_parents, parent_codes = np.unique(np.array(parents, dtype=str), return_inverse=True)
+        numbers = np.array(numbers, dtype=np.int64)
+        docs = columns.docs[np.array(rows)]
+        group = docs * len(unique_parents) + parent_codes
+        order = np.lexsort((numbers, group))
+        group, numbers = group[order], numbers[order]
+        steps = np.diff(numbers)
+        gap_at = np.nonzero((group[1:] == group[:-1]) & (steps > 1))[0]
+
+        gaps = []
+        for i in gap_at:
+            parent = str(unique_parents[group[i] % len(unique_parents)])
+            prefix = f"{parent}." if parent else ""
+            after, before = int(numbers[i]), int(numbers[i + 1])
+            for missing in range(after + 1, min(before, after + 1 + MAX_GAP_EXPANSION)):
+                gaps.append({**self._document(group[i] // len(unique_parents)),
+                             "section_id": f"{prefix}{missing}", "parent_id": parent or None,
+                             "after": f"{prefix}{after}", "before": f"{prefix}{before}"})
+        return gaps
@@ -1,45 +1,111 @@
+import argparse
+import csv
+import itertools
 import json
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 import os
 from datetime import datetime
 
+from binary_records import open_records
+from records import compact_records
+from validation_engine import ColumnarValidator, SectionColumns
+
+# (sheet title, validation result key, [(field, column header)])
+DETAIL_SHEETS = [
+    ("Missing in Content", "missing_in_content", [("section_id", "Section ID"), ("title", "Title"), ("page", "TOC Page")]),
+    ("Extra in Content", "extra_in_content", [("section_id", "Section ID"), ("title", "Title"), ("page", "Parsed Page")]),
+    ("Order Errors", "order_errors", [("section_id", "Section ID"), ("toc_page", "TOC Page"),
+                                      ("content_page", "Parsed Page"), ("difference", "Difference")]),
+    ("Numbering Gaps", "gaps", [("section_id", "Missing ID"), ("parent_id", "Parent"), ("after", "After"),
+                                ("before", "Before")]),
+    ("Duplicates", "duplicates", [("section_id", "Section ID"), ("toc_count", "TOC Count"),
+                                  ("content_count", "Parsed Count")]),
+    ("Page Inversions", "page_inversions", [("source", "Source"), ("section_id", "Section ID"), ("page", "Page"),
+                                            ("previous_section_id", "Previous Section"),
+                                            ("previous_page", "Previous Page")])
+]
+# Columns of the optional "Changes" sheet, from a revision_diff.py result
+CHANGE_COLUMNS = [("status", "Status"), ("old_section_id", "Old ID"), ("new_section_id", "New ID"),
+                  ("old_title", "Old Title"), ("new_title", "New Title"), ("old_page", "Old Page"),
+                  ("new_page", "New Page"), ("similarity", "Similarity"), ("words_added", "Words Added"),
+                  ("words_removed", "Words Removed")]
+# Characters of word diff shown per row
+MAX_DIFF_CHARS = 1000
+
 class ValidationReportGenerator:
-    def __init__(self):
+    def __init__(self, output_dir="."):
+        self.output_dir = output_dir
         self.toc_data = []
         self.content_data = []
         self.metadata = {}
-        
-    def load_data(self):
-        
-        
+        # Set when a corpus is loaded: one id per document and, for every TOC
+        # and content row, the index of the document it belongs to
+        self.document_ids = None
+        self.toc_docs = []
+        self.content_docs = []
+        
+    def _read_document(self, directory):
+        toc_data, content_data, metadata = [], [], {}
+        toc_path = os.path.join(directory, "usb_pd_toc.jsonl")
         try:
-            with open("usb_pd_toc.jsonl", "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        self.toc_data.append(json.loads(line))
+            with open_records(toc_path) as reader:
+                toc_data = compact_records(reader.summaries())
         except FileNotFoundError:
-            print("Warning: usb_pd_toc.jsonl not found")
-        
+            print(f"Warning: {toc_path} not found")
         
+        # Validation only needs ids, pages and counts, so the summary fast path
+        # is used and no section content is decoded. A binary companion file,
+        # when present and current, is read instead of the JSONL. Rows are kept
+        # as slotted records, see records.py.
+        spec_path = os.path.join(directory, "usb_pd_spec.jsonl")
         try:
-            with open("usb_pd_spec.jsonl", "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        self.content_data.append(json.loads(line))
+            with open_records(spec_path) as reader:
+                content_data = compact_records(reader.summaries())
         except FileNotFoundError:
-            print("Warning: usb_pd_spec.jsonl not found")
-        
+            print(f"Warning: {spec_path} not found")
         
+        metadata_path = os.path.join(directory, "usb_pd_metadata.jsonl")
         try:
-            with open("usb_pd_metadata.jsonl", "r", encoding="utf-8") as f:
-                self.metadata = json.load(f)
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
         except FileNotFoundError:
-            print("Warning: usb_pd_metadata.jsonl not found")
+            print(f"Warning: {metadata_path} not found")
+        return toc_data, content_data, metadata
+    
+    def load_data(self):
+        self.toc_data, self.content_data, self.metadata = self._read_document(self.output_dir)
+        self.document_ids = None
+        self.toc_docs = []
+        self.content_docs = []
+    
+    def load_corpus(self, corpus_root):
+        # Merges every document of a batch_parser corpus so all revisions are
+        # validated in one pass; rows keep the index of their document
+        with open(os.path.join(corpus_root, "corpus_manifest.json"), "r", encoding="utf-8") as f:
+            documents = [entry for entry in json.load(f).get("documents", []) if entry.get("status") != "failed"]
+        
+        self.toc_data, self.content_data = [], []
+        self.toc_docs, self.content_docs = [], []
+        self.document_ids = []
+        self.metadata = {"total_tables": 0, "total_figures": 0}
+        for doc, entry in enumerate(documents):
+            toc_data, content_data, metadata = self._read_document(
+                entry.get("output_dir") or os.path.join(corpus_root, entry["document_id"]))
+            self.document_ids.append(entry["document_id"])
+            self.toc_data.extend(toc_data)
+            self.content_data.extend(content_data)
+            self.toc_docs.extend([doc] * len(toc_data))
+            self.content_docs.extend([doc] * len(content_data))
+            self.metadata["total_tables"] += metadata.get("total_tables", 0)
+            self.metadata["total_figures"] += metadata.get("total_figures", 0)
     
     def analyze_validation(self):
         
+        # Rows are paired by (document, section_id) and occurrence, so the many
+        # repeated ids such as "1.0" each count once instead of collapsing
+        toc_columns = SectionColumns(self.toc_data, "page", self.toc_docs if self.document_ids else None)
+        content_columns = SectionColumns(self.content_data, "page_start",
+                                         self.content_docs if self.document_ids else None)
+        
         validation_results = {
             "toc_sections": len(self.toc_data),
             "parsed_sections": len(self.content_data),
@@ -49,168 +115,249 @@ class ValidationReportGenerator:
             "extra_in_content": [],
             "order_errors": [],
             "gaps": [],
-            "table_counts": self.count_tables(),
-            "figure_counts": self.count_figures()
+            "table_counts": self.count_tables(content_columns),
+            "figure_counts": self.count_figures(content_columns)
         }
-        
-        
-        toc_lookup = {entry["section_id"]: entry for entry in self.toc_data}
-        content_lookup = {section["section_id"]: section for section in self.content_data}
-        
-        
-        for toc_entry in self.toc_data:
-            section_id = toc_entry["section_id"]
-            if section_id in content_lookup:
-                validation_results["matches"] += 1
-                
-                content_section = content_lookup[section_id]
-                if abs(toc_entry["page"] - content_section.get("page_start", toc_entry["page"])) > 2:
-                    validation_results["order_errors"].append({
-                        "section_id": section_id,
-                        "toc_page": toc_entry["page"],
-                        "content_page": content_section.get("page_start", "N/A"),
-                        "difference": abs(toc_entry["page"] - content_section.get("page_start", toc_entry["page"]))
-                    })
-            else:
-                validation_results["missing_in_content"].append({
-                    "section_id": section_id,
-                    "title": toc_entry["title"],
-                    "page": toc_entry["page"]
-                })
-        
-        
-        for content_section in self.content_data:
-            section_id = content_section["section_id"]
-            if section_id not in toc_lookup:
-                validation_results["extra_in_content"].append({
-                    "section_id": section_id,
-                    "title": content_section["title"],
-                    "page": content_section.get("page_start", "N/A")
-                })
+        validation_results.update(ColumnarValidator(toc_columns, content_columns, self.document_ids).analyze())
+        if self.document_ids:
+            validation_results["documents"] = len(self.document_ids)
         
         return validation_results
     
-    def count_tables(self):
-        
-        toc_table_count = 0
-        content_table_count = 0
-        
-        
-        for entry in self.toc_data:
-            if "table" in entry["title"].lower():
-                toc_table_count += 1
+    def count_tables(self, content_columns=None):
         
-        
-        for section in self.content_data:
-            content_table_count += len(section.get("tables", []))
+        toc_table_count = sum(1 for entry in self.toc_data if "table" in entry["title"].lower())
+        content_columns = content_columns or SectionColumns(self.content_data, "page_start")
         
         return {
             "toc_references": toc_table_count,
-            "content_found": content_table_count,
+            "content_found": content_columns.total("tables"),
             "metadata_count": self.metadata.get("total_tables", 0)
         }
     
-    def count_figures(self):
-        
-        toc_figure_count = 0
-        content_figure_count = 0
-        
+    def count_figures(self, content_columns=None):
         
-        for entry in self.toc_data:
-            if "figure" in entry["title"].lower():
-                toc_figure_count += 1
-        
-       
-        for section in self.content_data:
-            content_figure_count += len(section.get("figures", []))
+        toc_figure_count = sum(1 for entry in self.toc_data if "figure" in entry["title"].lower())
+        content_columns = content_columns or SectionColumns(self.content_data, "page_start")
         
         return {
             "toc_references": toc_figure_count,
-            "content_found": content_figure_count,
+            "content_found": content_columns.total("figures"),
             "metadata_count": self.metadata.get("total_figures", 0)
         }
     
-    def generate_excel_report(self, filename="usb_pd_validation_report.xlsx"):
+    def summary_rows(self, validation_results):
+        rows = [
+            ["Metric", "Expected (TOC)", "Actual (Parsed)", "Status"],
+            ["Total Sections", validation_results["toc_sections"], validation_results["parsed_sections"],
+             "MATCH" if validation_results["toc_sections"] == validation_results["parsed_sections"] else "MISMATCH"]
+        ]
+        if "documents" in validation_results:
+            rows.append(["Documents", "", validation_results["documents"], ""])
+        rows += [
+            ["Matched Sections", "", validation_results["matches"], ""],
+            ["Missing in Content", "", len(validation_results["missing_in_content"]), ""],
+            ["Extra in Content", "", len(validation_results["extra_in_content"]), ""],
+            ["Order Errors", "", len(validation_results["order_errors"]), ""],
+            ["Duplicate Section IDs", "", len(validation_results["duplicates"]), ""],
+            ["Page Inversions", "", len(validation_results["page_inversions"]), ""],
+            ["Numbering Gaps", "", len(validation_results["gaps"]), ""],
+            ["Max Page Delta", "", validation_results["page_delta_stats"]["max_abs"], ""],
+            [],
+            ["Tables (TOC References)", validation_results["table_counts"]["toc_references"],
+             validation_results["table_counts"]["content_found"], ""],
+            ["Figures (TOC References)", validation_results["figure_counts"]["toc_references"],
+             validation_results["figure_counts"]["content_found"], ""]
+        ]
+        return rows
+    
+    def detail_columns(self, columns):
+        if self.document_ids:
+            return [("document_id", "Document")] + columns
+        return columns
+    
+    def detail_rows(self, validation_results, key, columns):
+        fields = [field for field, _ in columns]
+        for entry in validation_results[key]:
+            yield [entry[field] if entry[field] is not None else "" for field in fields]
+    
+    def change_rows(self, changes):
+        fields = [field for field, _ in CHANGE_COLUMNS]
+        for change in changes["changes"]:
+            # git --word-diff style: [-removed-]{+added+}
+            diff = " ... ".join((f"[-{old}-]" if old else "") + (f"{{+{new}+}}" if new else "")
+                                for _, old, new in change.get("diff", []))
+            if len(diff) > MAX_DIFF_CHARS:
+                diff = diff[:MAX_DIFF_CHARS] + " ..."
+            yield [change.get(field) if change.get(field) is not None else "" for field in fields] + [diff]
+    
+    def measure_rows(self, rows, widths, csv_path=None):
+        # Running maximum of every column's text length. The same pass writes
+        # the optional CSV copy, so rows are only ever produced, never stored.
+        csv_file = open(csv_path, "w", encoding="utf-8", newline="") if csv_path else None
+        try:
+            writer = csv.writer(csv_file) if csv_file else None
+            for row in rows:
+                for column, value in enumerate(row):
+                    length = len(str(value))
+                    if column == len(widths):
+                        widths.append(length)
+                    elif length > widths[column]:
+                        widths[column] = length
+                if writer:
+                    writer.writerow(row)
+        finally:
+            if csv_file:
+                csv_file.close()
+        return widths
+    
+    def stream_sheet(self, wb, title, rows, widths, styled_cell=None, styled_rows=0):
+        from openpyxl.utils import get_column_letter
+        
+        # Write-only sheets need their column widths before the first row goes out
+        sheet = wb.create_sheet(title)
+        for column, width in enumerate(widths, 1):
+            sheet.column_dimensions[get_column_letter(column)].width = min(width + 2, 50)
+        for row_number, row in enumerate(rows, 1):
+            # Only the leading styled_rows go through WriteOnlyCell; data rows
+            # are appended as plain values
+            if row_number <= styled_rows:
+                row = [styled_cell(sheet, row_number, column, value) for column, value in enumerate(row, 1)]
+            sheet.append(row)
+        return sheet
+    
+    def generate_excel_report(self, filename="usb_pd_validation_report.xlsx", csv_dir=None, changes=None):
+        # openpyxl is imported only here, so validating without a workbook
+        # never pays for it. changes, a revision_diff.py result, adds a
+        # "Changes" sheet.
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
         
         validation_results = self.analyze_validation()
+        if csv_dir:
+            os.makedirs(csv_dir, exist_ok=True)
         
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)  
+        # Streaming workbook: rows are written to disk as they are appended,
+        # so detail sheets with tens of thousands of rows stay cheap
+        wb = openpyxl.Workbook(write_only=True)
         
         
         header_font = Font(bold=True, color="FFFFFF")
         header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
         error_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
         success_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-        warning_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-        
-        
-        summary_sheet = wb.create_sheet("Summary")
-        summary_sheet.append(["USB PD Specification Validation Report"])
-        summary_sheet.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
-        summary_sheet.append([])
-        
-        
-        summary_sheet.append(["Metric", "Expected (TOC)", "Actual (Parsed)", "Status"])
-        summary_sheet.append(["Total Sections", validation_results["toc_sections"], 
-                             validation_results["parsed_sections"], 
-                             "MATCH" if validation_results["toc_sections"] == validation_results["parsed_sections"] else "MISMATCH"])
-        summary_sheet.append(["Matched Sections", "", validation_results["matches"], ""])
-        summary_sheet.append(["Missing in Content", "", len(validation_results["missing_in_content"]), ""])
-        summary_sheet.append(["Extra in Content", "", len(validation_results["extra_in_content"]), ""])
-        summary_sheet.append(["Order Errors", "", len(validation_results["order_errors"]), ""])
-        summary_sheet.append([])
-        
-       
-        summary_sheet.append(["Tables (TOC References)", validation_results["table_counts"]["toc_references"], 
-                             validation_results["table_counts"]["content_found"], ""])
-        summary_sheet.append(["Figures (TOC References)", validation_results["figure_counts"]["toc_references"], 
-                             validation_results["figure_counts"]["content_found"], ""])
-        
-        
-        for row in range(1, summary_sheet.max_row + 1):
-            for col in range(1, 5):
-                cell = summary_sheet.cell(row=row, column=col)
-                if row == 1:  
-                    cell.font = Font(bold=True, size=16)
-                elif row == 4:  
-                    cell.font = header_font
-                    cell.fill = header_fill
-                elif col == 4 and cell.value == "MISMATCH":
-                    cell.fill = error_fill
-                elif col == 4 and cell.value == "MATCH":
-                    cell.fill = success_fill
-        
-
-        for sheet in wb.worksheets:
-            for column in sheet.columns:
-                max_length = 0
-                column_letter = get_column_letter(column[0].column)
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                sheet.column_dimensions[column_letter].width = adjusted_width
+        title_font = Font(bold=True, size=16)
+        
+        def summary_cell(sheet, row, col, value):
+            cell = WriteOnlyCell(sheet, value=value)
+            if row == 1:  
+                cell.font = title_font
+            elif row == 4:  
+                cell.font = header_font
+                cell.fill = header_fill
+            elif col == 4 and value == "MISMATCH":
+                cell.fill = error_fill
+            elif col == 4 and value == "MATCH":
+                cell.fill = success_fill
+            return cell
+        
+        def header_cell(sheet, row, col, value):
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.font = header_font
+            cell.fill = header_fill
+            return cell
+        
+        
+        metric_rows = self.summary_rows(validation_results)
+        # The report title is left out of the widths so it spills over instead
+        # of stretching column A
+        widths = self.measure_rows(metric_rows, [],
+                                   os.path.join(csv_dir, "summary.csv") if csv_dir else None)
+        summary = [["USB PD Specification Validation Report"],
+                   [f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"], []] + metric_rows
+        self.stream_sheet(wb, "Summary", summary, widths, styled_cell=summary_cell, styled_rows=len(summary))
+        
+        
+        for title, key, columns in DETAIL_SHEETS:
+            columns = self.detail_columns(columns)
+            headers = [label for _, label in columns]
+            csv_path = os.path.join(csv_dir, f"{key}.csv") if csv_dir else None
+            widths = self.measure_rows(
+                itertools.chain([headers], self.detail_rows(validation_results, key, columns)), [], csv_path)
+            self.stream_sheet(wb, title,
+                              itertools.chain([headers], self.detail_rows(validation_results, key, columns)),
+                              widths, styled_cell=header_cell, styled_rows=1)
+        
+        if changes is not None:
+            headers = [label for _, label in CHANGE_COLUMNS] + ["Word Diff"]
+            csv_path = os.path.join(csv_dir, "changes.csv") if csv_dir else None
+            widths = self.measure_rows(itertools.chain([headers], self.change_rows(changes)), [], csv_path)
+            self.stream_sheet(wb, "Changes", itertools.chain([headers], self.change_rows(changes)),
+                              widths, styled_cell=header_cell, styled_rows=1)
         
 
         wb.save(filename)
         print(f"Validation report saved to {filename}")
+        if csv_dir:
+            print(f"CSV copies saved to {csv_dir}")
         
         return validation_results
 
+def validation_summary(results):
+    # Counts of a validation result, small enough to print or emit as JSON
+    summary = {"documents": results["documents"]} if "documents" in results else {}
+    summary.update({
+        "toc_sections": results["toc_sections"],
+        "parsed_sections": results["parsed_sections"],
+        "matches": results["matches"],
+        "issues": len(results["missing_in_content"]) + len(results["extra_in_content"]) + len(results["order_errors"]),
+        "missing_in_content": len(results["missing_in_content"]),
+        "extra_in_content": len(results["extra_in_content"]),
+        "order_errors": len(results["order_errors"]),
+        "duplicates": len(results["duplicates"]),
+        "page_inversions": len(results["page_inversions"]),
+        "gaps": len(results["gaps"]),
+        "table_counts": results["table_counts"],
+        "figure_counts": results["figure_counts"]
+    })
+    return summary
+
+def print_validation_summary(summary):
+    print("\nValidation Summary:")
+    if "documents" in summary:
+        print(f"Documents: {summary['documents']}")
+    print(f"TOC Sections: {summary['toc_sections']}")
+    print(f"Parsed Sections: {summary['parsed_sections']}")
+    print(f"Matches: {summary['matches']}")
+    print(f"Issues Found: {summary['issues']}")
+    print(f"Duplicate IDs: {summary['duplicates']}, Page Inversions: {summary['page_inversions']}, "
+          f"Numbering Gaps: {summary['gaps']}")
+    if "changes" in summary:
+        print("Changes: " + ", ".join(f"{status}: {count}" for status, count in summary["changes"].items()))
+
 def main():
-    generator = ValidationReportGenerator()
-    generator.load_data()
-    results = generator.generate_excel_report()
+    arg_parser = argparse.ArgumentParser(description="Validate parsed USB PD outputs against the TOC")
+    arg_parser.add_argument("--output-dir", default=".", help="Directory holding the parser outputs")
+    arg_parser.add_argument("--corpus", help="Corpus root written by batch_parser.py; validates every document")
+    arg_parser.add_argument("--report", default="usb_pd_validation_report.xlsx", help="Excel report path")
+    arg_parser.add_argument("--csv-dir", help="Also write every report sheet as a CSV file into this directory")
+    arg_parser.add_argument("--previous-output",
+                            help="Outputs of the previous revision; adds a Changes sheet comparing --output-dir to it")
+    args = arg_parser.parse_args()
     
-    print("\nValidation Summary:")
-    print(f"TOC Sections: {results['toc_sections']}")
-    print(f"Parsed Sections: {results['parsed_sections']}")
-    print(f"Matches: {results['matches']}")
-    print(f"Issues Found: {len(results['missing_in_content']) + len(results['extra_in_content']) + len(results['order_errors'])}")
+    generator = ValidationReportGenerator(args.output_dir)
+    if args.corpus:
+        generator.load_corpus(args.corpus)
+    else:
+        generator.load_data()
+    changes = None
+    if args.previous_output:
+        from revision_diff import compare_outputs, print_revision_summary
+        changes = compare_outputs(args.previous_output, args.output_dir)
+        print_revision_summary(changes)
+    results = generator.generate_excel_report(args.report, csv_dir=args.csv_dir, changes=changes)
+    print_validation_summary(validation_summary(results))
 
 if __name__ == "__main__":
     main()